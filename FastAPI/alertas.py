@@ -0,0 +1,290 @@
+# Alertas de inasistencia evaluadas al registrar asistencia, sin recorrer asistencia_estudiantes.
+#
+# estado_asistencia guarda por (estudiante, grupo) las ausencias seguidas y un mapa de bits de las
+# últimas 62 clases (la tasa reciente sale de contar bits). Una lista con fecha posterior a
+# ultima_fecha avanza el estado en O(1) por estudiante; las correcciones de fechas ya evaluadas
+# recalculan el estado de esos estudiantes desde su historial en el grupo. En la misma transacción
+# se aplican las reglas del nivel_educativo del curso (reglas_alerta_asistencia, o las ALERTAS_*
+# por defecto) y cada condición que empieza a cumplirse encola una Notificacion para el padre; no se
+# repite mientras siga cumpliéndose.
+#
+#   python -m FastAPI.alertas reconstruir   # recalcula estado_asistencia desde los registros (sin avisar)
+#   python -m FastAPI.alertas verificar     # compara con los registros; sale con 1 si hay diferencias
+import argparse
+import os
+import sys
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from . import schemas
+from .cache import CacheTTL
+from .database import insert_dialecto
+
+# Regla para los cursos cuyo nivel_educativo no tiene fila en reglas_alerta_asistencia
+ALERTAS_AUSENCIAS_CONSECUTIVAS = int(os.getenv("ALERTAS_AUSENCIAS_CONSECUTIVAS", "3"))
+ALERTAS_TASA_MINIMA = float(os.getenv("ALERTAS_TASA_MINIMA", "0.8"))
+ALERTAS_VENTANA = int(os.getenv("ALERTAS_VENTANA", "20"))
+ALERTAS_MINIMO_REGISTROS = int(os.getenv("ALERTAS_MINIMO_REGISTROS", "5"))
+# Grupo -> (código, curso, regla); se limpia al modificar una regla en este proceso
+ALERTAS_CACHE_TTL = float(os.getenv("ALERTAS_CACHE_TTL", "300"))
+
+REGLA_POR_DEFECTO = schemas.ReglaAlertaAsistencia(
+    nivel_educativo="",
+    ausencias_consecutivas=ALERTAS_AUSENCIAS_CONSECUTIVAS,
+    tasa_minima=ALERTAS_TASA_MINIMA,
+    ventana=ALERTAS_VENTANA,
+    minimo_registros=ALERTAS_MINIMO_REGISTROS,
+)
+
+MASCARA = (1 << 62) - 1
+CAMPOS = ("ultima_fecha", "registros", "consecutivas", "recientes", "alerta_consecutivas", "alerta_tasa")
+
+cache_grupos = CacheTTL(max_entradas=10_000, ttl=ALERTAS_CACHE_TTL)
+contadores = {"estudiantes_evaluados": 0, "recalculados": 0, "alertas": 0}
+
+def vacio() -> dict:
+    return {"ultima_fecha": None, "registros": 0, "consecutivas": 0, "recientes": 0,
+            "alerta_consecutivas": False, "alerta_tasa": False}
+
+def avanzar(estado: dict, fecha: date, presente: Optional[bool]):
+    # presente NULL cuenta como ausencia, igual que en resumen_asistencia
+    estado["ultima_fecha"] = fecha
+    estado["registros"] += 1
+    estado["consecutivas"] = 0 if presente else estado["consecutivas"] + 1
+    estado["recientes"] = ((estado["recientes"] << 1) | (not presente)) & MASCARA
+
+def tasa(estado: dict, ventana: int) -> Optional[float]:
+    """Asistencia en las últimas `ventana` clases (o en todas, si hay menos)."""
+    clases = min(estado["registros"], ventana)
+    if not clases:
+        return None
+    return 1 - bin(estado["recientes"] & ((1 << ventana) - 1)).count("1") / clases
+
+def condiciones(estado: dict, regla: schemas.ReglaAlertaAsistencia) -> Tuple[bool, bool]:
+    if not regla.activo:
+        return False, False
+    racha = regla.ausencias_consecutivas is not None and estado["consecutivas"] >= regla.ausencias_consecutivas
+    baja = (regla.tasa_minima is not None
+            and min(estado["registros"], regla.ventana) >= regla.minimo_registros
+            and tasa(estado, regla.ventana) < regla.tasa_minima)
+    return racha, baja
+
+def disparar(estado: dict, regla: schemas.ReglaAlertaAsistencia) -> Tuple[bool, bool]:
+    """Actualiza las marcas de alerta del estado y devuelve qué condiciones empezaron a cumplirse."""
+    racha, baja = condiciones(estado, regla)
+    nuevas = racha and not estado["alerta_consecutivas"], baja and not estado["alerta_tasa"]
+    estado["alerta_consecutivas"], estado["alerta_tasa"] = racha, baja
+    return nuevas
+
+# ========== REGLAS ==========
+def _consulta_grupos():
+    regla = models.ReglaAlertaAsistencia
+    return (
+        select(models.Grupo.id_grupo, models.Grupo.codigo, models.Curso.nombre.label("curso"),
+               regla.nivel_educativo, regla.ausencias_consecutivas, regla.tasa_minima, regla.ventana,
+               regla.minimo_registros, regla.activo)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .outerjoin(regla, regla.nivel_educativo == models.Curso.nivel_educativo)
+    )
+
+def _regla(fila) -> schemas.ReglaAlertaAsistencia:
+    if fila.nivel_educativo is None:
+        return REGLA_POR_DEFECTO
+    return schemas.ReglaAlertaAsistencia(
+        nivel_educativo=fila.nivel_educativo, ausencias_consecutivas=fila.ausencias_consecutivas,
+        tasa_minima=fila.tasa_minima, ventana=fila.ventana, minimo_registros=fila.minimo_registros,
+        activo=fila.activo is not False,
+    )
+
+async def _grupo(db: AsyncSession, id_grupo: int) -> tuple:
+    entrada = cache_grupos.get(id_grupo)
+    if entrada is None:
+        fila = (await db.execute(_consulta_grupos().where(models.Grupo.id_grupo == id_grupo))).one()
+        entrada = (fila.codigo, fila.curso, _regla(fila))
+        cache_grupos.set(id_grupo, entrada)
+    return entrada
+
+def invalidar_reglas():
+    cache_grupos.limpiar()
+
+# ========== EVALUACIÓN AL REGISTRAR ==========
+def _aviso(fila, estado: dict, regla: schemas.ReglaAlertaAsistencia, racha: bool, baja: bool,
+           codigo: str, curso: str, ahora: datetime) -> dict:
+    motivos = []
+    if racha:
+        motivos.append(f"acumula {estado['consecutivas']} inasistencias seguidas")
+    if baja:
+        clases = min(estado["registros"], regla.ventana)
+        motivos.append(f"asistió al {tasa(estado, regla.ventana):.0%} de sus últimas {clases} clases "
+                       f"(mínimo {regla.tasa_minima:.0%})")
+    return {
+        "id_usuario": fila.id_usuario,
+        "tipo": "alerta_asistencia",
+        "titulo": "Alerta de inasistencia",
+        "mensaje": (f"{fila.nombre} {fila.apellido} {' y '.join(motivos)} en {curso} ({codigo}), "
+                    f"al {estado['ultima_fecha']:%d/%m/%Y}."),
+        "destinatario": "padre",
+        "telefono_destinatario": fila.telefono_padre,
+        "email_destinatario": fila.email_padre,
+        "metodo_envio": None,
+        "enviado": False,
+        "intentos": 0,
+        "created_at": ahora,
+        "proximo_intento": ahora,
+    }
+
+async def evaluar(db: AsyncSession, id_grupo: int, fecha: date, escritos: List[Tuple[int, Optional[bool]]]) -> int:
+    """Actualiza el estado de los estudiantes con registros nuevos o modificados en `fecha` y encola
+    las alertas que se disparen; devuelve cuántas notificaciones encoló."""
+    codigo, curso, regla = await _grupo(db, id_grupo)
+    tabla = models.EstadoAsistencia.__table__
+    # Filas creadas y bloqueadas en orden de id_usuario, como resumenes._bloquear: dos listas del mismo
+    # grupo en meses distintos no se serializan en resumen_asistencia y no deben cruzar bloqueos aquí
+    ids = sorted({id_usuario for id_usuario, _ in escritos})
+
+    def leer(ids_usuario):
+        return (select(*tabla.c)
+                .where(tabla.c.id_grupo == id_grupo, tabla.c.id_usuario.in_(ids_usuario))
+                .order_by(tabla.c.id_usuario)
+                .with_for_update())
+
+    estados = {fila.id_usuario: dict(fila._mapping) for fila in await db.execute(leer(ids))}
+    faltan = [id_usuario for id_usuario in ids if id_usuario not in estados]
+    if faltan:
+        # Primera clase del estudiante en el grupo: se crea la fila vacía antes de leerla con
+        # FOR UPDATE, así dos listas simultáneas del mismo grupo no se pisan el estado
+        await db.execute(insert_dialecto(db, tabla).on_conflict_do_nothing(), [
+            {"id_usuario": id_usuario, "id_grupo": id_grupo, **vacio()} for id_usuario in faltan
+        ])
+        estados.update((fila.id_usuario, dict(fila._mapping)) for fila in await db.execute(leer(faltan)))
+
+    recalcular = []
+    for id_usuario, presente in escritos:
+        estado = estados[id_usuario]
+        if estado["ultima_fecha"] is None or fecha > estado["ultima_fecha"]:
+            avanzar(estado, fecha, presente)
+        else:
+            recalcular.append(id_usuario)
+    if recalcular:
+        # Corrección o clase registrada con atraso: se rehace el estado (conservando las marcas de
+        # alerta) desde el historial del estudiante en el grupo, que ya incluye lo escrito
+        for id_usuario in recalcular:
+            estados[id_usuario].update({campo: valor for campo, valor in vacio().items()
+                                        if not campo.startswith("alerta_")})
+        asistencia = models.AsistenciaEstudiante
+        historial = (
+            select(asistencia.id_usuario, asistencia.fecha, asistencia.presente)
+            .where(asistencia.id_grupo == id_grupo, asistencia.id_usuario.in_(recalcular))
+            .order_by(asistencia.id_usuario, asistencia.fecha)
+        )
+        for id_usuario, fecha_clase, presente in await db.execute(historial):
+            avanzar(estados[id_usuario], fecha_clase, presente)
+
+    disparadas = {}
+    for id_usuario in ids:
+        racha, baja = disparar(estados[id_usuario], regla)
+        if racha or baja:
+            disparadas[id_usuario] = racha, baja
+
+    # Sentencia de una fila sobre la tabla (sin el bulk del ORM) con executemany: queda en la cache de
+    # compilación, a diferencia de un VALUES multi-fila que se compila para cada tamaño de lista
+    stmt = insert_dialecto(db, tabla)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["id_usuario", "id_grupo"],
+        set_={campo: stmt.excluded[campo] for campo in CAMPOS},
+    ), [estados[id_usuario] for id_usuario in ids])
+
+    avisos = []
+    if disparadas:
+        # Solo columnas del perfil: la tabla evita el JOIN con usuarios del modelo
+        estudiante = models.Estudiante.__table__.c
+        ahora = datetime.now()
+        padres = await db.execute(
+            select(estudiante.id_usuario, estudiante.nombre, estudiante.apellido, estudiante.email_padre,
+                   estudiante.telefono_padre)
+            .where(estudiante.id_usuario.in_(list(disparadas)))
+        )
+        avisos = [_aviso(fila, estados[fila.id_usuario], regla, *disparadas[fila.id_usuario], codigo, curso, ahora)
+                  for fila in padres if fila.email_padre or fila.telefono_padre]
+        if avisos:
+            await db.execute(insert(models.Notificacion), avisos)
+
+    contadores["estudiantes_evaluados"] += len(ids)
+    contadores["recalculados"] += len(recalcular)
+    contadores["alertas"] += len(avisos)
+    return len(avisos)
+
+def estado() -> dict:
+    return {**contadores, "cache_grupos": cache_grupos.estado()}
+
+# ========== RECÁLCULO COMPLETO ==========
+def _plegar(conn) -> Dict[tuple, dict]:
+    """Estado de cada (estudiante, grupo) recorriendo todos los registros en orden de fecha."""
+    asistencia = models.AsistenciaEstudiante
+    # Mismo orden que uq_asistencia_estudiantes_grupo_fecha_usuario: sin ordenar en memoria
+    stmt = (
+        select(asistencia.id_usuario, asistencia.id_grupo, asistencia.fecha, asistencia.presente)
+        .order_by(asistencia.id_grupo, asistencia.fecha, asistencia.id_usuario)
+        .execution_options(yield_per=50_000)
+    )
+    estados = {}
+    for id_usuario, id_grupo, fecha, presente in conn.execute(stmt):
+        estado = estados.get((id_usuario, id_grupo))
+        if estado is None:
+            estado = estados[id_usuario, id_grupo] = {"id_usuario": id_usuario, "id_grupo": id_grupo, **vacio()}
+        avanzar(estado, fecha, presente)
+    return estados
+
+def reconstruir(conn, lote: int = 10_000) -> int:
+    """Recalcula estado_asistencia; las condiciones que ya se cumplen quedan marcadas sin encolar avisos."""
+    reglas = {fila.id_grupo: _regla(fila) for fila in conn.execute(_consulta_grupos())}
+    estados = list(_plegar(conn).values())
+    for estado in estados:
+        disparar(estado, reglas.get(estado["id_grupo"], REGLA_POR_DEFECTO))
+    conn.execute(delete(models.EstadoAsistencia))
+    for desde in range(0, len(estados), lote):
+        conn.execute(insert(models.EstadoAsistencia), estados[desde:desde + lote])
+    return len(estados)
+
+def verificar(conn) -> list:
+    """Pares (estudiante, grupo) cuyo estado no coincide con los registros (o que faltan / sobran)."""
+    reales = _plegar(conn)
+    tabla = models.EstadoAsistencia.__table__
+    diferencias = []
+    for fila in conn.execute(select(*tabla.c)):
+        guardado = dict(fila._mapping)
+        real = reales.pop((fila.id_usuario, fila.id_grupo), None)
+        if real is None:
+            if guardado["registros"]:
+                diferencias.append({**guardado, "real": None})
+            continue
+        distintos = {campo: (guardado[campo], real[campo]) for campo in CAMPOS[:4] if guardado[campo] != real[campo]}
+        if distintos:
+            diferencias.append({"id_usuario": fila.id_usuario, "id_grupo": fila.id_grupo, **distintos})
+    diferencias.extend({**real, "guardado": None} for real in reales.values())
+    return diferencias
+
+def main():
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m FastAPI.alertas")
+    parser.add_argument("accion", choices=["reconstruir", "verificar"])
+    parser.add_argument("--mostrar", type=int, default=20, help="diferencias a imprimir")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.accion == "reconstruir":
+            print(f"estado_asistencia: {reconstruir(conn)} filas")
+            return
+        diferencias = verificar(conn)
+    for diferencia in diferencias[:args.mostrar]:
+        print(diferencia)
+    print(f"{len(diferencias)} diferencias")
+    sys.exit(1 if diferencias else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Utilidades compartidas por los benchmarks.
+# Usan SQLite (sqlite3 / aiosqlite) como sustituto local de PostgreSQL.
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, datetime
+
+import httpx
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .. import models
+from ..database import AsyncSessionLocal
+
+def _activar_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def crear_bases(ruta: str = None):
+    """Crea un archivo SQLite con el esquema y devuelve (engine síncrono, engine asíncrono).
+
+    Las sesiones de la API (AsyncSessionLocal) quedan enlazadas al engine asíncrono.
+    """
+    if ruta is None:
+        ruta = os.path.join(tempfile.mkdtemp(prefix="bench_academico_"), "academico.db")
+    engine_sync = create_engine(f"sqlite:///{ruta}")
+    engine_async = create_async_engine(f"sqlite+aiosqlite:///{ruta}")
+    event.listen(engine_sync, "connect", _activar_foreign_keys)
+    event.listen(engine_async.sync_engine, "connect", _activar_foreign_keys)
+    models.Base.metadata.create_all(engine_sync)
+    AsyncSessionLocal.configure(bind=engine_async)
+    return engine_sync, engine_async
+
+def sembrar(engine_sync, estudiantes: int = 1000, ciclos: int = 2, matriculas: int = 0,
+            password_hash: str = "x", lote: int = 10_000):
+    """Inserta datos de prueba con INSERT multi-fila. Cada (estudiante, ciclo) se matricula a lo sumo una vez."""
+    ahora = datetime.now()
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Modalidad), [{"id_modalidad": 1, "nombre": "Presencial", "activo": True}])
+        conn.execute(insert(models.Ciclo), [
+            {"id_ciclo": c, "nombre": f"Ciclo {c}", "fecha_inicio": date(2025, 1, 1), "fecha_fin": date(2025, 12, 31),
+             "fecha_inicio_matricula": date(2024, 12, 1), "fecha_fin_matricula": date(2025, 1, 31),
+             "activo": True, "created_at": ahora}
+            for c in range(1, ciclos + 1)
+        ])
+        for inicio in range(1, estudiantes + 1, lote):
+            ids = range(inicio, min(inicio + lote, estudiantes + 1))
+            conn.execute(insert(models.Usuario), [
+                {"id_usuario": i, "username": f"estudiante{i}", "email": f"estudiante{i}@academico.pe",
+                 "password_hash": password_hash, "tipo_usuario": "estudiante", "activo": True,
+                 "created_at": ahora, "updated_at": ahora}
+                for i in ids
+            ])
+            conn.execute(insert(models.Estudiante), [
+                {"id_usuario": i, "nombre": f"Nombre{i}", "apellido": f"Apellido{i}", "dni": f"{i:08d}",
+                 "nivel_educativo": "secundaria", "created_at": ahora}
+                for i in ids
+            ])
+        for inicio in range(1, matriculas + 1, lote):
+            conn.execute(insert(models.Matricula), [
+                {"id_matricula": m, "id_usuario": (m - 1) // ciclos + 1, "id_ciclo": (m - 1) % ciclos + 1,
+                 "id_modalidad": 1, "fecha_matricula": ahora, "estado": "activa"}
+                for m in range(inicio, min(inicio + lote, matriculas + 1))
+            ])
+
+def cliente(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+async def medir_carga(peticion, total: int, concurrencia: int) -> dict:
+    """Ejecuta `peticion()` `total` veces con `concurrencia` tareas simultáneas y resume latencias."""
+    latencias = []
+    pendientes = iter(range(total))
+
+    async def trabajador():
+        for _ in pendientes:
+            t0 = time.perf_counter()
+            await peticion()
+            latencias.append(time.perf_counter() - t0)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    return resumir(latencias, duracion)
+
+def resumir(latencias, duracion: float) -> dict:
+    ordenadas = sorted(latencias)
+    return {
+        "peticiones": len(ordenadas),
+        "rps": len(ordenadas) / duracion if duracion else 0.0,
+        "p50_ms": statistics.median(ordenadas) * 1000 if ordenadas else 0.0,
+        "p99_ms": ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))] * 1000 if ordenadas else 0.0,
+    }
+
+def imprimir(nombre: str, resultado: dict):
+    valores = "  ".join(
+        f"{clave}={valor:.2f}" if isinstance(valor, float) else f"{clave}={valor}"
+        for clave, valor in resultado.items()
+    )
+    print(f"{nombre:<40} {valores}")
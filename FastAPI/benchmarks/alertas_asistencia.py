@@ -0,0 +1,184 @@
+# Benchmark de las alertas de inasistencia: un año de asistencia reproducido por la API.
+#
+#   python -m FastAPI.benchmarks.alertas_asistencia --grupos 40 --alumnos 30
+#
+# Cada día hábil de 2025 todos los grupos envían su lista (PUT /api/grupos/{id}/asistencias/{fecha})
+# y cada viernes algunos grupos corrigen la lista del lunes (recálculo desde el historial). La mitad
+# de los grupos es de primaria, con una regla propia; la otra mitad usa la regla por defecto. Las
+# ausencias siguen una cadena de Markov por estudiante (unos pocos faltan seguido).
+# Al final compara las alertas encoladas con las que calcula un evaluador en memoria sobre la misma
+# secuencia, verifica estado_asistencia contra los registros y mide el recorrido completo de la tabla
+# (lo que costaría evaluar las reglas con un proceso nocturno).
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import event, func, insert, select, update
+
+from .. import alertas
+from .. import models
+from .. import schemas
+from ..main import app, create_access_token
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+from .asistencia_lote import preparar_grupos
+
+PRIMARIA = {"ausencias_consecutivas": 2, "tasa_minima": 0.9, "ventana": 15, "minimo_registros": 5}
+
+def dias_habiles(año: int):
+    dia = date(año, 1, 1)
+    while dia.year == año:
+        if dia.weekday() < 5:
+            yield dia
+        dia += timedelta(days=1)
+
+class Asistencia:
+    """Genera la asistencia de cada estudiante: P(ausente) depende de si faltó la clase anterior."""
+
+    def __init__(self, estudiantes: int, semilla: int = 7):
+        self.azar = random.Random(semilla)
+        self.perfil = {}
+        for id_usuario in range(1, estudiantes + 1):
+            r = self.azar.random()
+            # (faltar tras asistir, faltar tras faltar)
+            self.perfil[id_usuario] = (0.02, 0.2) if r < 0.85 else (0.08, 0.5) if r < 0.97 else (0.2, 0.75)
+        self.falto = defaultdict(bool)
+
+    def presente(self, id_usuario: int) -> bool:
+        ausente = self.azar.random() < self.perfil[id_usuario][self.falto[id_usuario]]
+        self.falto[id_usuario] = ausente
+        return not ausente
+
+class Referencia:
+    """Evaluador en memoria con la misma semántica, para contar las alertas esperadas."""
+
+    def __init__(self, reglas: dict):
+        self.reglas = reglas
+        self.historial = defaultdict(dict)
+        self.estados = {}
+        self.alertas = 0
+
+    def registrar(self, id_grupo: int, fecha: date, registros: list):
+        regla = self.reglas[id_grupo]
+        for registro in registros:
+            clave = registro["id_usuario"], id_grupo
+            historial = self.historial[clave]
+            anterior = historial.get(fecha)
+            if anterior == registro["presente"]:
+                continue
+            historial[fecha] = registro["presente"]
+            estado = self.estados.setdefault(clave, alertas.vacio())
+            if estado["ultima_fecha"] is None or fecha > estado["ultima_fecha"]:
+                alertas.avanzar(estado, fecha, registro["presente"])
+            else:
+                marcas = estado["alerta_consecutivas"], estado["alerta_tasa"]
+                estado = self.estados[clave] = alertas.vacio()
+                estado["alerta_consecutivas"], estado["alerta_tasa"] = marcas
+                for dia in sorted(historial):
+                    alertas.avanzar(estado, dia, historial[dia])
+            self.alertas += any(alertas.disparar(estado, regla))
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grupos", type=int, default=40)
+    parser.add_argument("--alumnos", type=int, default=30)
+    parser.add_argument("--año", type=int, default=2025)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    total_alumnos = args.grupos * args.alumnos
+    sembrar(engine_sync, estudiantes=total_alumnos, ciclos=1, matriculas=total_alumnos)
+    tokens = preparar_grupos(engine_sync, args.grupos, args.alumnos)
+    with engine_sync.begin() as conn:
+        conn.execute(update(models.Estudiante).values(email_padre="padre@academico.pe"))
+        conn.execute(update(models.Curso).values(nivel_educativo="primaria"))
+        conn.execute(insert(models.Curso), [{"id_curso": 2, "id_ciclo": 1, "nombre": "Álgebra",
+                                             "nivel_educativo": "secundaria", "activo": True}])
+        conn.execute(update(models.Grupo).where(models.Grupo.id_grupo % 2 == 0).values(id_curso=2))
+        conn.execute(insert(models.Usuario), [{"id_usuario": total_alumnos + args.grupos + 1, "username": "admin",
+                                               "email": "admin@academico.pe", "password_hash": "x",
+                                               "tipo_usuario": "administrador", "activo": True}])
+
+    dias = list(dias_habiles(args.año))
+    generador = Asistencia(total_alumnos)
+    reglas = {g: schemas.ReglaAlertaAsistencia(nivel_educativo="primaria", **PRIMARIA) if g % 2
+              else alertas.REGLA_POR_DEFECTO for g in range(1, args.grupos + 1)}
+    referencia = Referencia(reglas)
+    sentencias = []
+    event.listen(engine_async.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *resto: sentencias.append(sql.split()[0]))
+
+    async with cliente(app) as http:
+        admin = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+        respuesta = await http.put("/api/reglas-alerta-asistencia/primaria", json=PRIMARIA, headers=admin)
+        assert respuesta.status_code == 200, respuesta.text
+
+        async def enviar(id_grupo: int, fecha: date, registros: list):
+            respuesta = await http.put(f"/api/grupos/{id_grupo}/asistencias/{fecha.isoformat()}",
+                                       json={"registros": registros},
+                                       headers={"Authorization": f"Bearer {tokens[id_grupo]}"})
+            assert respuesta.status_code == 200, respuesta.text
+
+        listas_lunes = {}
+        pendientes = []
+        correcciones = 0
+
+        async def siguiente():
+            await enviar(*pendientes.pop())
+
+        inicio = time.perf_counter()
+        resultados = []
+        for dia in dias:
+            pendientes = []
+            for id_grupo in range(1, args.grupos + 1):
+                primero = (id_grupo - 1) * args.alumnos + 1
+                registros = [{"id_usuario": i, "presente": generador.presente(i)}
+                             for i in range(primero, primero + args.alumnos)]
+                referencia.registrar(id_grupo, dia, registros)
+                pendientes.append((id_grupo, dia, registros))
+                if dia.weekday() == 0:
+                    listas_lunes[id_grupo] = (dia, registros)
+            if dia == dias[1]:
+                # Una lista en régimen estable: contar sus sentencias SQL
+                sentencias.clear()
+                await enviar(*pendientes.pop())
+                imprimir("sentencias SQL por lista", {"total": len(sentencias), "tipos": ",".join(sentencias)})
+            resultados.append(await medir_carga(siguiente, len(pendientes), args.concurrencia))
+            if dia.weekday() == 4:
+                # Corrección del lunes, después de las listas del viernes: cambia un estudiante en uno
+                # de cada cinco grupos
+                for id_grupo, (lunes, registros) in listas_lunes.items():
+                    if id_grupo % 5 == lunes.isocalendar()[1] % 5:
+                        corregida = [dict(registros[0], presente=not registros[0]["presente"])]
+                        referencia.registrar(id_grupo, lunes, corregida)
+                        pendientes.append((id_grupo, lunes, corregida))
+                correcciones += len(pendientes)
+                resultados.append(await medir_carga(siguiente, len(pendientes), args.concurrencia))
+        duracion = time.perf_counter() - inicio
+        peticiones = sum(r["peticiones"] for r in resultados)
+        imprimir("año reproducido", {"dias": len(dias), "listas": peticiones, "correcciones": correcciones,
+                                     "registros": len(dias) * total_alumnos, "s": duracion,
+                                     "listas_por_s": peticiones / duracion,
+                                     "p50_ms_peor_dia": max(r["p50_ms"] for r in resultados),
+                                     "p99_ms_peor_dia": max(r["p99_ms"] for r in resultados)})
+        imprimir("evaluador", (await http.get("/api/metrics/alertas-asistencia")).json())
+
+    with engine_sync.connect() as conn:
+        encoladas = conn.execute(select(func.count()).select_from(models.Notificacion)
+                                 .where(models.Notificacion.tipo == "alerta_asistencia")).scalar()
+        imprimir("alertas", {"encoladas": encoladas, "esperadas": referencia.alertas,
+                             "coinciden": encoladas == referencia.alertas})
+        inicio = time.perf_counter()
+        diferencias = alertas.verificar(conn)
+        imprimir("verificar (recorrido completo)", {"diferencias": len(diferencias), "s": time.perf_counter() - inicio})
+    with engine_sync.begin() as conn:
+        inicio = time.perf_counter()
+        filas = alertas.reconstruir(conn)
+        imprimir("reconstruir (proceso nocturno)", {"filas": filas, "s": time.perf_counter() - inicio})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+# Benchmark de PUT /api/grupos/{id}/asistencias/{fecha}: todos los docentes envían su lista a la vez.
+#
+#   python -m FastAPI.benchmarks.asistencia_lote --grupos 300 --alumnos 30 --concurrencia 100
+#
+# Tres pasadas: lista inicial (inserciones), reenvío idéntico (sin escrituras) y correcciones
+# (3 estudiantes por grupo cambian). "grupos_en_5_min" extrapola el throughput a la ventana de 5 minutos.
+import argparse
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy import func, insert, select
+
+from .. import models
+from ..main import app, create_access_token
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+FECHA = date(2025, 3, 10)
+
+def preparar_grupos(engine_sync, grupos: int, alumnos: int):
+    """Un docente por grupo; el estudiante i (matrícula i) va al grupo (i - 1) // alumnos + 1."""
+    ahora = datetime.now()
+    primer_docente = grupos * alumnos + 1
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Curso), [{"id_curso": 1, "id_ciclo": 1, "nombre": "Matemática", "activo": True}])
+        conn.execute(insert(models.Usuario), [
+            {"id_usuario": primer_docente + g, "username": f"docente{g}", "email": f"docente{g}@academico.pe",
+             "password_hash": "x", "tipo_usuario": "docente", "activo": True, "created_at": ahora, "updated_at": ahora}
+            for g in range(grupos)
+        ])
+        conn.execute(insert(models.Docente), [
+            {"id_usuario": primer_docente + g, "nombre": f"Docente{g}", "apellido": "Prueba", "created_at": ahora}
+            for g in range(grupos)
+        ])
+        conn.execute(insert(models.Grupo), [
+            {"id_grupo": g + 1, "codigo": f"G{g + 1}", "id_curso": 1, "id_docente": primer_docente + g,
+             "capacidad_maxima": alumnos, "activo": True}
+            for g in range(grupos)
+        ])
+        conn.execute(insert(models.MatriculaGrupo), [
+            {"id_matricula": m, "id_grupo": (m - 1) // alumnos + 1, "fecha_inscripcion": ahora}
+            for m in range(1, grupos * alumnos + 1)
+        ])
+    return {g + 1: create_access_token({"sub": f"docente{g}"}) for g in range(grupos)}
+
+def lista(id_grupo: int, alumnos: int, corregidos: int = 0) -> dict:
+    primero = (id_grupo - 1) * alumnos + 1
+    return {"registros": [
+        {"id_usuario": primero + i, "presente": i >= corregidos, "hora_entrada": "08:00"}
+        for i in range(alumnos)
+    ]}
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grupos", type=int, default=300)
+    parser.add_argument("--alumnos", type=int, default=30)
+    parser.add_argument("--concurrencia", type=int, default=100)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    total_alumnos = args.grupos * args.alumnos
+    sembrar(engine_sync, estudiantes=total_alumnos, ciclos=1, matriculas=total_alumnos)
+    tokens = preparar_grupos(engine_sync, args.grupos, args.alumnos)
+
+    async with cliente(app) as http:
+        for nombre, corregidos in (("lista inicial", 0), ("reenvío idéntico", 0), ("correcciones", 3)):
+            pendientes = iter(range(1, args.grupos + 1))
+            conteos = {"insertados": 0, "actualizados": 0, "sin_cambios": 0, "errores": 0}
+
+            async def enviar():
+                id_grupo = next(pendientes)
+                respuesta = await http.put(
+                    f"/api/grupos/{id_grupo}/asistencias/{FECHA.isoformat()}",
+                    json=lista(id_grupo, args.alumnos, corregidos),
+                    headers={"Authorization": f"Bearer {tokens[id_grupo]}"},
+                )
+                if respuesta.status_code != 200:
+                    conteos["errores"] += 1
+                    return
+                for clave in ("insertados", "actualizados", "sin_cambios"):
+                    conteos[clave] += respuesta.json()[clave]
+
+            resultado = await medir_carga(enviar, args.grupos, args.concurrencia)
+            imprimir(nombre, {**resultado, "grupos_en_5_min": int(resultado["rps"] * 300)})
+            imprimir("", conteos)
+
+    with engine_sync.connect() as conn:
+        filas = conn.execute(select(func.count()).select_from(models.AsistenciaEstudiante)).scalar()
+        ausentes = conn.execute(select(func.count()).select_from(models.AsistenciaEstudiante)
+                                .where(models.AsistenciaEstudiante.presente.is_(False))).scalar()
+    imprimir("corrección", {"filas": filas, "esperadas": total_alumnos,
+                            "ausentes": ausentes, "ausentes_esperados": args.grupos * 3})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+# Benchmark de carga: sesión síncrona dentro de `async def` (modo anterior) vs sesión asíncrona.
+#
+#   python -m FastAPI.benchmarks.carga_async --matriculas 200000 --concurrencia 50
+#
+# Mientras un grupo de clientes pide /api/estadisticas (consultas lentas), otro pide /api/ciclos
+# (consulta trivial). Con la sesión síncrona las consultas lentas bloquean el event loop y la p99
+# de /api/ciclos crece con ellas; con la sesión asíncrona se mantiene baja.
+import argparse
+import asyncio
+from typing import Annotated
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .. import models
+from ..main import app as app_async
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+def crear_app_sincrona(url, conexiones: int) -> FastAPI:
+    """Réplica de los endpoints con la sesión síncrona original (SessionLocal).
+
+    El pool debe cubrir la concurrencia: si se agota, el handler se queda esperando una conexión
+    dentro del event loop y bloquea la devolución de las demás (se cae en pool_timeout).
+    """
+    engine_sync = create_engine(url, pool_size=conexiones, max_overflow=0)
+    SessionSync = sessionmaker(autocommit=False, autoflush=False, bind=engine_sync)
+    app = FastAPI()
+
+    def get_db():
+        db = SessionSync()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    db_dependency = Annotated[Session, Depends(get_db)]
+
+    @app.get("/api/ciclos")
+    async def listar_ciclos(db: db_dependency, skip: int = 0, limit: int = 100):
+        return [{"id_ciclo": c.id_ciclo, "nombre": c.nombre}
+                for c in db.query(models.Ciclo).offset(skip).limit(limit).all()]
+
+    @app.get("/api/estadisticas")
+    async def obtener_estadisticas(db: db_dependency):
+        return {
+            "total_matriculas": db.query(models.Matricula).count(),
+            "total_estudiantes": db.query(models.Estudiante).count(),
+        }
+
+    return app
+
+async def medir_modo(nombre: str, app, total: int, concurrencia: int):
+    async with cliente(app) as http:
+        async def lenta():
+            await http.get("/api/estadisticas")
+
+        async def rapida():
+            await http.get("/api/ciclos")
+
+        resultado_lenta, resultado_rapida = await asyncio.gather(
+            medir_carga(lenta, total // 4, max(1, concurrencia // 4)),
+            medir_carga(rapida, total, concurrencia),
+        )
+    imprimir(f"{nombre} /api/estadisticas", resultado_lenta)
+    imprimir(f"{nombre} /api/ciclos", resultado_rapida)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--estudiantes", type=int, default=50_000)
+    parser.add_argument("--matriculas", type=int, default=100_000)
+    parser.add_argument("--peticiones", type=int, default=400)
+    parser.add_argument("--concurrencia", type=int, default=40)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=2, matriculas=args.matriculas)
+
+    app_sincrona = crear_app_sincrona(engine_sync.url, args.concurrencia * 2)
+    await medir_modo("sincrono", app_sincrona, args.peticiones, args.concurrencia)
+    await medir_modo("asincrono", app_async, args.peticiones, args.concurrencia)
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
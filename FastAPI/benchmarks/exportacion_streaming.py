@@ -0,0 +1,85 @@
+# Benchmark de exportación en streaming: tiempo al primer byte, tiempo total y pico de RSS.
+#
+#   python -m FastAPI.benchmarks.exportacion_streaming --matriculas 1000000 --formato csv
+#
+# Llama a la app ASGI directamente (sin acumular la respuesta) para medir el primer chunk.
+# Con --comparar-lista también mide GET /api/matriculas?limit=N, que arma la lista completa en memoria.
+import argparse
+import asyncio
+import resource
+import time
+
+from sqlalchemy import update
+
+from .. import models
+from ..main import app, create_access_token
+from ._comun import crear_bases, imprimir, sembrar
+
+def rss_max_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def llamar(ruta: str, consulta: str, token: str) -> dict:
+    estado = {"bytes": 0, "ttfb": None, "status": None}
+    inicio = time.perf_counter()
+
+    desconectado = asyncio.Event()
+    pedido_enviado = False
+
+    async def receive():
+        # Primero el cuerpo (vacío) de la petición; luego el cliente queda "conectado" hasta el final
+        nonlocal pedido_enviado
+        if not pedido_enviado:
+            pedido_enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await desconectado.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start":
+            estado["status"] = mensaje["status"]
+        elif mensaje["type"] == "http.response.body" and mensaje.get("body"):
+            if estado["ttfb"] is None:
+                estado["ttfb"] = time.perf_counter() - inicio
+            estado["bytes"] += len(mensaje["body"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": ruta, "raw_path": ruta.encode(), "query_string": consulta.encode(), "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    desconectado.set()
+    return {
+        "status": estado["status"],
+        "ttfb_ms": (estado["ttfb"] or 0.0) * 1000,
+        "total_s": time.perf_counter() - inicio,
+        "mb": estado["bytes"] / 1e6,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matriculas", type=int, default=1_000_000)
+    parser.add_argument("--formato", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--comparar-lista", action="store_true")
+    args = parser.parse_args()
+
+    ciclos = 10
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.matriculas // ciclos, ciclos=ciclos, matriculas=args.matriculas)
+    with engine_sync.begin() as conn:
+        conn.execute(update(models.Usuario).where(models.Usuario.id_usuario == 1).values(tipo_usuario="administrador"))
+    token = create_access_token({"sub": "estudiante1"})
+
+    base = rss_max_mb()
+    resultado = await llamar("/api/exportar/matriculas", f"formato={args.formato}", token)
+    imprimir(f"exportar {args.formato}", {**resultado, "rss_pico_extra_mb": rss_max_mb() - base})
+
+    if args.comparar_lista:
+        base = rss_max_mb()
+        resultado = await llamar("/api/matriculas", f"limit={args.matriculas}", token)
+        imprimir("lista completa (/api/matriculas)", {**resultado, "rss_pico_extra_mb": rss_max_mb() - base})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+# Benchmark de detección de cruces de horario sobre un ciclo con 10k tramos.
+#
+#   python -m FastAPI.benchmarks.horarios_conflictos --tramos 10000 --cruces 50
+#
+# Genera un horario sin cruces (aulas de 5 días x 8 bloques de una hora, docentes con 5 grupos de
+# 5 tramos) y mueve `--cruces` tramos 30 minutos para provocarlos. Mide GET
+# /api/ciclos/1/horarios/conflictos, lo contrasta con una comparación por pares en SQL y mide la
+# verificación de un POST /api/horarios (rechazado con 409 y aceptado).
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, time as hora
+
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.orm import aliased
+
+from .. import models
+from ..main import app
+from ._comun import cliente, crear_bases, imprimir, medir_carga
+
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
+BLOQUES = 8
+TRAMOS_POR_GRUPO = 5
+GRUPOS_POR_DOCENTE = 5
+
+def sembrar_horario(engine_sync, tramos: int, cruces: int):
+    grupos = -(-tramos // TRAMOS_POR_GRUPO)
+    docentes = -(-grupos // GRUPOS_POR_DOCENTE)
+    ahora = datetime.now()
+    filas = []
+    for k in range(tramos):
+        posicion = k % (len(DIAS) * BLOQUES)
+        filas.append({
+            "id_horario": k + 1, "id_grupo": k // TRAMOS_POR_GRUPO + 1, "aula": f"A{k // (len(DIAS) * BLOQUES) + 1}",
+            "dia_semana": DIAS[posicion // BLOQUES],
+            "hora_inicio": hora(8 + posicion % BLOQUES), "hora_fin": hora(9 + posicion % BLOQUES),
+        })
+    for fila in random.Random(7).sample(filas, cruces):
+        # Solo se mueven tramos con un bloque siguiente: el cruce queda dentro de la jornada
+        if fila["hora_inicio"].hour < 7 + BLOQUES:
+            fila["hora_inicio"] = fila["hora_inicio"].replace(minute=30)
+            fila["hora_fin"] = fila["hora_fin"].replace(minute=30)
+
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Ciclo), [{
+            "id_ciclo": 1, "nombre": "Ciclo 1", "fecha_inicio": date(2025, 1, 1), "fecha_fin": date(2025, 12, 31),
+            "fecha_inicio_matricula": date(2024, 12, 1), "fecha_fin_matricula": date(2025, 1, 31),
+            "activo": True, "created_at": ahora,
+        }])
+        conn.execute(insert(models.Curso), [{"id_curso": 1, "id_ciclo": 1, "nombre": "Curso", "activo": True}])
+        conn.execute(insert(models.Usuario), [
+            {"id_usuario": d, "username": f"docente{d}", "email": f"docente{d}@academico.pe", "password_hash": "x",
+             "tipo_usuario": "docente", "activo": True, "created_at": ahora, "updated_at": ahora}
+            for d in range(1, docentes + 1)
+        ])
+        conn.execute(insert(models.Docente), [
+            {"id_usuario": d, "nombre": f"Docente{d}", "apellido": "Prueba", "created_at": ahora}
+            for d in range(1, docentes + 1)
+        ])
+        conn.execute(insert(models.Grupo), [
+            {"id_grupo": g, "codigo": f"G{g}", "id_curso": 1, "id_docente": (g - 1) // GRUPOS_POR_DOCENTE + 1,
+             "capacidad_maxima": 30, "activo": True}
+            for g in range(1, grupos + 1)
+        ])
+        conn.execute(insert(models.Horario), filas)
+    return filas
+
+def cruces_por_pares_sql(engine_sync) -> int:
+    """Referencia: autojoin de horarios (aula o docente, mismo día, tramos solapados)."""
+    a, b = aliased(models.Horario), aliased(models.Horario)
+    ga, gb = aliased(models.Grupo), aliased(models.Grupo)
+    mismo_tramo = and_(a.id_horario < b.id_horario, a.dia_semana == b.dia_semana,
+                       a.hora_inicio < b.hora_fin, b.hora_inicio < a.hora_fin)
+    por_aula = select(func.count()).select_from(a).join(b, and_(mismo_tramo, a.aula == b.aula))
+    por_docente = (
+        select(func.count()).select_from(a)
+        .join(ga, ga.id_grupo == a.id_grupo)
+        .join(b, mismo_tramo)
+        .join(gb, and_(gb.id_grupo == b.id_grupo, gb.id_docente == ga.id_docente))
+    )
+    with engine_sync.connect() as conn:
+        return conn.execute(por_aula).scalar() + conn.execute(por_docente).scalar()
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tramos", type=int, default=10_000)
+    parser.add_argument("--cruces", type=int, default=50)
+    parser.add_argument("--peticiones", type=int, default=500)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    filas = sembrar_horario(engine_sync, args.tramos, args.cruces)
+
+    async with cliente(app) as http:
+        inicio = time.perf_counter()
+        respuesta = await http.get("/api/ciclos/1/horarios/conflictos")
+        duracion = time.perf_counter() - inicio
+        imprimir("validar ciclo (HTTP)", {"tramos": args.tramos, "conflictos": len(respuesta.json()), "s": duracion})
+
+        inicio = time.perf_counter()
+        referencia = cruces_por_pares_sql(engine_sync)
+        imprimir("autojoin SQL (referencia)", {"conflictos": referencia, "s": time.perf_counter() - inicio})
+
+        # Mismo tramo que el primer horario (aula y docente ocupados) / aula nueva un domingo
+        ocupado = {"id_grupo": filas[0]["id_grupo"], "dia_semana": filas[0]["dia_semana"], "aula": filas[0]["aula"],
+                   "hora_inicio": filas[0]["hora_inicio"].isoformat(), "hora_fin": filas[0]["hora_fin"].isoformat()}
+        estados = {}
+
+        async def rechazado():
+            estados.setdefault("rechazado", set()).add((await http.post("/api/horarios", json=ocupado)).status_code)
+
+        # Domingo (sin tramos), aula nueva por petición y bloques distintos para los grupos de un docente
+        contador = iter(range(args.tramos))
+
+        async def aceptado():
+            n = next(contador)
+            libre = {**ocupado, "id_grupo": n + 1, "dia_semana": "Domingo", "aula": f"Z{n}",
+                     "hora_inicio": hora(8 + n % 12).isoformat(), "hora_fin": hora(9 + n % 12).isoformat()}
+            estados.setdefault("aceptado", set()).add((await http.post("/api/horarios", json=libre)).status_code)
+
+        imprimir("POST /api/horarios con cruce", await medir_carga(rechazado, args.peticiones, 10))
+        imprimir("", {"status": sorted(estados["rechazado"])})
+        imprimir("POST /api/horarios sin cruce", await medir_carga(aceptado, min(args.peticiones, len(filas) // TRAMOS_POR_GRUPO), 1))
+        imprimir("", {"status": sorted(estados["aceptado"])})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+# Benchmark del aviso de incidencias a los padres.
+#
+#   python -m FastAPI.benchmarks.incidencias_notificacion --estudiantes 5000 --incidencias 5000
+#
+# 1. POST /api/incidencias con carga concurrente, contando las sentencias SQL de una petición
+#    (debe ser un solo INSERT con la cache de autenticación caliente).
+# 2. El encolador pasa todo a la bandeja de salida: graves una por una, leves en un resumen por
+#    padre (los hermanos comparten padre), simulando que ya pasó la hora del resumen.
+# 3. El despachador envía por CanalMemoria y la confirmación marca notificado_padre en bloque.
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, select, update
+
+from .. import incidencias
+from .. import models
+from .. import notificaciones
+from ..main import app, create_access_token
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+LEVE, GRAVE = 1, 2
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--incidencias", type=int, default=5000)
+    parser.add_argument("--graves", type=float, default=0.1, help="proporción de incidencias graves")
+    parser.add_argument("--concurrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=1)
+    ahora = datetime.now()
+    with engine_sync.begin() as conn:
+        # Pares de hermanos: mismo padre cada dos estudiantes; uno de cada diez solo tiene teléfono
+        for e in range(1, args.estudiantes + 1):
+            padre = (e + 1) // 2
+            conn.execute(update(models.Estudiante).where(models.Estudiante.id_usuario == e).values(
+                nombre_padre=f"Padre{padre}", telefono_padre=f"9{padre:08d}",
+                email_padre=None if padre % 10 == 0 else f"padre{padre}@academico.pe"))
+        conn.execute(insert(models.Usuario), [{
+            "id_usuario": args.estudiantes + 1, "username": "admin", "email": "admin@academico.pe",
+            "password_hash": "x", "tipo_usuario": "administrador", "activo": True, "created_at": ahora,
+            "updated_at": ahora,
+        }])
+        conn.execute(insert(models.Administrador), [{"id_usuario": args.estudiantes + 1, "nombre": "Admin",
+                                                     "apellido": "Prueba", "created_at": ahora}])
+        conn.execute(insert(models.TipoIncidencia), [
+            {"id_tipo": LEVE, "nombre": "Tardanza", "nivel_gravedad": 1},
+            {"id_tipo": GRAVE, "nombre": "Agresión", "nivel_gravedad": incidencias.INCIDENCIAS_GRAVEDAD_INMEDIATA},
+        ])
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    azar = random.Random(7)
+    sentencias = []
+    event.listen(engine_async.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *resto: sentencias.append(sql.split()[0]))
+
+    async with cliente(app) as http:
+        async def registrar():
+            incidencia = {"id_usuario": azar.randint(1, args.estudiantes),
+                          "id_tipo": GRAVE if azar.random() < args.graves else LEVE, "descripcion": "Prueba"}
+            respuesta = await http.post("/api/incidencias", json=incidencia, headers=headers)
+            assert respuesta.status_code == 201, respuesta.text
+
+        await registrar()
+        sentencias.clear()
+        await registrar()
+        imprimir("sentencias SQL por petición", {"total": len(sentencias), "tipos": ",".join(sentencias)})
+        imprimir("POST /api/incidencias", await medir_carga(registrar, args.incidencias - 2, args.concurrencia))
+
+    with engine_sync.connect() as conn:
+        graves = conn.execute(select(func.count()).select_from(models.Incidencia)
+                              .where(models.Incidencia.id_tipo == GRAVE)).scalar()
+
+    encolador = incidencias.Encolador()
+    inicio = time.perf_counter()
+    while await encolador.procesar_lote(corte=datetime.now()):
+        pass
+    imprimir("encolador", {"s": time.perf_counter() - inicio, "graves": graves, **encolador.estado()})
+
+    canal = notificaciones.CanalMemoria(latencia_s=0.005)
+    despachador = notificaciones.Despachador({"email": canal, "sms": canal}, lote=500, concurrencia=50)
+    inicio = time.perf_counter()
+    while await despachador.procesar_lote():
+        pass
+    imprimir("despachador", {"s": time.perf_counter() - inicio, "enviadas": despachador.enviadas})
+
+    with engine_sync.connect() as conn:
+        pendientes = conn.execute(select(func.count()).select_from(models.Incidencia)
+                                  .where(~models.Incidencia.notificado_padre)).scalar()
+    imprimir("corrección", {"avisos": len(canal.enviados), "incidencias_sin_notificar": pendientes})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
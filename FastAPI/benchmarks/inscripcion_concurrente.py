@@ -0,0 +1,88 @@
+# Prueba de carga de POST /api/grupos/{id}/inscripciones: muchos estudiantes contra un solo grupo.
+#
+#   python -m FastAPI.benchmarks.inscripcion_concurrente --estudiantes 500 --capacidad 20 --concurrencia 500
+#
+# Cada estudiante inscribe su propia matrícula con su token y todas las peticiones piden lista de
+# espera. Luego se retiran `--retiros` inscritos en paralelo y se comprueba que la lista avanza en orden. Debe terminar sin sobrecupo y con el contador
+# grupos.inscritos igual a las filas de matricula_grupos.
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from sqlalchemy import func, insert, select
+
+from .. import models
+from ..main import app, create_access_token
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estudiantes", type=int, default=500)
+    parser.add_argument("--capacidad", type=int, default=20)
+    parser.add_argument("--concurrencia", type=int, default=500)
+    parser.add_argument("--retiros", type=int, default=10)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=1, matriculas=args.estudiantes)
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Curso), [{"id_curso": 1, "id_ciclo": 1, "nombre": "Curso", "activo": True}])
+        conn.execute(insert(models.Grupo), [{"id_grupo": 1, "codigo": "G1", "id_curso": 1,
+                                             "capacidad_maxima": args.capacidad, "activo": True}])
+
+    solicitudes = list(range(1, args.estudiantes + 1))
+    random.Random(7).shuffle(solicitudes)
+    pendientes = iter(solicitudes)
+    estados = Counter()
+    inscritos = []
+    # Con un solo ciclo, la matrícula m es del estudiante m
+    tokens = {m: {"Authorization": f"Bearer {create_access_token({'sub': f'estudiante{m}'})}"} for m in solicitudes}
+
+    async with cliente(app) as http:
+        sin_token = await http.post("/api/grupos/1/inscripciones", json={"id_matricula": 1})
+        ajena = await http.post("/api/grupos/1/inscripciones", json={"id_matricula": 1}, headers=tokens[2])
+        retiro_ajeno = await http.delete("/api/grupos/1/inscripciones/1", headers=tokens[2])
+        imprimir("autorización", {"sin_token": sin_token.status_code, "matricula_ajena": ajena.status_code,
+                                  "retiro_ajeno": retiro_ajeno.status_code})
+
+        async def inscribir():
+            id_matricula = next(pendientes)
+            respuesta = await http.post("/api/grupos/1/inscripciones", headers=tokens[id_matricula],
+                                        json={"id_matricula": id_matricula, "lista_espera": True})
+            estados[respuesta.status_code] += 1
+            if respuesta.status_code == 200:
+                inscritos.append(id_matricula)
+
+        imprimir("POST inscripciones (1 grupo)", await medir_carga(inscribir, len(solicitudes), args.concurrencia))
+        imprimir("respuestas", {f"http_{codigo}": n for codigo, n in sorted(estados.items())})
+
+        with engine_sync.connect() as conn:
+            esperados = list(conn.scalars(
+                select(models.ListaEspera.id_matricula).order_by(models.ListaEspera.id).limit(args.retiros)))
+        retiros = iter(inscritos[:args.retiros])
+        promovidos = []
+
+        async def retirar():
+            id_matricula = next(retiros)
+            respuesta = await http.delete(f"/api/grupos/1/inscripciones/{id_matricula}", headers=tokens[id_matricula])
+            promovidos.append(respuesta.json().get("promovido"))
+
+        imprimir("DELETE inscripciones", await medir_carga(retirar, min(args.retiros, len(inscritos)), args.retiros))
+
+    with engine_sync.connect() as conn:
+        filas = conn.execute(select(func.count()).select_from(models.MatriculaGrupo)).scalar()
+        contador = conn.execute(select(models.Grupo.inscritos)).scalar()
+        en_espera = conn.execute(select(func.count()).select_from(models.ListaEspera)).scalar()
+    imprimir("corrección", {
+        "capacidad": args.capacidad,
+        "matricula_grupos": filas,
+        "grupos.inscritos": contador,
+        "sobrecupo": max(0, filas - args.capacidad),
+        "en_espera": en_espera,
+        "promovidos_en_orden": sorted(p for p in promovidos if p) == sorted(esperados),
+    })
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+# Benchmark de logins concurrentes por segundo con bcrypt en el pool de hashing.
+#
+#   BCRYPT_ROUNDS=12 HASH_WORKERS=4 python -m FastAPI.benchmarks.login_concurrente --concurrencia 50
+#
+# En paralelo a la ráfaga de logins se mide /api/ciclos: si bcrypt corriera dentro del event loop,
+# su p99 crecería hasta el tiempo de la ráfaga completa. El techo es el throughput del pool de hashing
+# verificando contraseñas sin HTTP ni BD; el login debería quedar cerca (una consulta para usuario y
+# perfil, más el INSERT de la sesión). Los logins alternan estudiantes, docentes y administradores, y
+# cada respuesta debe traer solo el perfil de su rol.
+import argparse
+import asyncio
+import itertools
+import random
+
+from sqlalchemy import event, insert
+
+from .. import models
+from ..hashing import HASH_WORKERS, pool_hashing, pwd_context
+from ..main import app
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+PERFILES = ("estudiante", "docente", "administrador")
+
+def sembrar_personal(engine_sync, docentes: int, administradores: int, desde: int, password_hash: str):
+    """Usuarios docente y administrador con su perfil, a partir del id `desde`."""
+    usuarios, perfiles = [], {models.Docente: [], models.Administrador: []}
+    for n in range(docentes + administradores):
+        id_usuario = desde + n
+        tipo, modelo = ("docente", models.Docente) if n < docentes else ("administrador", models.Administrador)
+        usuarios.append({"id_usuario": id_usuario, "username": f"{tipo}{id_usuario}",
+                         "email": f"{tipo}{id_usuario}@academico.pe", "password_hash": password_hash,
+                         "tipo_usuario": tipo, "activo": True})
+        perfiles[modelo].append({"id_usuario": id_usuario, "nombre": f"Nombre{id_usuario}",
+                                 "apellido": f"Apellido{id_usuario}", "dni": f"{id_usuario:08d}"})
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Usuario), usuarios)
+        for modelo, filas in perfiles.items():
+            if filas:
+                conn.execute(insert(modelo), filas)
+    return [u["username"] for u in usuarios]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    password_hash = pwd_context.hash("secreto123")
+    sembrar(engine_sync, estudiantes=args.usuarios, password_hash=password_hash)
+    personal = sembrar_personal(engine_sync, args.usuarios // 4, args.usuarios // 20 or 1,
+                                args.usuarios + 1, password_hash)
+    usernames = [f"estudiante{i}" for i in range(1, args.usuarios + 1)] + personal
+    random.Random(7).shuffle(usernames)
+
+    async def verificar():
+        await pool_hashing.verificar("secreto123", password_hash)
+
+    techo = (await medir_carga(verificar, args.logins, min(args.concurrencia, pool_hashing.max_pendientes)))["rps"]
+    imprimir("techo: solo bcrypt en el pool", {"verificaciones_por_s": techo, "por_worker": techo / HASH_WORKERS})
+
+    sentencias = []
+    event.listen(engine_async.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *resto: sentencias.append(sql.split()[0]))
+
+    rechazados = 0
+    perfil_incorrecto = 0
+    siguiente = itertools.count()
+    async with cliente(app) as http:
+        async def login():
+            nonlocal rechazados, perfil_incorrecto
+            usuario = usernames[next(siguiente) % len(usernames)]
+            respuesta = await http.post("/api/auth/login", json={"username": usuario, "password": "secreto123"})
+            if respuesta.status_code == 503:
+                rechazados += 1
+                return
+            datos = respuesta.json()
+            tipo = datos["usuario"]["tipo_usuario"]
+            presentes = {perfil for perfil in PERFILES if datos.get(perfil)}
+            if presentes != {tipo} or not usuario.startswith(tipo):
+                perfil_incorrecto += 1
+
+        async def ciclos():
+            await http.get("/api/ciclos")
+
+        await login()
+        sentencias.clear()
+        await login()
+        imprimir("sentencias SQL por login", {"total": len(sentencias), "tipos": ",".join(sentencias)})
+
+        resultado_login, resultado_ciclos = await asyncio.gather(
+            medir_carga(login, args.logins, args.concurrencia),
+            medir_carga(ciclos, args.logins, 4),
+        )
+    imprimir("/api/auth/login", {**resultado_login, "rechazados_503": rechazados,
+                                 "perfil_incorrecto": perfil_incorrecto,
+                                 "por_worker": resultado_login["rps"] / HASH_WORKERS,
+                                 "del_techo": resultado_login["rps"] / techo})
+    imprimir("/api/ciclos (durante la ráfaga)", resultado_ciclos)
+    imprimir("pool de hashing", pool_hashing.estado())
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+# Benchmark de POST /api/matriculas bajo concurrencia: latencia y corrección.
+#
+#   python -m FastAPI.benchmarks.matricula_concurrente --estudiantes 500 --repeticiones 4 --concurrencia 50
+#
+# Cada estudiante se intenta matricular `--repeticiones` veces en el mismo ciclo, en paralelo.
+# Debe haber exactamente una respuesta 200 por estudiante y ninguna matrícula duplicada.
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from .. import models
+from ..main import app
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estudiantes", type=int, default=500)
+    parser.add_argument("--repeticiones", type=int, default=4)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=1)
+
+    solicitudes = [u for u in range(1, args.estudiantes + 1) for _ in range(args.repeticiones)]
+    random.Random(7).shuffle(solicitudes)
+    pendientes = iter(solicitudes)
+    estados = Counter()
+    aceptadas = Counter()
+
+    async with cliente(app) as http:
+        async def matricular():
+            id_usuario = next(pendientes)
+            respuesta = await http.post("/api/matriculas", json={"id_usuario": id_usuario, "id_ciclo": 1, "id_modalidad": 1})
+            estados[respuesta.status_code] += 1
+            if respuesta.status_code == 200:
+                aceptadas[id_usuario] += 1
+
+        resultado = await medir_carga(matricular, len(solicitudes), args.concurrencia)
+
+    with engine_sync.connect() as conn:
+        filas = conn.execute(select(func.count()).select_from(models.Matricula)).scalar()
+        pares = conn.execute(select(func.count()).select_from(
+            select(models.Matricula.id_usuario, models.Matricula.id_ciclo).distinct().subquery())).scalar()
+
+    imprimir("POST /api/matriculas", resultado)
+    imprimir("respuestas", {f"http_{codigo}": n for codigo, n in sorted(estados.items())})
+    imprimir("corrección", {
+        "matriculas": filas,
+        "duplicadas": filas - pares,
+        "estudiantes_sin_matricula": args.estudiantes - len(aceptadas),
+        "estudiantes_con_mas_de_un_200": sum(1 for n in aceptadas.values() if n > 1),
+    })
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+# Throughput del despachador de notificaciones (notificaciones por segundo).
+#
+#   python -m FastAPI.benchmarks.notificaciones_despacho --notificaciones 20000 --despachadores 1 2 --canal memoria
+#   python -m FastAPI.benchmarks.notificaciones_despacho --notificaciones 2000 --canal smtp
+#
+# Siembra la bandeja de salida (mitad email, mitad SMS) y la vacía con uno o más despachadores en
+# paralelo. --canal memoria usa CanalMemoria con latencia y fallos simulados; --canal smtp levanta
+# un servidor SMTP falso local y una pasarela SMS falsa (httpx.MockTransport) para ejercitar los
+# canales reales. Al final comprueba que todo quedó enviado (o descartado) y cuántos duplicados hubo.
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from .. import models
+from .. import notificaciones
+from ._comun import crear_bases, imprimir
+
+class SMTPFalso:
+    """Servidor SMTP mínimo (sin TLS ni autenticación) que solo cuenta los mensajes recibidos."""
+
+    def __init__(self):
+        self.recibidos = Counter()
+        self._servidor = None
+
+    async def iniciar(self) -> int:
+        self._servidor = await asyncio.start_server(self._atender, "127.0.0.1", 0)
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        self._servidor.close()
+        await self._servidor.wait_closed()
+
+    async def _atender(self, lector, escritor):
+        escritor.write(b"220 falso\r\n")
+        destinatarios = []
+        while linea := await lector.readline():
+            comando = linea.decode().strip().upper()
+            if comando.startswith(("EHLO", "HELO")):
+                escritor.write(b"250 falso\r\n")
+            elif comando.startswith("RCPT"):
+                destinatarios.append(linea.decode().split(":", 1)[1].strip())
+                escritor.write(b"250 OK\r\n")
+            elif comando == "DATA":
+                escritor.write(b"354 fin con .\r\n")
+                await escritor.drain()
+                while (await lector.readline()) != b".\r\n":
+                    pass
+                self.recibidos.update(destinatarios)
+                destinatarios = []
+                escritor.write(b"250 OK\r\n")
+            elif comando == "QUIT":
+                escritor.write(b"221 chau\r\n")
+                break
+            else:
+                escritor.write(b"250 OK\r\n")
+            await escritor.drain()
+        escritor.close()
+
+def sembrar_notificaciones(engine_sync, total: int):
+    ahora = datetime.now() - timedelta(seconds=1)
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Notificacion), [
+            {"tipo": "aviso", "titulo": f"Aviso {n}", "mensaje": "Mensaje de prueba", "destinatario": "padre",
+             "email_destinatario": f"padre{n}@academico.pe" if n % 2 else None,
+             "telefono_destinatario": None if n % 2 else f"9{n:08d}",
+             "enviado": False, "intentos": 0, "created_at": ahora, "proximo_intento": ahora}
+            for n in range(1, total + 1)
+        ])
+
+async def vaciar(engine_sync, canales: dict, despachadores: int, concurrencia: int, lote: int) -> dict:
+    instancias = [notificaciones.Despachador(canales, lote=lote, concurrencia=concurrencia, intervalo_s=0.05)
+                  for _ in range(despachadores)]
+    inicio = time.perf_counter()
+    for despachador in instancias:
+        despachador.iniciar()
+    pendientes = select(func.count()).where(
+        ~models.Notificacion.enviado, models.Notificacion.proximo_intento.is_not(None))
+    while True:
+        await asyncio.sleep(0.1)
+        with engine_sync.connect() as conn:
+            if conn.execute(pendientes).scalar() == 0:
+                break
+    duracion = time.perf_counter() - inicio
+    for despachador in instancias:
+        await despachador.detener()
+    enviadas = sum(d.enviadas for d in instancias)
+    return {
+        "s": duracion,
+        "enviadas": enviadas,
+        "reintentos": sum(d.reintentos for d in instancias),
+        "descartadas": sum(d.descartadas for d in instancias),
+        "notif_por_s": enviadas / duracion,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notificaciones", type=int, default=20_000)
+    parser.add_argument("--despachadores", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--lote", type=int, default=200)
+    parser.add_argument("--canal", choices=["memoria", "smtp"], default="memoria")
+    parser.add_argument("--latencia-ms", type=float, default=20, help="latencia simulada de CanalMemoria")
+    parser.add_argument("--fallos", type=float, default=0.02, help="tasa de fallos transitorios de CanalMemoria")
+    args = parser.parse_args()
+
+    # Reintentos casi inmediatos para que el benchmark no espere el backoff real
+    notificaciones.NOTIFICACIONES_BACKOFF_S = 0.05
+    notificaciones.NOTIFICACIONES_BACKOFF_MAX_S = 0.2
+
+    for cantidad in args.despachadores:
+        engine_sync, engine_async = crear_bases()
+        sembrar_notificaciones(engine_sync, args.notificaciones)
+        smtp = None
+        sms_recibidos = Counter()
+        if args.canal == "memoria":
+            azar = random.Random(7)
+            canales = {
+                "email": notificaciones.CanalMemoria(args.latencia_ms / 1000, args.fallos, azar.random()),
+                "sms": notificaciones.CanalMemoria(args.latencia_ms / 1000, args.fallos, azar.random()),
+            }
+        else:
+            smtp = SMTPFalso()
+            puerto = await smtp.iniciar()
+
+            def pasarela(peticion: httpx.Request) -> httpx.Response:
+                sms_recibidos[peticion.content] += 1
+                return httpx.Response(200)
+
+            canales = {
+                "email": notificaciones.CanalSMTP("127.0.0.1", puerto, None, None, "bench@academico.pe", starttls=False),
+                "sms": notificaciones.CanalSMSHTTP("http://sms.falso/enviar", transport=httpx.MockTransport(pasarela)),
+            }
+
+        imprimir(f"{cantidad} despachador(es), canal {args.canal}",
+                 await vaciar(engine_sync, canales, cantidad, args.concurrencia, args.lote))
+
+        if smtp is not None:
+            await smtp.detener()
+            entregas = smtp.recibidos + sms_recibidos
+        else:
+            entregas = Counter(canales["email"].enviados + canales["sms"].enviados)
+        with engine_sync.connect() as conn:
+            enviadas = conn.execute(select(func.count()).where(models.Notificacion.enviado)).scalar()
+        imprimir("", {"enviado=true": enviadas, "entregas": sum(entregas.values()),
+                      "duplicadas": sum(n - 1 for n in entregas.values() if n > 1)})
+        await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
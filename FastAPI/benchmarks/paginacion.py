@@ -0,0 +1,62 @@
+# Benchmark de paginación OFFSET vs keyset (cursor) recorriendo la tabla matriculas.
+#
+#   python -m FastAPI.benchmarks.paginacion --matriculas 1000000 --limit 100
+#
+# El recorrido keyset se hace completo. El de OFFSET se corta al agotar --presupuesto segundos
+# (su costo por página crece con la profundidad); en ambos casos se informa la latencia por
+# página en distintos tramos de la tabla.
+import argparse
+import asyncio
+import time
+
+from fastapi import Response
+from sqlalchemy import select
+
+from .. import models
+from ..database import AsyncSessionLocal
+from ..pagination import NEXT_CURSOR_HEADER, paginar
+from ._comun import crear_bases, imprimir, sembrar
+
+async def recorrer(modo: str, total: int, limit: int, presupuesto: float) -> dict:
+    tramos = {}
+    paginas = 0
+    skip, cursor = 0, None
+    inicio = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        while time.perf_counter() - inicio < presupuesto:
+            response = Response()
+            t0 = time.perf_counter()
+            filas = await paginar(db, response, select(models.Matricula), models.Matricula.id_matricula,
+                                  skip=skip if modo == "offset" else 0, limit=limit,
+                                  cursor=cursor if modo == "keyset" else None)
+            duracion = time.perf_counter() - t0
+            db.expunge_all()
+            tramo = min(9, paginas * limit * 10 // total)
+            tramos.setdefault(tramo, []).append(duracion)
+            paginas += 1
+            skip += limit
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+    resultado = {"paginas": paginas, "filas": min(total, paginas * limit), "total_s": time.perf_counter() - inicio}
+    for tramo, tiempos in sorted(tramos.items()):
+        resultado[f"ms_{tramo * 10}%"] = sum(tiempos) / len(tiempos) * 1000
+    return resultado
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matriculas", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--presupuesto", type=float, default=120.0)
+    args = parser.parse_args()
+
+    ciclos = 10
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.matriculas // ciclos, ciclos=ciclos, matriculas=args.matriculas)
+
+    imprimir("keyset", await recorrer("keyset", args.matriculas, args.limit, float("inf")))
+    imprimir("offset", await recorrer("offset", args.matriculas, args.limit, args.presupuesto))
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
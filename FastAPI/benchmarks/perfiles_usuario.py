@@ -0,0 +1,110 @@
+# Benchmark de las consultas de usuario + perfil con la herencia por tabla (Usuario -> Estudiante,
+# Docente, Administrador).
+#
+#   python -m FastAPI.benchmarks.perfiles_usuario --estudiantes 20000 --peticiones 5000
+#
+# "antes" reproduce la forma anterior de obtener los mismos datos: leer usuarios y después, según
+# tipo_usuario, la tabla del perfil (dos consultas), y para el listado de estudiantes un SELECT solo
+# de la tabla estudiantes. "ahora" son las consultas de los endpoints: with_polymorphic(Usuario, "*")
+# y select(Estudiante), un solo SELECT con JOIN (el listado paga el JOIN con usuarios). Después se miden los
+# endpoints por HTTP contando las sentencias SQL de cada petición. En PostgreSQL cada sentencia
+# ahorrada es además un round trip menos.
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import event, select
+
+from .. import main as api
+from .. import models
+from ..database import AsyncSessionLocal
+from ..hashing import pwd_context
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+from .login_concurrente import sembrar_personal
+
+PERFILES = {"estudiante": models.Estudiante, "docente": models.Docente, "administrador": models.Administrador}
+
+async def perfil_antes(db, id_usuario: int) -> dict:
+    usuario = (await db.execute(select(models.Usuario.__table__).where(
+        models.Usuario.__table__.c.id_usuario == id_usuario))).mappings().one()
+    tabla = PERFILES[usuario["tipo_usuario"]].__table__
+    perfil = (await db.execute(select(tabla).where(tabla.c.id_usuario == id_usuario))).mappings().one()
+    return {"usuario": usuario, usuario["tipo_usuario"]: perfil}
+
+async def perfil_ahora(db, id_usuario: int) -> dict:
+    user = await db.scalar(select(api.usuario_con_perfil).where(api.usuario_con_perfil.id_usuario == id_usuario))
+    return {"usuario": user, **api.perfil_por_rol(user)}
+
+async def listado_antes(db, desde: int, limit: int) -> list:
+    estudiantes = models.Estudiante.__table__
+    return (await db.execute(select(estudiantes).where(estudiantes.c.id_usuario > desde)
+                             .order_by(estudiantes.c.id_usuario).limit(limit))).mappings().all()
+
+async def listado_ahora(db, desde: int, limit: int) -> list:
+    return (await db.scalars(select(models.Estudiante).where(models.Estudiante.id_usuario > desde)
+                             .order_by(models.Estudiante.id_usuario).limit(limit))).all()
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estudiantes", type=int, default=20_000)
+    parser.add_argument("--peticiones", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    password_hash = pwd_context.hash("secreto123")
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=1, password_hash=password_hash)
+    personal = sembrar_personal(engine_sync, args.estudiantes // 20, args.estudiantes // 200 or 1,
+                                args.estudiantes + 1, password_hash)
+    total = args.estudiantes + len(personal)
+    azar = random.Random(7)
+
+    sentencias = []
+    event.listen(engine_async.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *resto: sentencias.append(sql.split()[0]))
+
+    async def contar(consulta, *args_consulta) -> int:
+        async with AsyncSessionLocal() as db:
+            sentencias.clear()
+            await consulta(db, *args_consulta)
+            return len(sentencias)
+
+    for nombre, consulta, argumentos in (
+        ("perfil", (perfil_antes, perfil_ahora), lambda: (azar.randint(1, total),)),
+        ("listado de estudiantes", (listado_antes, listado_ahora),
+         lambda: (azar.randint(0, args.estudiantes - args.limit), args.limit)),
+    ):
+        for etiqueta, funcion in zip(("antes", "ahora"), consulta):
+            async def peticion():
+                async with AsyncSessionLocal() as db:
+                    await funcion(db, *argumentos())
+
+            por_peticion = await contar(funcion, *argumentos())
+            resultado = await medir_carga(peticion, args.peticiones, args.concurrencia)
+            imprimir(f"{nombre}, {etiqueta}", {**resultado, "sql_por_peticion": por_peticion})
+
+    async with cliente(api.app) as http:
+        respuesta = await http.post("/api/auth/login", json={"username": personal[-1], "password": "secreto123"})
+        assert respuesta.status_code == 200, respuesta.text
+        admin = {"Authorization": f"Bearer {respuesta.json()['access_token']}"}
+
+        async def get(ruta: str, headers=None):
+            respuesta = await http.get(ruta, headers=headers)
+            assert respuesta.status_code == 200, respuesta.text
+
+        for nombre, ruta, headers in (
+            ("GET /api/usuarios/{id}/perfil", lambda: f"/api/usuarios/{azar.randint(1, total)}/perfil", admin),
+            ("GET /api/estudiantes/{id}", lambda: f"/api/estudiantes/{azar.randint(1, args.estudiantes)}", None),
+            ("GET /api/estudiantes", lambda: f"/api/estudiantes?skip=0&limit={args.limit}", None),
+        ):
+            await get(ruta(), headers)
+            sentencias.clear()
+            await get(ruta(), headers)
+            por_peticion = len(sentencias)
+            resultado = await medir_carga(lambda: get(ruta(), headers), args.peticiones // 5, args.concurrencia)
+            imprimir(nombre, {**resultado, "sql_por_peticion": por_peticion})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
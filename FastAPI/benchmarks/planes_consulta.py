@@ -0,0 +1,134 @@
+# Regresión de planes de consulta: falla (código de salida 1) si alguna consulta de los endpoints o de
+# los patrones de acceso frecuentes hace un recorrido completo (SCAN) de una tabla con más filas que
+# --umbral. Corre sobre SQLite con datos sembrados y ANALYZE.
+#
+#   python -m FastAPI.benchmarks.planes_consulta --umbral 1000
+import argparse
+import asyncio
+import re
+import sys
+from datetime import date, datetime, time
+
+from sqlalchemy import event, func, insert, select
+
+from .. import models
+from ..hashing import pwd_context
+from ..main import app
+from ._comun import cliente, crear_bases, sembrar
+
+def sembrar_academico(engine_sync, estudiantes: int, grupos: int, dias: int):
+    """Grupos, horarios, asistencias, pagos e incidencias sobre los estudiantes ya sembrados."""
+    ahora = datetime.now()
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Curso), [
+            {"id_curso": c, "nombre": f"Curso {c}", "id_ciclo": 1, "activo": True} for c in range(1, grupos + 1)
+        ])
+        conn.execute(insert(models.Grupo), [
+            {"id_grupo": g, "codigo": f"G{g}", "id_curso": g, "capacidad_maxima": 30, "activo": True}
+            for g in range(1, grupos + 1)
+        ])
+        conn.execute(insert(models.Horario), [
+            {"id_grupo": g, "dia_semana": dia, "hora_inicio": time(8 + g % 8), "hora_fin": time(9 + g % 8),
+             "aula": f"A{g % 20}"}
+            for g in range(1, grupos + 1) for dia in ("Lunes", "Miércoles", "Viernes")
+        ])
+        conn.execute(insert(models.AsistenciaEstudiante), [
+            {"id_usuario": u, "id_grupo": (u - 1) % grupos + 1, "fecha": date(2025, 3, 1 + d), "presente": (u + d) % 7 != 0,
+             "created_at": ahora}
+            for u in range(1, estudiantes + 1) for d in range(dias)
+        ])
+        conn.execute(insert(models.ConceptoPago), [{"id_concepto": 1, "nombre": "Pensión", "monto_base": 350}])
+        conn.execute(insert(models.Pago), [
+            {"id_matricula": m, "id_concepto": 1, "mes_pagado": 3, "año_pagado": 2025, "monto": 350,
+             "fecha_pago": ahora, "estado": "confirmado"}
+            for m in range(1, estudiantes + 1)
+        ])
+        conn.execute(insert(models.TipoIncidencia), [{"id_tipo": 1, "nombre": "Tardanza", "nivel_gravedad": 1}])
+        conn.execute(insert(models.Incidencia), [
+            {"id_usuario": u, "id_tipo": 1, "id_grupo": (u - 1) % grupos + 1, "fecha_incidencia": ahora,
+             "descripcion": "Llegó tarde"}
+            for u in range(1, estudiantes + 1, 3)
+        ])
+        conn.exec_driver_sql("ANALYZE")
+
+# Patrones de acceso que deben resolverse con un índice
+CONSULTAS = {
+    "matrícula existente (usuario, ciclo)": select(models.Matricula).where(
+        models.Matricula.id_usuario == 10, models.Matricula.id_ciclo == 1),
+    "matrículas de un estudiante": select(models.Matricula).where(models.Matricula.id_usuario == 10),
+    "pagos de una matrícula": select(models.Pago).where(models.Pago.id_matricula == 10),
+    "lista de un grupo en una fecha": select(models.AsistenciaEstudiante).where(
+        models.AsistenciaEstudiante.id_grupo == 3, models.AsistenciaEstudiante.fecha == date(2025, 3, 2)),
+    "asistencias de un estudiante": select(models.AsistenciaEstudiante).where(
+        models.AsistenciaEstudiante.id_usuario == 10),
+    "inscritos de un grupo": select(models.MatriculaGrupo).where(models.MatriculaGrupo.id_grupo == 3),
+    "incidencias de un estudiante": select(models.Incidencia).where(models.Incidencia.id_usuario == 10),
+    "horarios de un grupo": select(models.Horario).where(models.Horario.id_grupo == 3),
+}
+
+async def capturar_endpoints(engine_async) -> list:
+    """Ejecuta los endpoints y devuelve (endpoint, sql, parámetros) de cada SELECT que emitieron."""
+    emitidas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            emitidas.append((statement, parameters))
+
+    async with cliente(app) as http:
+        llamadas = [
+            ("GET", "/api/estudiantes/25", None),
+            ("POST", "/api/matriculas", {"id_usuario": 1, "id_ciclo": 2, "id_modalidad": 1}),
+            ("POST", "/api/auth/login", {"username": "estudiante5", "password": "incorrecta"}),
+        ]
+        # Segunda página de cada listado (keyset); la primera es un simple ORDER BY pk LIMIT
+        for ruta in ("/api/estudiantes", "/api/matriculas", "/api/ciclos", "/api/cursos", "/api/docentes"):
+            cursor = (await http.get(f"{ruta}?limit=50")).headers.get("X-Next-Cursor")
+            if cursor:
+                llamadas.append(("GET", f"{ruta}?limit=50&cursor={cursor}", None))
+
+        sentencias = []
+        event.listen(engine_async.sync_engine, "before_cursor_execute", capturar)
+        for metodo, ruta, cuerpo in llamadas:
+            emitidas.clear()
+            await http.request(metodo, ruta, json=cuerpo)
+            sentencias += [(f"{metodo} {ruta}", sql, parametros) for sql, parametros in emitidas]
+        event.remove(engine_async.sync_engine, "before_cursor_execute", capturar)
+    return sentencias
+
+def escaneos(conn, sql: str, parametros) -> set:
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parametros).all()
+    return {m.group(1) for fila in plan for m in [re.match(r"SCAN (\w+)", fila[-1])] if m}
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--umbral", type=int, default=1000)
+    parser.add_argument("--estudiantes", type=int, default=20_000)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=2, matriculas=args.estudiantes,
+            password_hash=pwd_context.hash("secreto123"))
+    sembrar_academico(engine_sync, args.estudiantes, grupos=200, dias=10)
+
+    with engine_sync.connect() as conn:
+        filas = {t.name: conn.execute(select(func.count()).select_from(t)).scalar()
+                 for t in models.Base.metadata.sorted_tables}
+
+    casos = []
+    for nombre, consulta in CONSULTAS.items():
+        compilada = consulta.compile(engine_sync)
+        casos.append((nombre, str(compilada), tuple(compilada.params[p] for p in compilada.positiontup)))
+    casos += await capturar_endpoints(engine_async)
+
+    fallos = 0
+    with engine_sync.connect() as conn:
+        for nombre, sql, parametros in casos:
+            grandes = {t for t in escaneos(conn, sql, parametros) if filas.get(t, 0) > args.umbral}
+            estado = "OK  " if not grandes else "SCAN"
+            fallos += bool(grandes)
+            print(f"{estado} {nombre:<45} {', '.join(sorted(grandes))}")
+    await engine_async.dispose()
+    sys.exit(1 if fallos else 0)
+
+if __name__ == "__main__":
+    asyncio.run(main())
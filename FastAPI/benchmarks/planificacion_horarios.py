@@ -0,0 +1,85 @@
+# Benchmark del generador de horarios: tiempo de resolución según la cantidad de grupos.
+#
+#   python -m FastAPI.benchmarks.planificacion_horarios --grupos 50 100 200 400 800 --semilla 1
+#
+# Problemas sintéticos reproducibles (misma semilla -> mismos datos y mismo resultado): 5 días de
+# 12 bloques, 3 bloques por grupo, 5 grupos por docente, cada docente disponible 4 de los 5 días y
+# aulas justas para una ocupación de `--ocupacion` (con 1.0 hacen falta reintentos). La última
+# medición corre en el ProcessPoolExecutor de la API y muestra el progreso publicado mientras resuelve.
+import argparse
+import asyncio
+import math
+import random
+import time
+
+from .. import planificador
+from ._comun import imprimir
+
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
+BLOQUES_POR_DIA = 12
+BLOQUES_POR_GRUPO = 3
+GRUPOS_POR_DOCENTE = 5
+
+def generar_problema(grupos: int, ocupacion: float, semilla: int) -> dict:
+    azar = random.Random(semilla)
+    total_bloques = len(DIAS) * BLOQUES_POR_DIA
+    aulas = math.ceil(grupos * BLOQUES_POR_GRUPO / (total_bloques * ocupacion))
+    docentes = math.ceil(grupos / GRUPOS_POR_DOCENTE)
+    disponible = {}
+    for d in range(1, docentes + 1):
+        dias = azar.sample(range(len(DIAS)), 4)
+        disponible[d] = sorted(dia * BLOQUES_POR_DIA + p for dia in dias for p in range(BLOQUES_POR_DIA))
+    return {
+        "dias": DIAS,
+        "bloques_por_dia": BLOQUES_POR_DIA,
+        "inicio_min": 8 * 60,
+        "duracion": 60,
+        "aulas": [f"A{a}" for a in range(1, aulas + 1)],
+        "grupos": [(g, (g - 1) // GRUPOS_POR_DOCENTE + 1, BLOQUES_POR_GRUPO) for g in range(1, grupos + 1)],
+        "ocupado_aula": {},
+        "ocupado_docente": {},
+        "disponible": disponible,
+    }
+
+def sin_cruces(problema: dict, asignaciones) -> bool:
+    docente = {g: d for g, d, _ in problema["grupos"]}
+    por_aula = {(b, aula) for _, b, aula in asignaciones}
+    por_docente = {(b, docente[g]) for g, b, _ in asignaciones}
+    return len(por_aula) == len(asignaciones) == len(por_docente)
+
+async def en_pool(problema: dict, tiempo_limite: float, semilla: int):
+    id_trabajo = planificador.iniciar(1, problema, tiempo_limite, semilla)
+    while True:
+        trabajo = planificador.estado(id_trabajo)
+        imprimir(f"  progreso ({trabajo.estado})", trabajo.progreso.model_dump())
+        if trabajo.estado != "en_curso":
+            return trabajo
+        await asyncio.sleep(0.5)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grupos", type=int, nargs="+", default=[50, 100, 200, 400, 800])
+    parser.add_argument("--ocupacion", type=float, default=1.0)
+    parser.add_argument("--tiempo-limite", type=float, default=10)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    for grupos in args.grupos:
+        problema = generar_problema(grupos, args.ocupacion, args.semilla)
+        inicio = time.perf_counter()
+        resultado = planificador.resolver(problema, args.tiempo_limite, args.semilla)
+        imprimir(f"{grupos} grupos", {
+            "aulas": len(problema["aulas"]),
+            "s": time.perf_counter() - inicio,
+            "intentos": resultado["intentos"],
+            "asignados": f"{len(resultado['asignaciones'])}/{resultado['total']}",
+            "sin_cruces": sin_cruces(problema, resultado["asignaciones"]),
+        })
+
+    imprimir(f"{args.grupos[-1]} grupos en el pool de procesos", {})
+    problema = generar_problema(args.grupos[-1], args.ocupacion, args.semilla)
+    await en_pool(problema, args.tiempo_limite, args.semilla)
+    planificador.cerrar()
+
+if __name__ == "__main__":
+    asyncio.run(main())
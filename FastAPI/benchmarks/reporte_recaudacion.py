@@ -0,0 +1,127 @@
+# Benchmark del reporte de recaudación sobre 5M de pagos.
+#
+#   python -m FastAPI.benchmarks.reporte_recaudacion --pagos 5000000 --matriculas 50000 --ciclos 4
+#
+# Reconstruye recaudacion_mensual (GROUP BY sobre todos los pagos) y mide GET
+# /api/reportes/recaudacion en frío, con cache, filtrado por ciclo y después de registrar un pago
+# (solo se relee el mes invalidado). Como referencia, agrega un mes recorriendo objetos Pago del ORM
+# fila por fila, compara los totales y verifica el resumen contra los pagos.
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, insert, or_, select
+
+from .. import models
+from .. import reportes
+from ..database import AsyncSessionLocal
+from ..main import app, create_access_token
+from ._comun import cliente, crear_bases, imprimir, sembrar
+
+CONCEPTOS = {1: ("Matrícula", 200), 2: ("Pensión", 350), 3: ("Constancia", 20), 4: ("Examen", 50)}
+METODOS = ["efectivo", "transferencia", "tarjeta", "yape", None]
+
+def sembrar_pagos(engine_sync, pagos: int, matriculas: int, lote: int = 100_000):
+    azar = random.Random(7)
+    inicio_año = datetime(2025, 1, 1)
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Usuario), [{
+            "id_usuario": matriculas + 1, "username": "admin", "email": "admin@academico.pe", "password_hash": "x",
+            "tipo_usuario": "administrador", "activo": True, "created_at": inicio_año, "updated_at": inicio_año,
+        }])
+        conn.execute(insert(models.ConceptoPago), [
+            {"id_concepto": c, "nombre": nombre, "monto_base": monto, "activo": True}
+            for c, (nombre, monto) in CONCEPTOS.items()
+        ])
+        for desde in range(0, pagos, lote):
+            filas = []
+            for _ in range(min(lote, pagos - desde)):
+                concepto = azar.choice((1, 2, 2, 2, 3, 4))
+                mensual = concepto == 2
+                filas.append({
+                    "id_matricula": azar.randint(1, matriculas), "id_concepto": concepto,
+                    "mes_pagado": azar.randint(1, 12) if mensual else None, "año_pagado": 2025 if mensual else None,
+                    "monto": CONCEPTOS[concepto][1] if azar.random() > 0.1 else CONCEPTOS[concepto][1] / 2,
+                    "fecha_pago": inicio_año + timedelta(minutes=azar.randrange(365 * 24 * 60)),
+                    "metodo_pago": azar.choice(METODOS),
+                    "estado": "confirmado" if azar.random() > 0.03 else "anulado",
+                })
+            conn.execute(insert(models.Pago), filas)
+
+async def mes_con_orm(mes: int) -> Decimal:
+    """Referencia: cargar cada Pago del mes y acumular en Python."""
+    inicio, fin = datetime(2025, mes, 1), datetime(2025 + mes // 12, mes % 12 + 1, 1)
+    totales = defaultdict(Decimal)
+    async with AsyncSessionLocal() as db:
+        candidatos = select(models.Pago).where(or_(
+            and_(models.Pago.año_pagado == 2025, models.Pago.mes_pagado == mes),
+            and_(models.Pago.fecha_pago >= inicio, models.Pago.fecha_pago < fin),
+        ))
+        for pago in await db.scalars(candidatos):
+            if pago.estado != "confirmado":
+                continue
+            if pago.año_pagado is not None and pago.mes_pagado is not None:
+                if (pago.año_pagado, pago.mes_pagado) != (2025, mes):
+                    continue
+            elif not inicio <= pago.fecha_pago < fin:
+                continue
+            totales[pago.id_concepto, pago.metodo_pago] += pago.monto
+    return sum(totales.values(), Decimal(0))
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pagos", type=int, default=5_000_000)
+    parser.add_argument("--matriculas", type=int, default=50_000)
+    parser.add_argument("--ciclos", type=int, default=4)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    inicio = time.perf_counter()
+    sembrar(engine_sync, estudiantes=-(-args.matriculas // args.ciclos), ciclos=args.ciclos, matriculas=args.matriculas)
+    sembrar_pagos(engine_sync, args.pagos, args.matriculas)
+    imprimir("siembra", {"pagos": args.pagos, "s": time.perf_counter() - inicio})
+    inicio = time.perf_counter()
+    with engine_sync.begin() as conn:
+        filas = reportes.reconstruir(conn)
+    imprimir("reconstruir recaudacion_mensual", {"filas": filas, "s": time.perf_counter() - inicio})
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    async with cliente(app) as http:
+        async def reporte(nombre: str, **params):
+            inicio = time.perf_counter()
+            respuesta = await http.get("/api/reportes/recaudacion", params={"año": 2025, **params}, headers=headers)
+            datos = respuesta.json()
+            imprimir(nombre, {"status": respuesta.status_code, "pagos": datos["pagos"], "total": datos["total"],
+                              "s": time.perf_counter() - inicio})
+            return datos
+
+        anual = await reporte("anual, todos los ciclos (frío)")
+        await reporte("anual, todos los ciclos (cache)")
+        await reporte("anual, ciclo 1 (frío)", id_ciclo=1)
+        await reporte("marzo, ciclo 1 (cache)", id_ciclo=1, mes=3)
+
+        nuevo = {"id_matricula": 1, "id_concepto": 2, "mes_pagado": 3, "año_pagado": 2025, "monto": "350",
+                 "metodo_pago": "efectivo"}
+        await http.post("/api/pagos", json=nuevo, headers=headers)
+        despues = await reporte("anual tras un pago (recalcula marzo)")
+        imprimir("", {"diferencia": float(Decimal(str(despues["total"])) - Decimal(str(anual["total"])))})
+        imprimir("cache", (await http.get("/api/metrics/reportes-cache")).json())
+
+        inicio = time.perf_counter()
+        total_orm = await mes_con_orm(6)
+        duracion = time.perf_counter() - inicio
+        junio = next(fila for fila in despues["por_mes"] if fila["clave"] == "2025-06")
+        imprimir("junio recorriendo el ORM", {"s": duracion, "coincide": float(total_orm) == float(junio["total"])})
+
+    inicio = time.perf_counter()
+    with engine_sync.connect() as conn:
+        diferencias = reportes.verificar(conn)
+    imprimir("verificar", {"diferencias": len(diferencias), "s": time.perf_counter() - inicio})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+# Benchmark de tasas de asistencia: resumen mensual frente a agregar los registros diarios.
+#
+#   python -m FastAPI.benchmarks.resumen_asistencia --grupos 100 --alumnos 30 --dias 180
+#
+# Siembra asistencia_estudiantes directamente, reconstruye y verifica resumen_asistencia, y compara
+# GET /api/ciclos/1/asistencia/resumen con la misma tasa calculada sobre todos los registros.
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, func, insert, select
+
+from .. import models
+from .. import resumenes
+from ..database import AsyncSessionLocal
+from ..main import app
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+from .asistencia_lote import preparar_grupos
+
+def sembrar_asistencia(engine_sync, grupos: int, alumnos: int, dias: int, lote: int = 50_000):
+    azar = random.Random(7)
+    ahora = datetime.now()
+    filas = (
+        {"id_usuario": (g - 1) * alumnos + a, "id_grupo": g, "fecha": date(2025, 1, 1) + timedelta(days=d),
+         "presente": azar.random() > 0.1, "created_at": ahora}
+        for d in range(dias) for g in range(1, grupos + 1) for a in range(1, alumnos + 1)
+    )
+    with engine_sync.begin() as conn:
+        pendientes = []
+        for fila in filas:
+            pendientes.append(fila)
+            if len(pendientes) == lote:
+                conn.execute(insert(models.AsistenciaEstudiante), pendientes)
+                pendientes = []
+        if pendientes:
+            conn.execute(insert(models.AsistenciaEstudiante), pendientes)
+
+async def tasa_desde_registros(id_ciclo: int):
+    asistencia = models.AsistenciaEstudiante
+    stmt = (
+        select(asistencia.id_grupo, func.sum(case((asistencia.presente.is_(True), 1), else_=0)), func.count())
+        .join(models.Grupo, models.Grupo.id_grupo == asistencia.id_grupo)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .where(models.Curso.id_ciclo == id_ciclo)
+        .group_by(asistencia.id_grupo)
+    )
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(stmt)).all()
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grupos", type=int, default=100)
+    parser.add_argument("--alumnos", type=int, default=30)
+    parser.add_argument("--dias", type=int, default=180)
+    parser.add_argument("--peticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    total_alumnos = args.grupos * args.alumnos
+    sembrar(engine_sync, estudiantes=total_alumnos, ciclos=1, matriculas=total_alumnos)
+    preparar_grupos(engine_sync, args.grupos, args.alumnos)
+    sembrar_asistencia(engine_sync, args.grupos, args.alumnos, args.dias)
+
+    with engine_sync.begin() as conn:
+        inicio = time.perf_counter()
+        filas = resumenes.reconstruir(conn)
+        imprimir("reconstruir", {"filas_resumen": filas, "registros": total_alumnos * args.dias,
+                                 "s": time.perf_counter() - inicio})
+        inicio = time.perf_counter()
+        diferencias = len(resumenes.verificar(conn))
+        imprimir("verificar", {"diferencias": diferencias, "s": time.perf_counter() - inicio})
+
+    async with cliente(app) as http:
+        async def desde_resumen():
+            await http.get("/api/ciclos/1/asistencia/resumen")
+
+        imprimir("ciclo desde resumen (HTTP)", await medir_carga(desde_resumen, args.peticiones, 10))
+    imprimir("ciclo desde registros (solo SQL)",
+             await medir_carga(lambda: tasa_desde_registros(1), max(1, args.peticiones // 20), 10))
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+# Benchmark de saldos por matrícula: saldos_matricula frente a sumar la tabla pagos en cada consulta.
+#
+#   python -m FastAPI.benchmarks.saldos_pagos --matriculas 20000 --meses 10 --concurrencia 50
+#
+# Siembra pagos (matrícula + pensiones mensuales, algunos parciales o pendientes), reconstruye los
+# saldos y compara GET /api/matriculas/{id}/saldo y GET /api/deudores con la agregación directa.
+# Luego registra pagos concurrentes sobre pocas matrículas (los mismos períodos a la vez) y
+# concilia: debe terminar sin diferencias.
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from .. import models
+from .. import saldos
+from ..database import AsyncSessionLocal
+from ..main import app, create_access_token
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+MATRICULA, PENSION = 1, 2
+
+def sembrar_pagos(engine_sync, matriculas: int, meses: int, lote: int = 50_000):
+    azar = random.Random(7)
+    ahora = datetime.now()
+    with engine_sync.begin() as conn:
+        conn.execute(insert(models.Usuario), [{
+            "id_usuario": matriculas + 1, "username": "admin", "email": "admin@academico.pe", "password_hash": "x",
+            "tipo_usuario": "administrador", "activo": True, "created_at": ahora, "updated_at": ahora,
+        }])
+        conn.execute(insert(models.ConceptoPago), [
+            {"id_concepto": MATRICULA, "nombre": "Matrícula", "monto_base": 200, "activo": True},
+            {"id_concepto": PENSION, "nombre": "Pensión", "monto_base": 350, "activo": True},
+        ])
+        pendientes = []
+        for m in range(1, matriculas + 1):
+            pendientes.append({"id_matricula": m, "id_concepto": MATRICULA, "mes_pagado": None, "año_pagado": None,
+                               "monto": 200, "estado": "confirmado", "fecha_pago": ahora})
+            for mes in range(1, azar.randint(1, meses) + 1):
+                monto = 350 if azar.random() > 0.2 else 175
+                estado = "confirmado" if azar.random() > 0.05 else "pendiente"
+                pendientes.append({"id_matricula": m, "id_concepto": PENSION, "mes_pagado": mes, "año_pagado": 2025,
+                                   "monto": monto, "estado": estado, "fecha_pago": ahora})
+            if len(pendientes) >= lote:
+                conn.execute(insert(models.Pago), pendientes)
+                pendientes = []
+        if pendientes:
+            conn.execute(insert(models.Pago), pendientes)
+
+async def saldo_desde_pagos(id_matricula: int):
+    stmt = saldos._reales(models.Pago.id_matricula == id_matricula)
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(stmt)).first()
+
+async def deudores_desde_pagos(limit: int):
+    real = saldos._reales().subquery()
+    deuda = (real.c.esperado - real.c.pagado).label("saldo")
+    stmt = select(real.c.id_matricula, deuda).where(deuda > 0).order_by(deuda.desc()).limit(limit)
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(stmt)).all()
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matriculas", type=int, default=20_000)
+    parser.add_argument("--meses", type=int, default=10)
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--objetivos", type=int, default=5, help="matrículas que reciben los pagos concurrentes")
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.matriculas, ciclos=1, matriculas=args.matriculas)
+    sembrar_pagos(engine_sync, args.matriculas, args.meses)
+    inicio = time.perf_counter()
+    with engine_sync.begin() as conn:
+        filas = saldos.reconstruir(conn)
+    imprimir("reconstruir", {"saldos": filas, "s": time.perf_counter() - inicio})
+
+    token = create_access_token({"sub": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+    azar = random.Random(11)
+
+    async with cliente(app) as http:
+        async def saldo_tabla():
+            await http.get(f"/api/matriculas/{azar.randint(1, args.matriculas)}/saldo", headers=headers)
+
+        async def saldo_agregado():
+            await saldo_desde_pagos(azar.randint(1, args.matriculas))
+
+        imprimir("GET saldo (saldos_matricula)", await medir_carga(saldo_tabla, args.peticiones, 10))
+        imprimir("saldo sumando pagos", await medir_carga(saldo_agregado, args.peticiones, 10))
+
+        inicio = time.perf_counter()
+        deudores = (await http.get("/api/deudores", params={"id_ciclo": 1, "limit": 100}, headers=headers)).json()
+        imprimir("GET deudores (índice)", {"filas": len(deudores), "s": time.perf_counter() - inicio})
+        inicio = time.perf_counter()
+        referencia = await deudores_desde_pagos(100)
+        imprimir("deudores sumando pagos", {"filas": len(referencia), "s": time.perf_counter() - inicio})
+        imprimir("", {"mismo_saldo_maximo": float(deudores[0]["saldo"]) == float(referencia[0].saldo)})
+
+        # Todas las peticiones caen en pocas matrículas y tres meses de 2026: compiten por el mismo saldo y
+        # por cobrar el monto_base del mismo período
+        estados = {}
+
+        async def pagar():
+            pago = {"id_matricula": azar.randint(1, args.objetivos), "id_concepto": PENSION,
+                    "mes_pagado": azar.randint(1, 3), "año_pagado": 2026,
+                    "monto": azar.choice([100, 175, 350])}
+            respuesta = await http.post("/api/pagos", json=pago, headers=headers)
+            estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+
+        imprimir("POST pagos concurrentes", await medir_carga(pagar, args.peticiones, args.concurrencia))
+        imprimir("respuestas", {f"http_{codigo}": n for codigo, n in sorted(estados.items())})
+
+    inicio = time.perf_counter()
+    with engine_sync.connect() as conn:
+        diferencias = saldos.conciliar(conn)
+    imprimir("conciliación", {"diferencias": len(diferencias), "s": time.perf_counter() - inicio})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
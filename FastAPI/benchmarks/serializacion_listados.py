@@ -0,0 +1,128 @@
+# Microbenchmark de la serialización de los listados: response_model (un modelo Pydantic por fila)
+# frente a ListadoJSON (SELECT de columnas + orjson).
+#
+#   python -m FastAPI.benchmarks.serializacion_listados --estudiantes 20000 --limit 100
+#
+# Por cada endpoint compara primero los bytes de la respuesta con SERIALIZACION_RAPIDA activada y
+# desactivada (varias páginas, incluida X-Next-Cursor). Después mide solo la serialización de una
+# página ya leída: TypeAdapter(List[Esquema]) validando los objetos ORM y generando el JSON, como hace
+# FastAPI, frente a ListadoJSON.codificar sobre las filas. Por último mide cada endpoint por HTTP en
+# los dos modos.
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import select, update
+
+from .. import main as api
+from .. import models
+from .. import saldos
+from .. import schemas
+from .. import serializacion
+from ..database import AsyncSessionLocal
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+from .login_concurrente import sembrar_personal
+from .saldos_pagos import sembrar_pagos
+
+def sembrar_cursos(engine_sync, cursos: int):
+    with engine_sync.begin() as conn:
+        conn.execute(models.Curso.__table__.insert(), [
+            {"id_curso": c, "id_ciclo": c % 2 + 1, "nombre": f"Curso {c}", "descripcion": "Álgebra y geometría",
+             "nivel_educativo": "secundaria", "activo": True}
+            for c in range(1, cursos + 1)
+        ])
+
+def cronometrar(funcion, repeticiones: int) -> float:
+    """Microsegundos por llamada."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--estudiantes", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeticiones", type=int, default=300)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    matriculas = args.estudiantes * 2
+    sembrar(engine_sync, estudiantes=args.estudiantes, ciclos=2, matriculas=matriculas)
+    sembrar_personal(engine_sync, args.estudiantes // 20, 1, matriculas + 2, "x")
+    sembrar_pagos(engine_sync, matriculas, meses=3)
+    sembrar_cursos(engine_sync, args.limit * 3)
+    with engine_sync.begin() as conn:
+        # Textos con tildes, eñes y comillas, y fechas con y sin microsegundos
+        conn.execute(update(models.Estudiante.__table__).where(models.Estudiante.__table__.c.id_usuario % 3 == 0)
+                     .values(apellido='Muñoz "Ñato" Peña', direccion="Av. Perú 123\nDpto. 4"))
+        conn.execute(update(models.Usuario.__table__).where(models.Usuario.__table__.c.id_usuario % 2 == 0)
+                     .values(created_at=datetime(2025, 3, 1, 8, 0)))
+        saldos.reconstruir(conn)
+
+    # (endpoint, ruta de la primera página, esquema, modelo, orden de la página, ListadoJSON)
+    pagina = args.limit
+    endpoints = [
+        ("/api/estudiantes", f"/api/estudiantes?limit={pagina}", schemas.Estudiante,
+         models.Estudiante, models.Estudiante.id_usuario, api.listado_estudiantes),
+        ("/api/docentes", f"/api/docentes?limit={pagina}", schemas.Docente,
+         models.Docente, models.Docente.id_usuario, api.listado_docentes),
+        ("/api/ciclos", f"/api/ciclos?limit={pagina}", schemas.Ciclo,
+         models.Ciclo, models.Ciclo.id_ciclo, api.listado_ciclos),
+        ("/api/cursos", f"/api/cursos?limit={pagina}", schemas.Curso,
+         models.Curso, models.Curso.id_curso, api.listado_cursos),
+        ("/api/matriculas", f"/api/matriculas?limit={pagina}", schemas.Matricula,
+         models.Matricula, models.Matricula.id_matricula, api.listado_matriculas),
+        ("/api/matriculas/{id}/pagos", "/api/matriculas/7/pagos?limit=2", schemas.Pago,
+         models.Pago, models.Pago.id_pago, api.listado_pagos),
+        ("/api/deudores", f"/api/deudores?limit={pagina}", schemas.SaldoMatricula,
+         models.SaldoMatricula, models.SaldoMatricula.id_matricula, api.listado_deudores),
+    ]
+
+    # Pagos y deudores exigen un administrador (el "admin" de sembrar_pagos)
+    headers = {"Authorization": f"Bearer {api.create_access_token({'sub': 'admin'})}"}
+    async with cliente(api.app) as http:
+        async def obtener(ruta: str, rapida: bool):
+            serializacion.SERIALIZACION_RAPIDA = rapida
+            respuesta = await http.get(ruta, headers=headers)
+            assert respuesta.status_code == 200, respuesta.text
+            return respuesta
+
+        for nombre, ruta, esquema, modelo, orden, listado in endpoints:
+            # Bytes idénticos en las primeras páginas (siguiendo X-Next-Cursor) en ambos modos
+            iguales, paginas, siguiente = True, 0, ruta
+            while siguiente and paginas < 3:
+                antes, ahora = await obtener(siguiente, False), await obtener(siguiente, True)
+                cursor = antes.headers.get(api.NEXT_CURSOR_HEADER)
+                iguales &= antes.content == ahora.content and cursor == ahora.headers.get(api.NEXT_CURSOR_HEADER)
+                paginas += 1
+                siguiente = f"{ruta}&cursor={cursor}" if cursor else None
+
+            async with AsyncSessionLocal() as db:
+                objetos = (await db.scalars(select(modelo).order_by(orden).limit(pagina))).all()
+                filas = (await db.execute(listado.consulta().order_by(orden).limit(pagina))).all()
+            adaptador = TypeAdapter(List[esquema])
+            modelos = lambda: adaptador.dump_json(adaptador.validate_python(objetos, from_attributes=True))
+            directo = lambda: listado.codificar(filas)
+            iguales &= modelos() == directo()
+            us_modelos = cronometrar(modelos, args.repeticiones)
+            us_directo = cronometrar(directo, args.repeticiones)
+            imprimir(f"{nombre} (serialización, {len(filas)} filas)", {
+                "bytes_identicos": iguales, "response_model_us": us_modelos, "orjson_us": us_directo,
+                "us_por_fila_antes": us_modelos / max(len(filas), 1), "us_por_fila_ahora": us_directo / max(len(filas), 1),
+                "aceleracion": us_modelos / us_directo,
+            })
+
+            for rapida in (False, True):
+                resultado = await medir_carga(lambda: obtener(ruta, rapida), args.peticiones, args.concurrencia)
+                imprimir(f"  GET {'orjson' if rapida else 'response_model'}", resultado)
+    serializacion.SERIALIZACION_RAPIDA = True
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
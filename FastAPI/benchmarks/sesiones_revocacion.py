@@ -0,0 +1,136 @@
+# Benchmark de sesiones: latencia de peticiones autenticadas con verificación de revocación,
+# sincronización incremental de revocaciones y purga de sesiones vencidas.
+#
+#   python -m FastAPI.benchmarks.sesiones_revocacion --sesiones 1000000 --revocadas 50000
+#
+# Siembra la tabla sesiones (vencidas, vigentes y revocadas en la última media hora) y mide
+# GET /api/auth/verify con un token sin sesión (camino anterior) y con uno de sesión, con la cache
+# de autenticación caliente y sin ella, contando las sentencias SQL por petición. Después revoca
+# una sesión desde "otro proceso" (UPDATE directo) y mide cuánto tarda la sincronización en
+# rechazarla, y purga las vencidas mientras se siguen atendiendo peticiones sin cache.
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, insert, or_, select, update
+
+from .. import main as api
+from .. import models
+from ..hashing import pwd_context
+from ._comun import cliente, crear_bases, imprimir, medir_carga, sembrar
+
+def sembrar_sesiones(engine_sync, total: int, revocadas: int, usuarios: int, lote: int = 50_000):
+    """60% vencidas, `revocadas` revocadas en los últimos 30 minutos, el resto vigentes."""
+    ahora = datetime.now()
+    vencidas = int(total * 0.6)
+    with engine_sync.begin() as conn:
+        for desde in range(0, total, lote):
+            filas = []
+            for n in range(desde, min(desde + lote, total)):
+                revocada = vencidas <= n < vencidas + revocadas
+                filas.append({
+                    "id_usuario": n % usuarios + 1, "token_sesion": f"sembrada{n}",
+                    "fecha_inicio": ahora - timedelta(days=8), "activa": not revocada,
+                    "fecha_expiracion": ahora - timedelta(days=1) if n < vencidas else ahora + timedelta(days=6),
+                    "revocada_en": ahora - timedelta(minutes=(n % 29) + 1) if revocada else None,
+                })
+            conn.execute(insert(models.Sesion), filas)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sesiones", type=int, default=1_000_000)
+    parser.add_argument("--revocadas", type=int, default=50_000)
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--peticiones", type=int, default=5000)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    engine_sync, engine_async = crear_bases()
+    sembrar(engine_sync, estudiantes=args.usuarios, ciclos=1, password_hash=pwd_context.hash("secreto123"))
+    inicio = time.perf_counter()
+    sembrar_sesiones(engine_sync, args.sesiones, args.revocadas, args.usuarios)
+    imprimir("siembra", {"sesiones": args.sesiones, "s": time.perf_counter() - inicio})
+
+    inicio = time.perf_counter()
+    leidas = await api.revocadas.sincronizar()
+    imprimir("carga inicial de revocadas", {"filas": leidas, "s": time.perf_counter() - inicio,
+                                            **api.revocadas.estado()})
+
+    sentencias = []
+    event.listen(engine_async.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *resto: sentencias.append(sql.split()[0]))
+
+    async with cliente(api.app) as http:
+        respuesta = await http.post("/api/auth/login", json={"username": "estudiante1", "password": "secreto123"})
+        assert respuesta.status_code == 200, respuesta.text
+        datos = respuesta.json()
+        con_sesion = {"Authorization": f"Bearer {datos['access_token']}"}
+        sin_sesion = {"Authorization": f"Bearer {api.create_access_token({'sub': 'estudiante1'})}"}
+
+        async def verificar(headers):
+            respuesta = await http.get("/api/auth/verify", headers=headers)
+            assert respuesta.status_code == 200, respuesta.text
+
+        ttl = api.cache_tokens.ttl
+        for cache in ("caliente", "sin cache"):
+            api.cache_tokens.ttl = ttl if cache == "caliente" else 0
+            api.cache_tokens.limpiar()
+            for nombre, headers in (("token sin sesión", sin_sesion), ("token de sesión", con_sesion)):
+                await verificar(headers)
+                sentencias.clear()
+                await verificar(headers)
+                por_peticion = len(sentencias)
+                resultado = await medir_carga(lambda: verificar(headers), args.peticiones, args.concurrencia)
+                imprimir(f"{nombre}, {cache}", {**resultado, "sql_por_peticion": por_peticion})
+        api.cache_tokens.ttl = ttl
+
+        # Revocación desde otro proceso: solo la ve la próxima sincronización
+        id_sesion = api.jwt.decode(datos["access_token"], api.SECRET_KEY, algorithms=[api.ALGORITHM])["sid"]
+        with engine_sync.begin() as conn:
+            conn.execute(update(models.Sesion).where(models.Sesion.id_sesion == id_sesion)
+                         .values(activa=False, revocada_en=datetime.now()))
+        antes = (await http.get("/api/auth/verify", headers=con_sesion)).status_code
+        inicio = time.perf_counter()
+        leidas = await api.revocadas.sincronizar()
+        duracion = time.perf_counter() - inicio
+        despues = (await http.get("/api/auth/verify", headers=con_sesion)).status_code
+        imprimir("revocación en otro proceso", {"antes_de_sincronizar": antes, "sincronizacion_s": duracion,
+                                                "filas_leidas": leidas, "despues": despues})
+
+        # Rotación del refresh token: el mismo token presentado dos veces a la vez rota una sola vez
+        respuesta = await http.post("/api/auth/login", json={"username": "estudiante2", "password": "secreto123"})
+        refresh = respuesta.json()["refresh_token"]
+        dobles = await asyncio.gather(*(http.post("/api/auth/refresh", json={"refresh_token": refresh})
+                                        for _ in range(2)))
+        nuevo = next(r.json() for r in dobles if r.status_code == 200)
+        logout = await http.post("/api/auth/logout", headers={"Authorization": f"Bearer {nuevo['access_token']}"})
+        tras_logout = await http.get("/api/auth/verify", headers={"Authorization": f"Bearer {nuevo['access_token']}"})
+        refresh_tras_logout = await http.post("/api/auth/refresh", json={"refresh_token": nuevo["refresh_token"]})
+        imprimir("refresh y logout", {"refresh_simultaneos": ",".join(str(r.status_code) for r in dobles),
+                                      "logout": logout.status_code, "verify_tras_logout": tras_logout.status_code,
+                                      "refresh_tras_logout": refresh_tras_logout.status_code})
+
+        # Purga por lotes mientras siguen llegando peticiones que consultan la BD
+        ahora = datetime.now()
+        with engine_sync.connect() as conn:
+            vencidas = conn.execute(select(func.count()).select_from(models.Sesion).where(or_(
+                models.Sesion.fecha_expiracion < ahora,
+                models.Sesion.revocada_en < ahora - timedelta(seconds=api.revocadas.retencion_s),
+            ))).scalar()
+        api.cache_tokens.ttl = 0
+        api.cache_tokens.limpiar()
+        inicio = time.perf_counter()
+        purga = asyncio.create_task(api.revocadas.purgar())
+        carga = await medir_carga(lambda: verificar(sin_sesion), args.peticiones // 5, args.concurrencia)
+        borradas = await purga
+        api.cache_tokens.ttl = ttl
+        imprimir("purga", {"borradas": borradas, "esperadas": vencidas, "s": time.perf_counter() - inicio})
+        imprimir("  verify sin cache durante la purga", carga)
+
+    with engine_sync.connect() as conn:
+        imprimir("sesiones restantes", {"filas": conn.execute(select(func.count()).select_from(models.Sesion)).scalar()})
+    await engine_async.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+# Benchmark de validación de esquemas: validadores estilo v1 (@validator, class Config) frente a los
+# de schemas.py (tipos Annotated con AfterValidator, field_validator, ConfigDict).
+#
+#   python -m FastAPI.benchmarks.validacion_esquemas --payloads 20000
+#
+# "antes" son copias de EstudianteCreate, MatriculaCreate y CicloCreate tal como estaban escritos con
+# la API de compatibilidad de Pydantic 1. Se validan los mismos payloads (un 10% inválidos) con
+# model_validate (dict ya decodificado, como los recibe FastAPI) y model_validate_json (bytes, como
+# la importación JSON Lines), y se comprueba que ambos dan el mismo resultado y los mismos errores.
+import argparse
+import json
+import random
+import time
+import warnings
+from datetime import date, timedelta
+from typing import Optional
+
+from pydantic import BaseModel, EmailStr, ValidationError
+
+from .. import schemas
+from ._comun import imprimir
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from pydantic import validator
+
+    class UsuarioCreateAntes(BaseModel):
+        username: str
+        email: EmailStr
+        tipo_usuario: str
+        password: str
+
+        @validator('tipo_usuario')
+        def validate_tipo_usuario(cls, v):
+            if v not in ['estudiante', 'docente', 'administrador']:
+                raise ValueError('Tipo de usuario inválido')
+            return v
+
+        @validator('password')
+        def validate_password(cls, v):
+            if len(v) < 6:
+                raise ValueError('La contraseña debe tener al menos 6 caracteres')
+            return v
+
+    class EstudianteCreateAntes(BaseModel):
+        nombre: str
+        apellido: str
+        dni: Optional[str] = None
+        telefono: Optional[str] = None
+        fecha_nacimiento: Optional[date] = None
+        direccion: Optional[str] = None
+        nombre_padre: Optional[str] = None
+        telefono_padre: Optional[str] = None
+        email_padre: Optional[EmailStr] = None
+        nivel_educativo: Optional[str] = None
+        usuario: UsuarioCreateAntes
+
+        @validator('nombre', 'apellido')
+        def validate_nombres(cls, v):
+            if len(v.strip()) < 2:
+                raise ValueError('Nombre y apellido deben tener al menos 2 caracteres')
+            return v.strip()
+
+        @validator('dni')
+        def validate_dni(cls, v):
+            if v and (len(v) != 8 or not v.isdigit()):
+                raise ValueError('DNI debe tener 8 dígitos')
+            return v
+
+    class MatriculaCreateAntes(BaseModel):
+        id_usuario: int
+        id_ciclo: int
+        id_modalidad: int
+        estado: str = 'activa'
+
+        class Config:
+            from_attributes = True
+
+    class CicloCreateAntes(BaseModel):
+        nombre: str
+        fecha_inicio: date
+        fecha_fin: date
+        fecha_inicio_matricula: date
+        fecha_fin_matricula: date
+        activo: bool = True
+
+        @validator('fecha_fin')
+        def validate_fecha_fin(cls, v, values):
+            if 'fecha_inicio' in values and v <= values['fecha_inicio']:
+                raise ValueError('La fecha de fin debe ser posterior a la fecha de inicio')
+            return v
+
+        @validator('fecha_fin_matricula')
+        def validate_fecha_fin_matricula(cls, v, values):
+            if 'fecha_inicio_matricula' in values and v <= values['fecha_inicio_matricula']:
+                raise ValueError('La fecha de fin de matrícula debe ser posterior a la fecha de inicio')
+            return v
+
+def payload_estudiante(i: int, azar: random.Random) -> dict:
+    datos = {
+        "nombre": f"  Nombre{i} ", "apellido": "Muñoz", "dni": f"{i:08d}", "telefono": "987654321",
+        "fecha_nacimiento": (date(2008, 1, 1) + timedelta(days=i % 3000)).isoformat(),
+        "direccion": "Av. Perú 123", "nombre_padre": "Juan Muñoz", "telefono_padre": "912345678",
+        "email_padre": f"padre{i}@correo.pe", "nivel_educativo": "secundaria",
+        "usuario": {"username": f"estudiante{i}", "email": f"estudiante{i}@academico.pe",
+                    "password": "secreto123", "tipo_usuario": "estudiante"},
+    }
+    if azar.random() < 0.1:
+        campo = azar.choice(["dni", "nombre", "password", "email_padre"])
+        if campo == "password":
+            datos["usuario"]["password"] = "123"
+        else:
+            datos[campo] = {"dni": "12a", "nombre": " A ", "email_padre": "no-es-email"}[campo]
+    return datos
+
+def payload_matricula(i: int, azar: random.Random) -> dict:
+    datos = {"id_usuario": i, "id_ciclo": i % 4 + 1, "id_modalidad": 1, "estado": "activa"}
+    if azar.random() < 0.1:
+        datos["id_ciclo"] = "uno"
+    return datos
+
+def payload_ciclo(i: int, azar: random.Random) -> dict:
+    inicio = date(2025, 1, 1) + timedelta(days=i % 365)
+    fin = inicio + timedelta(days=120 if azar.random() >= 0.1 else -1)
+    return {"nombre": f"Ciclo {i}", "fecha_inicio": inicio.isoformat(), "fecha_fin": fin.isoformat(),
+            "fecha_inicio_matricula": (inicio - timedelta(days=30)).isoformat(),
+            "fecha_fin_matricula": inicio.isoformat(), "activo": True}
+
+def validar_todos(validar, payloads) -> list:
+    resultados = []
+    for payload in payloads:
+        try:
+            resultados.append(validar(payload).model_dump())
+        except ValidationError as e:
+            resultados.append([(err["loc"], err["msg"]) for err in e.errors()])
+    return resultados
+
+def medir(validar, payloads, repeticiones: int) -> float:
+    """Validaciones por segundo."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for payload in payloads:
+            try:
+                validar(payload)
+            except ValidationError:
+                pass
+    return len(payloads) * repeticiones / (time.perf_counter() - inicio)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payloads", type=int, default=20_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    azar = random.Random(7)
+    casos = [
+        ("EstudianteCreate", EstudianteCreateAntes, schemas.EstudianteCreate, payload_estudiante),
+        ("MatriculaCreate", MatriculaCreateAntes, schemas.MatriculaCreate, payload_matricula),
+        ("CicloCreate", CicloCreateAntes, schemas.CicloCreate, payload_ciclo),
+    ]
+    for nombre, antes, ahora, generar in casos:
+        dicts = [generar(i, azar) for i in range(1, args.payloads + 1)]
+        bytes_json = [json.dumps(d).encode() for d in dicts]
+        iguales = (validar_todos(antes.model_validate, dicts) == validar_todos(ahora.model_validate, dicts)
+                   and validar_todos(antes.model_validate_json, bytes_json)
+                   == validar_todos(ahora.model_validate_json, bytes_json))
+        for entrada, payloads, metodo in (("dict", dicts, "model_validate"), ("json", bytes_json, "model_validate_json")):
+            por_s_antes = medir(getattr(antes, metodo), payloads, args.repeticiones)
+            por_s_ahora = medir(getattr(ahora, metodo), payloads, args.repeticiones)
+            imprimir(f"{nombre} ({entrada})", {"mismos_resultados": iguales, "antes_por_s": por_s_antes,
+                                               "ahora_por_s": por_s_ahora, "aceleracion": por_s_ahora / por_s_antes})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import BigInteger, case, cast, column, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .cache import CacheTTL
+
+# Segundos que se sirve el mismo resultado (el Dashboard consulta este endpoint en cada carga)
+ESTADISTICAS_TTL = float(os.getenv("ESTADISTICAS_TTL", "10"))
+# En PostgreSQL, tablas con al menos estas filas estimadas usan pg_class.reltuples en vez de COUNT(*)
+# (0 desactiva las aproximaciones)
+ESTADISTICAS_UMBRAL_APROXIMADO = int(os.getenv("ESTADISTICAS_UMBRAL_APROXIMADO", "1000000"))
+
+TABLAS = {
+    "total_estudiantes": models.Estudiante,
+    "total_docentes": models.Docente,
+    "total_administradores": models.Administrador,
+    "total_ciclos": models.Ciclo,
+    "total_cursos": models.Curso,
+    "total_matriculas": models.Matricula,
+    "total_pagos": models.Pago,
+}
+
+_cache = CacheTTL(max_entradas=1, ttl=ESTADISTICAS_TTL)
+_lock = asyncio.Lock()
+
+def _consulta(dialecto: str):
+    """Un solo SELECT con un conteo por tabla (un round trip en lugar de siete)."""
+    columnas = []
+    for clave, modelo in TABLAS.items():
+        # La tabla y no el modelo: Estudiante, Docente y Administrador se mapean con JOIN a usuarios
+        exacto = select(func.count()).select_from(modelo.__table__).scalar_subquery()
+        if dialecto == "postgresql" and ESTADISTICAS_UMBRAL_APROXIMADO > 0:
+            # PostgreSQL solo ejecuta la subconsulta COUNT(*) si se toma esa rama del CASE
+            estimado = (
+                select(column("reltuples"))
+                .select_from(table("pg_class"))
+                .where(column("oid") == literal_column(f"'{modelo.__tablename__}'::regclass"))
+                .scalar_subquery()
+            )
+            aproximado = func.coalesce(estimado, -1) >= ESTADISTICAS_UMBRAL_APROXIMADO
+            columnas.append(case((aproximado, cast(estimado, BigInteger)), else_=exacto).label(clave))
+            columnas.append(aproximado.label(f"{clave}_aproximado"))
+        else:
+            columnas.append(exacto.label(clave))
+    return select(*columnas)
+
+async def calcular(db: AsyncSession) -> dict:
+    fila = (await db.execute(_consulta(db.get_bind().dialect.name))).mappings().one()
+    return {
+        **{clave: int(fila[clave]) for clave in TABLAS},
+        "exacto": {clave: not fila.get(f"{clave}_aproximado", False) for clave in TABLAS},
+        "generado_en": datetime.now(),
+        "_generado_monotonic": time.monotonic(),
+    }
+
+async def obtener(db: AsyncSession) -> dict:
+    """Estadísticas desde la cache; solo una petición recalcula cuando expiran."""
+    resultado = _cache.get("estadisticas")
+    if resultado is None:
+        async with _lock:
+            resultado = _cache.get("estadisticas")
+            if resultado is None:
+                resultado = await calcular(db)
+                _cache.set("estadisticas", resultado)
+    respuesta = {clave: valor for clave, valor in resultado.items() if not clave.startswith("_")}
+    respuesta["antiguedad_s"] = round(time.monotonic() - resultado["_generado_monotonic"], 3)
+    return respuesta
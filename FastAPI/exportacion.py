@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from . import models
+from .database import AsyncSessionLocal
+
+# Filas por lote del cursor del servidor (yield_per) y por chunk de la respuesta
+EXPORTACION_LOTE = int(os.getenv("EXPORTACION_LOTE", "2000"))
+
+# recurso -> (modelo, columna de fecha para desde/hasta, cómo filtrar por ciclo)
+RECURSOS = {
+    "matriculas": (
+        models.Matricula,
+        models.Matricula.fecha_matricula,
+        lambda stmt, id_ciclo: stmt.where(models.Matricula.id_ciclo == id_ciclo),
+    ),
+    "pagos": (
+        models.Pago,
+        models.Pago.fecha_pago,
+        lambda stmt, id_ciclo: stmt.join(models.Matricula, models.Matricula.id_matricula == models.Pago.id_matricula)
+        .where(models.Matricula.id_ciclo == id_ciclo),
+    ),
+    "asistencias": (
+        models.AsistenciaEstudiante,
+        models.AsistenciaEstudiante.fecha,
+        lambda stmt, id_ciclo: stmt.join(models.Grupo, models.Grupo.id_grupo == models.AsistenciaEstudiante.id_grupo)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .where(models.Curso.id_ciclo == id_ciclo),
+    ),
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def construir_consulta(recurso: str, columnas: Optional[str], id_ciclo: Optional[int],
+                       desde: Optional[date], hasta: Optional[date]):
+    """SELECT de solo las columnas pedidas, filtrado y ordenado por clave primaria."""
+    if recurso not in RECURSOS:
+        raise HTTPException(status_code=404, detail="Recurso de exportación no encontrado")
+    modelo, columna_fecha, filtro_ciclo = RECURSOS[recurso]
+    tabla = modelo.__table__
+    nombres = [c.strip() for c in columnas.split(",") if c.strip()] if columnas else list(tabla.c.keys())
+    desconocidas = [nombre for nombre in nombres if nombre not in tabla.c]
+    if desconocidas:
+        raise HTTPException(status_code=400, detail=f"Columnas desconocidas: {', '.join(desconocidas)}")
+
+    stmt = select(*[tabla.c[nombre] for nombre in nombres]).order_by(*tabla.primary_key.columns)
+    if id_ciclo is not None:
+        stmt = filtro_ciclo(stmt, id_ciclo)
+    # desde/hasta son días completos (inclusive) también para columnas DateTime
+    if desde is not None:
+        stmt = stmt.where(columna_fecha >= desde)
+    if hasta is not None:
+        stmt = stmt.where(columna_fecha < hasta + timedelta(days=1))
+    return stmt, nombres
+
+def _json_default(valor):
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def _csv_valor(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    return valor
+
+async def generar(stmt, nombres: List[str], formato: str) -> AsyncIterator[bytes]:
+    """Recorre la consulta con un cursor del servidor y emite un chunk por lote: memoria constante.
+
+    Usa su propia sesión porque la respuesta se sigue enviando después de que el endpoint retorna.
+    """
+    async with AsyncSessionLocal() as db:
+        resultado = await db.stream(stmt.execution_options(yield_per=EXPORTACION_LOTE))
+        if formato == "csv":
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            escritor.writerow(nombres)
+            async for filas in resultado.partitions():
+                escritor.writerows([_csv_valor(valor) for valor in fila] for fila in filas)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            async for filas in resultado.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(nombres, fila)), default=_json_default, ensure_ascii=False) + "\n"
+                    for fila in filas
+                ).encode()
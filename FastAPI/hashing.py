@@ -0,0 +1,92 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Costo de bcrypt (2^rounds iteraciones). Los hashes con otro costo se regeneran al hacer login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt libera el GIL, por lo que un pool de hilos aprovecha varios núcleos
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Operaciones en curso + en cola a partir de las cuales se responde 503
+HASH_MAX_PENDIENTES = int(os.getenv("HASH_MAX_PENDIENTES", "64"))
+# Pausa de hash_lote mientras todos los workers están ocupados
+HASH_ESPERA_LOTE_S = 0.005
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+class HasherSaturado(Exception):
+    """El pool de hashing alcanzó su límite de operaciones pendientes."""
+
+class PoolHashing:
+    """Ejecuta bcrypt en un pool de hilos acotado, fuera del event loop."""
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pendientes: int = HASH_MAX_PENDIENTES):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.pendientes = 0
+        self.rechazadas = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def _ejecutar(self, funcion, *args):
+        # Solo se modifica desde el event loop, no necesita lock
+        if self.pendientes >= self.max_pendientes:
+            self.rechazadas += 1
+            raise HasherSaturado()
+        self.pendientes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+        finally:
+            self.pendientes -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._ejecutar(pwd_context.hash, password)
+
+    async def verificar(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """Devuelve (válida, nuevo_hash); nuevo_hash no es None si el hash usa un costo desactualizado."""
+        return await self._ejecutar(pwd_context.verify_and_update, password, password_hash)
+
+    async def hash_lote(self, passwords: List[str]) -> List[str]:
+        """Hashea una lista completa (importaciones) usando solo los workers que están libres.
+
+        Cada tanda cuenta en `pendientes` y ocupa como mucho los workers sin trabajo; si hay logins
+        en curso o en cola, el lote espera. Así nunca supera HASH_MAX_PENDIENTES ni hace que un login
+        espere más que un hash del lote.
+        """
+        loop = asyncio.get_running_loop()
+        hashes = []
+        while len(hashes) < len(passwords):
+            libres = min(self.workers, self.max_pendientes) - self.pendientes
+            if libres <= 0:
+                await asyncio.sleep(HASH_ESPERA_LOTE_S)
+                continue
+            lote = passwords[len(hashes):len(hashes) + libres]
+            self.pendientes += len(lote)
+            try:
+                hashes += await asyncio.gather(
+                    *(loop.run_in_executor(self._executor, pwd_context.hash, password) for password in lote)
+                )
+            finally:
+                self.pendientes -= len(lote)
+        return hashes
+
+    def estado(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pendientes": self.max_pendientes,
+            "pendientes": self.pendientes,
+            "rechazadas": self.rechazadas,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+pool_hashing = PoolHashing()
@@ -0,0 +1,139 @@
+# Detección de cruces de horario: misma aula o mismo docente, mismo día, tramos que se solapan.
+#
+# Solo se comparan horarios de grupos activos cuyos ciclos se superponen en fechas (un aula puede
+# repetirse en ciclos distintos). Un horario nuevo o editado se verifica con consultas sobre los
+# índices (aula, dia_semana, hora_inicio) y (id_grupo, dia_semana, hora_inicio); la validación de
+# un ciclo completo carga sus tramos una vez y los recorre ordenados por clave (aula/docente, día).
+# Verificar y guardar van bajo un bloqueo por clave hasta el COMMIT (bloquear): sin él, dos peticiones
+# simultáneas para la misma aula o el mismo docente pasan ambas la verificación y se guardan las dos.
+import heapq
+from collections import defaultdict
+from datetime import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import false, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from . import schemas
+
+# (clave, inicio, fin, id_horario, id_grupo); clave = (tipo, recurso, dia_semana)
+Tramo = Tuple[tuple, time, time, int, int]
+
+def claves(horario: schemas.HorarioCreate, id_docente: Optional[int]) -> List[tuple]:
+    """Claves (tipo, recurso, dia_semana) que ocupa `horario`, las mismas que agrupan los tramos."""
+    resultado = []
+    if horario.aula:
+        resultado.append(("aula", horario.aula, horario.dia_semana))
+    if id_docente is not None:
+        resultado.append(("docente", str(id_docente), horario.dia_semana))
+    return resultado
+
+async def bloquear(db: AsyncSession, claves_tramos: Iterable[tuple]):
+    """Bloquea hasta el fin de la transacción las claves de los tramos a verificar y guardar."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Un bloqueo consultivo por clave, en orden para que dos transacciones no se crucen
+        for clave in sorted(set(claves_tramos)):
+            await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(":".join(clave), 0))))
+    else:
+        # SQLite no tiene bloqueos por clave: una escritura (que no cambia filas) abre la transacción
+        # con el bloqueo de escritura de la base, y los demás esperan a que esta confirme
+        grupos = models.Grupo.__table__
+        await db.execute(update(grupos).where(false()).values(id_grupo=grupos.c.id_grupo))
+
+def _horarios_vigentes(fecha_inicio, fecha_fin):
+    """SELECT de horarios de grupos activos en ciclos que se superponen con [fecha_inicio, fecha_fin]."""
+    return (
+        select(
+            models.Horario.id_horario, models.Horario.id_grupo, models.Horario.aula, models.Horario.dia_semana,
+            models.Horario.hora_inicio, models.Horario.hora_fin, models.Grupo.id_docente, models.Curso.id_ciclo,
+        )
+        .join(models.Grupo, models.Grupo.id_grupo == models.Horario.id_grupo)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .join(models.Ciclo, models.Ciclo.id_ciclo == models.Curso.id_ciclo)
+        .where(
+            models.Grupo.activo.isnot(False),
+            models.Ciclo.fecha_inicio <= fecha_fin,
+            models.Ciclo.fecha_fin >= fecha_inicio,
+        )
+    )
+
+async def contexto_grupo(db: AsyncSession, id_grupo: int):
+    """(id_docente, fecha_inicio, fecha_fin) del grupo y su ciclo, o None si el grupo no existe."""
+    return (await db.execute(
+        select(models.Grupo.id_docente, models.Ciclo.fecha_inicio, models.Ciclo.fecha_fin)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .join(models.Ciclo, models.Ciclo.id_ciclo == models.Curso.id_ciclo)
+        .where(models.Grupo.id_grupo == id_grupo)
+    )).first()
+
+async def conflictos(db: AsyncSession, horario: schemas.HorarioCreate, contexto,
+                     id_horario: Optional[int] = None) -> List[schemas.ConflictoHorario]:
+    """Cruces de `horario` (nuevo, o el existente `id_horario` con datos nuevos) con los ya guardados."""
+    id_docente, fecha_inicio, fecha_fin = contexto
+    h = models.Horario
+    stmt = _horarios_vigentes(fecha_inicio, fecha_fin).where(
+        h.dia_semana == horario.dia_semana,
+        h.hora_inicio < horario.hora_fin,
+        h.hora_fin > horario.hora_inicio,
+    )
+    if id_horario is not None:
+        stmt = stmt.where(h.id_horario != id_horario)
+
+    consultas = []
+    if horario.aula:
+        consultas.append(("aula", horario.aula, stmt.where(h.aula == horario.aula)))
+    if id_docente is not None:
+        consultas.append(("docente", str(id_docente), stmt.where(models.Grupo.id_docente == id_docente)))
+
+    resultado = []
+    for tipo, recurso, consulta in consultas:
+        for otro in await db.execute(consulta):
+            resultado.append(schemas.ConflictoHorario(
+                tipo=tipo, recurso=recurso, dia_semana=horario.dia_semana,
+                id_horario=id_horario, id_horario_conflicto=otro.id_horario, id_grupo_conflicto=otro.id_grupo,
+                desde=max(horario.hora_inicio, otro.hora_inicio), hasta=min(horario.hora_fin, otro.hora_fin),
+            ))
+    return resultado
+
+def solapamientos(tramos: Iterable[Tramo]) -> Iterator[Tuple[Tramo, Tramo]]:
+    """Todos los pares de tramos de una misma clave que se solapan, en O(n log n + pares).
+
+    Por cada clave recorre los tramos ordenados por inicio manteniendo en un heap (por fin) los
+    que siguen abiertos: cada tramo nuevo se cruza exactamente con los abiertos que quedan.
+    """
+    por_clave = defaultdict(list)
+    for tramo in tramos:
+        por_clave[tramo[0]].append(tramo)
+    for lista in por_clave.values():
+        lista.sort(key=lambda tramo: (tramo[1], tramo[2]))
+        abiertos = []
+        for tramo in lista:
+            while abiertos and abiertos[0][0] <= tramo[1]:
+                heapq.heappop(abiertos)
+            for _, _, otro in abiertos:
+                yield otro, tramo
+            heapq.heappush(abiertos, (tramo[2], tramo[3], tramo))
+
+async def conflictos_ciclo(db: AsyncSession, ciclo: models.Ciclo) -> List[schemas.ConflictoHorario]:
+    """Cada par de horarios que se cruzan, con al menos uno de los dos en `ciclo`."""
+    del_ciclo = set()
+    tramos = []
+    for horario in await db.execute(_horarios_vigentes(ciclo.fecha_inicio, ciclo.fecha_fin)):
+        if horario.id_ciclo == ciclo.id_ciclo:
+            del_ciclo.add(horario.id_horario)
+        datos = (horario.hora_inicio, horario.hora_fin, horario.id_horario, horario.id_grupo)
+        if horario.aula:
+            tramos.append((("aula", horario.aula, horario.dia_semana),) + datos)
+        if horario.id_docente is not None:
+            tramos.append((("docente", str(horario.id_docente), horario.dia_semana),) + datos)
+
+    return [
+        schemas.ConflictoHorario(
+            tipo=a[0][0], recurso=a[0][1], dia_semana=a[0][2],
+            id_horario=a[3], id_horario_conflicto=b[3], id_grupo_conflicto=b[4],
+            desde=max(a[1], b[1]), hasta=min(a[2], b[2]),
+        )
+        for a, b in solapamientos(tramos)
+        if a[3] in del_ciclo or b[3] in del_ciclo
+    ]
@@ -0,0 +1,233 @@
+# Importación masiva de estudiantes (CSV o JSON Lines).
+#
+# Corre como trabajo en segundo plano: POST /api/estudiantes/importar responde 202 con el id y el avance
+# se consulta en /api/importaciones/{id_trabajo}. Con bcrypt de costo 12 cada fila cuesta ~250 ms de CPU,
+# así que un padrón real tarda minutos y no cabe en una petición HTTP. Cada lote se hashea con los
+# workers libres del pool (los logins tienen prioridad) y se confirma por separado: si el proceso se
+# detiene, los lotes ya insertados quedan y al reimportar el archivo se reportan como ya registrados.
+# Los trabajos viven en memoria del proceso de la API que los creó.
+import asyncio
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from . import schemas
+from .cache import CacheTTL
+from .database import AsyncSessionLocal
+from .hashing import pool_hashing
+
+# Filas por INSERT multi-fila / transacción
+IMPORTACION_LOTE = 1000
+# Valores por cláusula IN al buscar usuarios ya registrados
+CONSULTA_LOTE = 5000
+
+CAMPOS_USUARIO = ("username", "email", "password")
+CAMPOS_ESTUDIANTE = (
+    "nombre", "apellido", "dni", "telefono", "fecha_nacimiento", "direccion",
+    "nombre_padre", "telefono_padre", "email_padre", "nivel_educativo",
+)
+
+def leer_filas(contenido: str, formato: str) -> Iterator[Tuple[int, object]]:
+    """Devuelve (número de fila, datos) por cada registro; datos es un dict o un str con el error."""
+    texto = io.StringIO(contenido)
+    if formato == "csv":
+        # Fila 1 = encabezados; cada fila lleva los campos del usuario y del estudiante en columnas planas
+        lector = csv.DictReader(texto)
+        try:
+            lector.fieldnames
+        except csv.Error as e:
+            yield 1, f"CSV inválido: {e}"
+            return
+        numero = 1
+        while True:
+            numero += 1
+            # Un csv.Error (campo demasiado largo, NUL...) invalida solo esa fila; el lector sigue con la próxima
+            try:
+                fila = next(lector)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield numero, f"CSV inválido: {e}"
+                continue
+            # DictReader guarda los campos sobrantes como lista bajo la clave None
+            if None in fila:
+                yield numero, "columnas de más"
+                continue
+            valores = {campo: (valor.strip() or None) if valor is not None else None for campo, valor in fila.items()}
+            datos = {campo: valores.get(campo) for campo in CAMPOS_ESTUDIANTE}
+            datos["usuario"] = {campo: valores.get(campo) for campo in CAMPOS_USUARIO}
+            yield numero, datos
+    else:
+        for numero, linea in enumerate(texto, start=1):
+            if not linea.strip():
+                continue
+            try:
+                yield numero, json.loads(linea)
+            except ValueError:
+                yield numero, "JSON inválido"
+
+def validar(filas: Iterator[Tuple[int, object]], errores: Dict[int, List[str]]) -> List[Tuple[int, schemas.EstudianteCreate]]:
+    validas = []
+    vistos = {"username": set(), "email": set(), "dni": set()}
+    for numero, datos in filas:
+        if not isinstance(datos, dict):
+            errores[numero] = [datos if isinstance(datos, str) else "Se esperaba un objeto JSON"]
+            continue
+        if isinstance(datos.get("usuario"), dict):
+            datos["usuario"].setdefault("tipo_usuario", "estudiante")
+        try:
+            estudiante = schemas.EstudianteCreate.model_validate(datos)
+        except ValidationError as e:
+            errores[numero] = [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()]
+            continue
+        if estudiante.usuario.tipo_usuario != "estudiante":
+            errores[numero] = ["usuario.tipo_usuario: debe ser 'estudiante'"]
+            continue
+        claves = {"username": estudiante.usuario.username, "email": estudiante.usuario.email, "dni": estudiante.dni}
+        repetidas = [campo for campo, valor in claves.items() if valor is not None and valor in vistos[campo]]
+        if repetidas:
+            errores[numero] = [f"{campo} repetido en el archivo" for campo in repetidas]
+            continue
+        for campo, valor in claves.items():
+            vistos[campo].add(valor)
+        validas.append((numero, estudiante))
+    return validas
+
+async def descartar_existentes(db: AsyncSession, validas, errores: Dict[int, List[str]]):
+    """Quita las filas cuyo username, email o DNI ya está registrado (consultas por lotes con IN)."""
+    usados = {"username": set(), "email": set(), "dni": set()}
+    # La tabla y no el modelo Estudiante, que agregaría el JOIN con usuarios
+    estudiantes = models.Estudiante.__table__
+    for inicio in range(0, len(validas), CONSULTA_LOTE):
+        lote = [estudiante for _, estudiante in validas[inicio:inicio + CONSULTA_LOTE]]
+        usernames = [e.usuario.username for e in lote]
+        emails = [e.usuario.email for e in lote]
+        dnis = [e.dni for e in lote if e.dni]
+        for username, email in await db.execute(
+            select(models.Usuario.username, models.Usuario.email).where(
+                or_(models.Usuario.username.in_(usernames), models.Usuario.email.in_(emails)))
+        ):
+            usados["username"].add(username)
+            usados["email"].add(email)
+        if dnis:
+            usados["dni"].update(await db.scalars(select(estudiantes.c.dni).where(estudiantes.c.dni.in_(dnis))))
+
+    restantes = []
+    for numero, estudiante in validas:
+        claves = {"username": estudiante.usuario.username, "email": estudiante.usuario.email, "dni": estudiante.dni}
+        registradas = [campo for campo, valor in claves.items() if valor is not None and valor in usados[campo]]
+        if registradas:
+            errores[numero] = [f"{campo} ya registrado" for campo in registradas]
+        else:
+            restantes.append((numero, estudiante))
+    return restantes
+
+def _valores(estudiante: schemas.EstudianteCreate, password_hash: str) -> dict:
+    # Columnas de usuarios y de estudiantes juntas; tipo_usuario lo pone el mapeo de Estudiante
+    return {
+        **estudiante.model_dump(exclude={"usuario"}),
+        "username": estudiante.usuario.username,
+        "email": estudiante.usuario.email,
+        "password_hash": password_hash,
+    }
+
+async def insertar_lote(db: AsyncSession, lote, hashes, errores: Dict[int, List[str]]) -> int:
+    """Un INSERT masivo de Estudiante en una transacción (usuarios con RETURNING, luego estudiantes)."""
+    valores = [_valores(estudiante, password_hash) for (_, estudiante), password_hash in zip(lote, hashes)]
+    try:
+        await db.execute(insert(models.Estudiante), valores)
+        await db.commit()
+        return len(lote)
+    except IntegrityError:
+        # Otro proceso registró alguno de estos datos entre tanto: se reintenta fila por fila
+        await db.rollback()
+
+    insertados = 0
+    for (numero, _), fila in zip(lote, valores):
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(models.Estudiante), [fila])
+            insertados += 1
+        except IntegrityError:
+            errores[numero] = ["Username, email o DNI ya registrado"]
+    await db.commit()
+    return insertados
+
+def _validar_archivo(contenido: str, formato: str, errores: Dict[int, List[str]]):
+    filas = list(leer_filas(contenido, formato))
+    return len(filas), validar(filas, errores)
+
+async def importar_estudiantes(db: AsyncSession, contenido: str, formato: str,
+                               progreso: Optional[dict] = None) -> schemas.ResultadoImportacion:
+    progreso = {} if progreso is None else progreso
+    errores: Dict[int, List[str]] = {}
+    # La validación (EmailStr, ~150 µs por email) corre en un hilo para no detener el event loop
+    total, validas = await asyncio.to_thread(_validar_archivo, contenido, formato, errores)
+    validas = await descartar_existentes(db, validas, errores)
+    # Cierra la transacción de las consultas: no retener una conexión del pool durante el bcrypt
+    await db.commit()
+    progreso.update(filas=total, validas=len(validas))
+
+    insertados = 0
+    for inicio in range(0, len(validas), IMPORTACION_LOTE):
+        lote = validas[inicio:inicio + IMPORTACION_LOTE]
+        hashes = await pool_hashing.hash_lote([estudiante.usuario.password for _, estudiante in lote])
+        insertados += await insertar_lote(db, lote, hashes, errores)
+        progreso["insertados"] = insertados
+
+    return schemas.ResultadoImportacion(
+        total=total,
+        insertados=insertados,
+        errores=[schemas.ErrorImportacion(fila=numero, errores=mensajes) for numero, mensajes in sorted(errores.items())],
+    )
+
+# ========== TRABAJOS EN SEGUNDO PLANO ==========
+trabajos = CacheTTL(max_entradas=100, ttl=24 * 3600)
+# Referencias fuertes a las tareas en curso (el event loop solo guarda referencias débiles)
+_tareas: Set[asyncio.Task] = set()
+
+async def _ejecutar(contenido: str, formato: str, progreso: dict) -> schemas.ResultadoImportacion:
+    async with AsyncSessionLocal() as db:
+        return await importar_estudiantes(db, contenido, formato, progreso)
+
+def iniciar(contenido: bytes, formato: str) -> str:
+    """Crea el trabajo de importación; UnicodeDecodeError si el archivo no está en UTF-8."""
+    texto = contenido.decode("utf-8-sig")
+    id_trabajo = uuid.uuid4().hex
+    progreso = {"filas": 0, "validas": 0, "insertados": 0}
+    tarea = asyncio.create_task(_ejecutar(texto, formato, progreso))
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+    trabajos.set(id_trabajo, {"tarea": tarea, "progreso": progreso, "creado": datetime.now()})
+    return id_trabajo
+
+def estado(id_trabajo: str) -> Optional[schemas.TrabajoImportacion]:
+    trabajo = trabajos.get(id_trabajo)
+    if trabajo is None:
+        return None
+    tarea = trabajo["tarea"]
+    respuesta = schemas.TrabajoImportacion(
+        id_trabajo=id_trabajo, estado="en_curso", progreso=schemas.ProgresoImportacion(**trabajo["progreso"]))
+    if not tarea.done():
+        return respuesta
+    if tarea.cancelled() or tarea.exception() is not None:
+        respuesta.estado = "fallido"
+        respuesta.error = "Importación cancelada" if tarea.cancelled() else str(tarea.exception())
+        return respuesta
+    respuesta.estado = "terminado"
+    respuesta.resultado = tarea.result()
+    return respuesta
+
+async def cerrar():
+    for tarea in list(_tareas):
+        tarea.cancel()
+    await asyncio.gather(*_tareas, return_exceptions=True)
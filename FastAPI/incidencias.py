@@ -0,0 +1,203 @@
+# Aviso automático a los padres a partir de las incidencias registradas.
+#
+# POST /api/incidencias solo inserta la incidencia. El encolador (tarea en segundo plano de la API o
+# de `python -m FastAPI.notificaciones`) reserva con SKIP LOCKED las incidencias sin aviso y las pasa
+# a la bandeja de salida en una transacción:
+#   - gravedad >= INCIDENCIAS_GRAVEDAD_INMEDIATA: un aviso por incidencia, enseguida (SMS si hay teléfono)
+#   - el resto: un resumen diario por padre (email si hay), con las incidencias anteriores al corte
+#     de INCIDENCIAS_HORA_RESUMEN
+# notificado_padre y fecha_notificacion se marcan con un UPDATE por lote cuando el despachador
+# confirma la entrega del aviso.
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import List, Optional
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from . import notificaciones
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+INCIDENCIAS_NOTIFICAR = os.getenv("INCIDENCIAS_NOTIFICAR", "true").lower() in ("1", "true", "yes")
+INCIDENCIAS_GRAVEDAD_INMEDIATA = int(os.getenv("INCIDENCIAS_GRAVEDAD_INMEDIATA", "3"))
+INCIDENCIAS_HORA_RESUMEN = time.fromisoformat(os.getenv("INCIDENCIAS_HORA_RESUMEN", "18:00"))
+INCIDENCIAS_LOTE = int(os.getenv("INCIDENCIAS_LOTE", "500"))
+INCIDENCIAS_INTERVALO_S = float(os.getenv("INCIDENCIAS_INTERVALO_S", "5"))
+
+def ultimo_corte(ahora: datetime) -> datetime:
+    """Corte del resumen diario más reciente: hoy a INCIDENCIAS_HORA_RESUMEN, o ayer si aún no llegó."""
+    corte = datetime.combine(ahora.date(), INCIDENCIAS_HORA_RESUMEN)
+    return corte if ahora >= corte else corte - timedelta(days=1)
+
+def _aviso_inmediato(fila) -> dict:
+    return {
+        "id_usuario": fila.id_usuario,
+        "tipo": "incidencia",
+        "titulo": f"Incidencia: {fila.tipo}",
+        "mensaje": (f"{fila.nombre} {fila.apellido} - {fila.fecha_incidencia:%d/%m/%Y %H:%M}: {fila.descripcion}"
+                    + (f" Acción tomada: {fila.accion_tomada}" if fila.accion_tomada else "")),
+        "destinatario": "padre",
+        "telefono_destinatario": fila.telefono_padre,
+        "email_destinatario": fila.email_padre,
+        "metodo_envio": "sms" if fila.telefono_padre else "email",
+    }
+
+def _resumen(filas: list) -> dict:
+    primera = filas[0]
+    estudiantes = {fila.id_usuario for fila in filas}
+    lineas = [f"- {fila.fecha_incidencia:%d/%m/%Y} {fila.nombre} {fila.apellido} ({fila.tipo}): {fila.descripcion}"
+              for fila in filas]
+    return {
+        "id_usuario": primera.id_usuario if len(estudiantes) == 1 else None,
+        "tipo": "resumen_incidencias",
+        "titulo": f"Resumen de incidencias ({len(filas)})",
+        "mensaje": "\n".join([f"Estimado(a) {primera.nombre_padre or 'padre de familia'}:"] + lineas),
+        "destinatario": "padre",
+        "telefono_destinatario": primera.telefono_padre,
+        "email_destinatario": primera.email_padre,
+        "metodo_envio": "email" if primera.email_padre else "sms",
+    }
+
+class Encolador:
+    def __init__(self, lote: int = INCIDENCIAS_LOTE, intervalo_s: float = INCIDENCIAS_INTERVALO_S):
+        self.lote = lote
+        self.intervalo_s = intervalo_s
+        self.inmediatos = 0
+        self.resumenes = 0
+        self._despertar = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+
+    async def procesar_lote(self, corte: Optional[datetime] = None) -> int:
+        """Pasa a la bandeja de salida un lote de incidencias; devuelve cuántas reservó.
+
+        `corte`: las leves anteriores entran al resumen (por defecto, el último corte diario).
+        """
+        ahora = datetime.now()
+        corte = corte or ultimo_corte(ahora)
+        # La tabla estudiantes y no el modelo Estudiante, que agregaría el JOIN con usuarios
+        incidencia, estudiante, tipo = models.Incidencia, models.Estudiante.__table__, models.TipoIncidencia
+        stmt = (
+            select(incidencia.id_incidencia, incidencia.id_usuario, incidencia.fecha_incidencia,
+                   incidencia.descripcion, incidencia.accion_tomada, tipo.nombre.label("tipo"), tipo.nivel_gravedad,
+                   estudiante.c.nombre, estudiante.c.apellido, estudiante.c.nombre_padre, estudiante.c.email_padre,
+                   estudiante.c.telefono_padre)
+            .join(tipo, tipo.id_tipo == incidencia.id_tipo)
+            .join(estudiante, estudiante.c.id_usuario == incidencia.id_usuario)
+            .where(
+                incidencia.id_notificacion.is_(None),
+                ~incidencia.notificado_padre,
+                or_(estudiante.c.email_padre.is_not(None), estudiante.c.telefono_padre.is_not(None)),
+                or_(tipo.nivel_gravedad >= INCIDENCIAS_GRAVEDAD_INMEDIATA,
+                    incidencia.fecha_incidencia < corte),
+            )
+            .order_by(incidencia.id_incidencia)
+            .limit(self.lote)
+            .with_for_update(skip_locked=True, of=incidencia)
+        )
+        async with AsyncSessionLocal() as db:
+            filas = (await db.execute(stmt)).all()
+            if not filas:
+                return 0
+            avisos, incluidas = [], []
+            por_padre = defaultdict(list)
+            for fila in filas:
+                if fila.nivel_gravedad >= INCIDENCIAS_GRAVEDAD_INMEDIATA:
+                    avisos.append(_aviso_inmediato(fila))
+                    incluidas.append([fila.id_incidencia])
+                else:
+                    por_padre[(fila.email_padre or "").lower(), fila.telefono_padre or ""].append(fila)
+            for grupo in por_padre.values():
+                avisos.append(_resumen(grupo))
+                incluidas.append([fila.id_incidencia for fila in grupo])
+
+            ids = (await db.scalars(
+                insert(models.Notificacion).returning(models.Notificacion.id_notificacion, sort_by_parameter_order=True),
+                [{**aviso, "enviado": False, "intentos": 0, "created_at": ahora, "proximo_intento": ahora}
+                 for aviso in avisos],
+            )).all()
+            # UPDATE por clave primaria con executemany
+            await db.execute(update(models.Incidencia), [
+                {"id_incidencia": id_incidencia, "id_notificacion": id_notificacion}
+                for id_notificacion, grupo in zip(ids, incluidas) for id_incidencia in grupo
+            ])
+            await db.commit()
+        self.inmediatos += len(avisos) - len(por_padre)
+        self.resumenes += len(por_padre)
+        notificaciones.despertar()
+        return len(filas)
+
+    async def ejecutar(self):
+        while True:
+            try:
+                reservadas = await self.procesar_lote()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al encolar avisos de incidencias")
+                reservadas = 0
+            if reservadas < self.lote:
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), self.intervalo_s)
+                except asyncio.TimeoutError:
+                    pass
+
+    def despertar(self):
+        self._despertar.set()
+
+    def iniciar(self):
+        self._tarea = asyncio.create_task(self.ejecutar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def estado(self) -> dict:
+        return {
+            "activo": self._tarea is not None and not self._tarea.done(),
+            "avisos_inmediatos": self.inmediatos,
+            "resumenes": self.resumenes,
+        }
+
+async def confirmar_entregas(db: AsyncSession, ids_notificacion: List[int], fecha_envio: datetime):
+    await db.execute(
+        update(models.Incidencia)
+        .where(models.Incidencia.id_notificacion.in_(ids_notificacion))
+        .values(notificado_padre=True, fecha_notificacion=fecha_envio)
+    )
+
+notificaciones.al_confirmar.append(confirmar_entregas)
+
+encolador: Optional[Encolador] = None
+
+def iniciar() -> Optional[Encolador]:
+    global encolador
+    if not INCIDENCIAS_NOTIFICAR:
+        return None
+    encolador = Encolador()
+    encolador.iniciar()
+    return encolador
+
+async def detener():
+    global encolador
+    if encolador is not None:
+        await encolador.detener()
+        encolador = None
+
+def despertar():
+    if encolador is not None:
+        encolador.despertar()
+
+def estado() -> dict:
+    return encolador.estado() if encolador is not None else {"activo": False}
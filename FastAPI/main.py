@@ -1,30 +1,76 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, File, Response, UploadFile, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
 from typing import List, Annotated, Optional
+from contextlib import asynccontextmanager
+import os
+import time
 from . import models
 from . import schemas
-from .database import SessionLocal, engine
-from sqlalchemy.orm import Session
+from . import alertas
+from . import estadisticas
+from . import exportacion
+from . import horarios
+from . import importacion
+from . import incidencias
+from . import migraciones
+from . import notificaciones
+from . import planificador
+from . import reportes
+from . import resumenes
+from . import saldos
+from . import serializacion
+from . import sesiones
+from .cache import CacheTTL
+from .database import AsyncSessionLocal, async_engine, estado_pool, insert_dialecto
+from .hashing import HasherSaturado, pool_hashing
+from .pagination import NEXT_CURSOR_HEADER, paginar
+from sqlalchemy import delete, exists, func, literal, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import with_polymorphic
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import jwt
 from jwt.exceptions import PyJWTError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 # Configuración de seguridad
 SECRET_KEY = "tu-clave-secreta-super-segura-aqui"  # Cambia esto en producción
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Cache de tokens ya validados (usuario resuelto) para no consultar la BD en cada petición
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+cache_tokens = CacheTTL(max_entradas=AUTH_CACHE_MAX, ttl=AUTH_CACHE_TTL)
+# Sesiones revocadas cuyo access token aún no expiró (en memoria, sincronizadas desde la tabla sesiones)
+revocadas = sesiones.Revocaciones(retencion_s=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear todas las tablas
+    async with async_engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(migraciones.aplicar)
+    await revocadas.iniciar()
+    notificaciones.iniciar()
+    incidencias.iniciar()
+    yield
+    await incidencias.detener()
+    await notificaciones.detener()
+    await revocadas.detener()
+    await importacion.cerrar()
+    pool_hashing.cerrar()
+    planificador.cerrar()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Sistema Académico API - Sprint 2",
     description="API para gestión completa del sistema académico",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # ========== CONFIGURACIÓN CORS ==========
@@ -34,26 +80,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Crear todas las tablas
-models.Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 # ========== FUNCIONES DE AUTENTICACIÓN ==========
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt se ejecuta en el pool de hashing; si está saturado se responde 503 de inmediato
+hashing_saturado_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Servidor ocupado, intente nuevamente",
+    headers={"Retry-After": "1"},
+)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def verify_password(plain_password, hashed_password):
+    """Devuelve (válida, nuevo_hash); nuevo_hash se guarda si cambió el costo de bcrypt."""
+    try:
+        return await pool_hashing.verificar(plain_password, hashed_password)
+    except HasherSaturado:
+        raise hashing_saturado_exception
+
+async def get_password_hash(password):
+    try:
+        return await pool_hashing.hash(password)
+    except HasherSaturado:
+        raise hashing_saturado_exception
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -65,12 +120,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> schemas.Usuario:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Camino común: token ya validado, sin decodificar ni consultar la BD
+    # (la sesión no abre conexión hasta la primera consulta); la revocación se mira en memoria
+    cached = cache_tokens.get(token)
+    if cached is not None:
+        cached_user, id_sesion = cached
+        if id_sesion is not None and id_sesion in revocadas:
+            raise credentials_exception
+        return cached_user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -78,11 +142,38 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except PyJWTError:
         raise credentials_exception
+    # Los tokens sin "sid" (emitidos sin sesión) no se pueden revocar y valen hasta expirar
+    id_sesion = payload.get("sid")
+    if id_sesion is not None and id_sesion in revocadas:
+        raise credentials_exception
     
-    user = db.query(models.Usuario).filter(models.Usuario.username == username).first()
+    user = await db.scalar(select(models.Usuario).where(models.Usuario.username == username))
     if user is None:
         raise credentials_exception
-    return user
+    if not user.activo:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Usuario inactivo",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Nunca más allá de la expiración del propio token
+    current_user = schemas.Usuario.model_validate(user)
+    cache_tokens.set(token, (current_user, id_sesion), ttl=payload["exp"] - time.time())
+    return current_user
+
+def invalidar_usuario_cache(id_usuario: int) -> int:
+    return cache_tokens.invalidar_si(lambda cached: cached[0].id_usuario == id_usuario)
+
+# Usuario cargado como su subclase (Estudiante, Docente o Administrador) con el perfil incluido
+usuario_con_perfil = with_polymorphic(models.Usuario, "*")
+
+def perfil_por_rol(user: models.Usuario) -> dict:
+    return {tipo: user if user.tipo_usuario == tipo else None for tipo in ("estudiante", "docente", "administrador")}
+
+def crear_access_token_sesion(username: str, id_sesion: int) -> str:
+    return create_access_token(data={"sub": username, "sid": id_sesion},
+                               expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 
 # ========== ENDPOINTS DE PRUEBA ==========
 @app.get("/")
@@ -96,7 +187,7 @@ async def api_root():
 @app.get("/api/test-db")
 async def test_database(db: db_dependency):
     try:
-        result = db.execute("SELECT 1")
+        result = await db.execute(text("SELECT 1"))
         return {"status": "success", "message": "Conexión a base de datos exitosa"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error de conexión: {str(e)}")
@@ -106,28 +197,20 @@ async def test_database(db: db_dependency):
 async def registrar_estudiante(estudiante_data: schemas.EstudianteCreate, db: db_dependency):
     try:
         # Verificar si el username o email ya existen
-        existing_user = db.query(models.Usuario).filter(
-            (models.Usuario.username == estudiante_data.usuario.username) | 
-            (models.Usuario.email == estudiante_data.usuario.email)
-        ).first()
+        existing_user = await db.scalar(select(models.Usuario).where(
+            or_(models.Usuario.username == estudiante_data.usuario.username,
+                models.Usuario.email == estudiante_data.usuario.email)
+        ))
         
         if existing_user:
             raise HTTPException(status_code=400, detail="Username o email ya registrado")
         
-        # Crear usuario
-        hashed_password = get_password_hash(estudiante_data.usuario.password)
-        db_usuario = models.Usuario(
+        # Usuario y estudiante en un objeto: el flush inserta en usuarios y luego en estudiantes
+        hashed_password = await get_password_hash(estudiante_data.usuario.password)
+        db_estudiante = models.Estudiante(
             username=estudiante_data.usuario.username,
             email=estudiante_data.usuario.email,
             password_hash=hashed_password,
-            tipo_usuario="estudiante"
-        )
-        db.add(db_usuario)
-        db.flush()  # Para obtener el ID del usuario
-        
-        # Crear estudiante
-        db_estudiante = models.Estudiante(
-            id_usuario=db_usuario.id_usuario,
             nombre=estudiante_data.nombre,
             apellido=estudiante_data.apellido,
             dni=estudiante_data.dni,
@@ -140,163 +223,871 @@ async def registrar_estudiante(estudiante_data: schemas.EstudianteCreate, db: db
             nivel_educativo=estudiante_data.nivel_educativo
         )
         db.add(db_estudiante)
-        db.commit()
-        db.refresh(db_usuario)
+        await db.commit()
+        await db.refresh(db_estudiante)
         
-        return db_usuario
+        return db_estudiante
         
+    except HTTPException:
+        raise
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Error de integridad en los datos")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
-@app.post("/api/auth/login")
+@app.post("/api/auth/login", response_model=schemas.LoginResponse)
 async def login(login_data: schemas.UsuarioLogin, db: db_dependency):
-    user = db.query(models.Usuario).filter(models.Usuario.username == login_data.username).first()
-    if not user or not verify_password(login_data.password, user.password_hash):
+    # Usuario y perfil de su rol en una sola consulta (LEFT JOIN a las tablas de perfil)
+    user = await db.scalar(select(usuario_con_perfil).where(usuario_con_perfil.username == login_data.username))
+    if user is None:
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+    password_valida, nuevo_hash = await verify_password(login_data.password, user.password_hash)
+    if not password_valida:
         raise HTTPException(status_code=400, detail="Credenciales incorrectas")
     
     if not user.activo:
         raise HTTPException(status_code=400, detail="Usuario inactivo")
     
-    # Crear token de acceso
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    # Obtener datos específicos según el tipo de usuario
-    estudiante = None
-    docente = None
-    administrador = None
+    # Rehash transparente cuando cambió BCRYPT_ROUNDS
+    if nuevo_hash:
+        user.password_hash = nuevo_hash
+    # Sesión con refresh token; el access token lleva su id para poder revocarlo
+    id_sesion, refresh_token = await sesiones.crear(db, user.id_usuario)
+    await db.commit()
     
-    if user.tipo_usuario == "estudiante":
-        estudiante = db.query(models.Estudiante).filter(models.Estudiante.id_usuario == user.id_usuario).first()
-    elif user.tipo_usuario == "docente":
-        docente = db.query(models.Docente).filter(models.Docente.id_usuario == user.id_usuario).first()
-    elif user.tipo_usuario == "administrador":
-        administrador = db.query(models.Administrador).filter(models.Administrador.id_usuario == user.id_usuario).first()
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "usuario": user,
-        "estudiante": estudiante,
-        "docente": docente,
-        "administrador": administrador
-    }
+    return schemas.LoginResponse(
+        access_token=crear_access_token_sesion(user.username, id_sesion),
+        refresh_token=refresh_token,
+        token_type="bearer",
+        usuario=user,
+        **perfil_por_rol(user),
+    )
+
+@app.post("/api/auth/refresh", response_model=schemas.Token)
+async def refrescar_token(datos: schemas.RefreshRequest, db: db_dependency):
+    # Rota el refresh token: el que se presentó deja de servir
+    rotada = await sesiones.rotar(db, datos.refresh_token)
+    if rotada is None:
+        raise HTTPException(status_code=401, detail="Refresh token inválido o expirado")
+    id_sesion, id_usuario, refresh_token = rotada
+    user = await db.get(models.Usuario, id_usuario)
+    if not user.activo:
+        await db.rollback()
+        raise HTTPException(status_code=401, detail="Usuario inactivo")
+    await db.commit()
+    return schemas.Token(access_token=crear_access_token_sesion(user.username, id_sesion),
+                         refresh_token=refresh_token, token_type="bearer")
+
+@app.post("/api/auth/logout")
+async def logout(db: db_dependency, token: str = Depends(oauth2_scheme),
+                 current_user: schemas.Usuario = Depends(get_current_user)):
+    id_sesion = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sid")
+    if id_sesion is None:
+        raise HTTPException(status_code=400, detail="El token no pertenece a una sesión")
+    ids = await sesiones.revocar(db, models.Sesion.id_sesion == id_sesion)
+    await db.commit()
+    revocadas.agregar(ids)
+    return {"message": "Sesión cerrada"}
+
+@app.post("/api/usuarios/{usuario_id}/sesiones/revocar")
+async def revocar_sesiones_usuario(usuario_id: int, db: db_dependency,
+                                   current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador" and current_user.id_usuario != usuario_id:
+        raise HTTPException(status_code=403, detail="Solo un administrador puede revocar sesiones de otro usuario")
+    ids = await sesiones.revocar(db, models.Sesion.id_usuario == usuario_id)
+    await db.commit()
+    revocadas.agregar(ids)
+    return {"revocadas": len(ids)}
 
 # ========== ENDPOINTS PARA ESTUDIANTES ==========
+listado_estudiantes = serializacion.ListadoJSON(schemas.Estudiante, models.Estudiante)
+
 @app.get("/api/estudiantes", response_model=List[schemas.Estudiante])
-async def listar_estudiantes(db: db_dependency, skip: int = 0, limit: int = 100):
-    estudiantes = db.query(models.Estudiante).offset(skip).limit(limit).all()
+async def listar_estudiantes(db: db_dependency, response: Response, skip: int = 0, limit: int = 100,
+                             cursor: Optional[str] = None):
+    if serializacion.SERIALIZACION_RAPIDA:
+        filas = await paginar(db, response, listado_estudiantes.consulta(), models.Estudiante.id_usuario,
+                              skip, limit, cursor, columnas=True)
+        return listado_estudiantes.respuesta(filas, response)
+    estudiantes = await paginar(db, response, select(models.Estudiante), models.Estudiante.id_usuario, skip, limit, cursor)
     return estudiantes
 
 @app.get("/api/estudiantes/{estudiante_id}", response_model=schemas.Estudiante)
 async def obtener_estudiante(estudiante_id: int, db: db_dependency):
-    estudiante = db.query(models.Estudiante).filter(models.Estudiante.id_usuario == estudiante_id).first()
+    estudiante = await db.get(models.Estudiante, estudiante_id)
     if estudiante is None:
         raise HTTPException(status_code=404, detail="Estudiante no encontrado")
     return estudiante
 
+@app.post("/api/estudiantes/importar", response_model=schemas.TrabajoImportacion, status_code=202)
+async def importar_estudiantes(archivo: UploadFile = File(...), formato: Optional[str] = None,
+                               current_user: schemas.Usuario = Depends(get_current_user)):
+    # CSV (encabezados username,email,password,nombre,apellido,dni,...) o JSON Lines de EstudianteCreate.
+    # Corre en segundo plano; el avance y el resultado se consultan en /api/importaciones/{id_trabajo}
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede importar estudiantes")
+    formato = formato or ("csv" if (archivo.filename or "").lower().endswith(".csv") else "jsonl")
+    if formato not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="Formato inválido: use csv o jsonl")
+    contenido = await archivo.read()
+    try:
+        id_trabajo = importacion.iniciar(contenido, formato)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El archivo debe estar en UTF-8")
+    return importacion.estado(id_trabajo)
+
+@app.get("/api/importaciones/{id_trabajo}", response_model=schemas.TrabajoImportacion)
+async def obtener_importacion(id_trabajo: str, current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede consultar importaciones")
+    trabajo = importacion.estado(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    return trabajo
+
 # ========== ENDPOINTS PARA DOCENTES ==========
+listado_docentes = serializacion.ListadoJSON(schemas.Docente, models.Docente)
+
 @app.get("/api/docentes", response_model=List[schemas.Docente])
-async def listar_docentes(db: db_dependency, skip: int = 0, limit: int = 100):
-    docentes = db.query(models.Docente).offset(skip).limit(limit).all()
+async def listar_docentes(db: db_dependency, response: Response, skip: int = 0, limit: int = 100,
+                          cursor: Optional[str] = None):
+    if serializacion.SERIALIZACION_RAPIDA:
+        filas = await paginar(db, response, listado_docentes.consulta(), models.Docente.id_usuario,
+                              skip, limit, cursor, columnas=True)
+        return listado_docentes.respuesta(filas, response)
+    docentes = await paginar(db, response, select(models.Docente), models.Docente.id_usuario, skip, limit, cursor)
     return docentes
 
+# ========== ENDPOINTS PARA USUARIOS ==========
+@app.patch("/api/usuarios/{usuario_id}/desactivar", response_model=schemas.Usuario)
+async def desactivar_usuario(usuario_id: int, db: db_dependency,
+                             current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede desactivar usuarios")
+    usuario = await db.get(models.Usuario, usuario_id)
+    if usuario is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    usuario.activo = False
+    ids = await sesiones.revocar(db, models.Sesion.id_usuario == usuario_id)
+    await db.commit()
+    # Los tokens ya emitidos dejan de servirse desde la cache de este proceso; los demás procesos
+    # rechazan los de sus sesiones en la próxima sincronización de revocaciones
+    invalidar_usuario_cache(usuario_id)
+    revocadas.agregar(ids)
+    return usuario
+
+@app.get("/api/usuarios/{usuario_id}/perfil", response_model=schemas.PerfilUsuario)
+async def obtener_perfil_usuario(usuario_id: int, db: db_dependency,
+                                 current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador" and current_user.id_usuario != usuario_id:
+        raise HTTPException(status_code=403, detail="Solo un administrador puede ver el perfil de otro usuario")
+    user = await db.scalar(select(usuario_con_perfil).where(usuario_con_perfil.id_usuario == usuario_id))
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return schemas.PerfilUsuario(usuario=user, **perfil_por_rol(user))
+
 # ========== ENDPOINTS PARA CICLOS ==========
 @app.post("/api/ciclos", response_model=schemas.Ciclo)
 async def crear_ciclo(ciclo: schemas.CicloCreate, db: db_dependency):
-    db_ciclo = models.Ciclo(**ciclo.dict())
+    db_ciclo = models.Ciclo(**ciclo.model_dump())
     db.add(db_ciclo)
-    db.commit()
-    db.refresh(db_ciclo)
+    await db.commit()
+    await db.refresh(db_ciclo)
     return db_ciclo
 
+listado_ciclos = serializacion.ListadoJSON(schemas.Ciclo, models.Ciclo)
+
 @app.get("/api/ciclos", response_model=List[schemas.Ciclo])
-async def listar_ciclos(db: db_dependency, skip: int = 0, limit: int = 100):
-    ciclos = db.query(models.Ciclo).offset(skip).limit(limit).all()
+async def listar_ciclos(db: db_dependency, response: Response, skip: int = 0, limit: int = 100,
+                        cursor: Optional[str] = None):
+    if serializacion.SERIALIZACION_RAPIDA:
+        filas = await paginar(db, response, listado_ciclos.consulta(), models.Ciclo.id_ciclo,
+                              skip, limit, cursor, columnas=True)
+        return listado_ciclos.respuesta(filas, response)
+    ciclos = await paginar(db, response, select(models.Ciclo), models.Ciclo.id_ciclo, skip, limit, cursor)
     return ciclos
 
 # ========== ENDPOINTS PARA CURSOS ==========
 @app.post("/api/cursos", response_model=schemas.Curso)
 async def crear_curso(curso: schemas.CursoCreate, db: db_dependency):
     # Verificar que el ciclo existe
-    ciclo = db.query(models.Ciclo).filter(models.Ciclo.id_ciclo == curso.id_ciclo).first()
+    ciclo = await db.get(models.Ciclo, curso.id_ciclo)
     if not ciclo:
         raise HTTPException(status_code=404, detail="Ciclo no encontrado")
     
-    db_curso = models.Curso(**curso.dict())
+    db_curso = models.Curso(**curso.model_dump())
     db.add(db_curso)
-    db.commit()
-    db.refresh(db_curso)
+    await db.commit()
+    await db.refresh(db_curso)
     return db_curso
 
+listado_cursos = serializacion.ListadoJSON(schemas.Curso, models.Curso)
+
 @app.get("/api/cursos", response_model=List[schemas.Curso])
-async def listar_cursos(db: db_dependency, skip: int = 0, limit: int = 100):
-    cursos = db.query(models.Curso).offset(skip).limit(limit).all()
+async def listar_cursos(db: db_dependency, response: Response, skip: int = 0, limit: int = 100,
+                        cursor: Optional[str] = None):
+    if serializacion.SERIALIZACION_RAPIDA:
+        filas = await paginar(db, response, listado_cursos.consulta(), models.Curso.id_curso,
+                              skip, limit, cursor, columnas=True)
+        return listado_cursos.respuesta(filas, response)
+    cursos = await paginar(db, response, select(models.Curso), models.Curso.id_curso, skip, limit, cursor)
     return cursos
 
+# ========== ENDPOINTS PARA HORARIOS ==========
+@app.post("/api/horarios", response_model=schemas.Horario)
+async def crear_horario(horario: schemas.HorarioCreate, db: db_dependency):
+    await verificar_cruces(db, horario)
+    db_horario = models.Horario(**horario.model_dump())
+    db.add(db_horario)
+    await db.commit()
+    await db.refresh(db_horario)
+    return db_horario
+
+@app.put("/api/horarios/{horario_id}", response_model=schemas.Horario)
+async def editar_horario(horario_id: int, horario: schemas.HorarioCreate, db: db_dependency):
+    db_horario = await db.get(models.Horario, horario_id)
+    if db_horario is None:
+        raise HTTPException(status_code=404, detail="Horario no encontrado")
+    await verificar_cruces(db, horario, horario_id)
+    for campo, valor in horario.model_dump().items():
+        setattr(db_horario, campo, valor)
+    await db.commit()
+    return db_horario
+
+async def verificar_cruces(db: AsyncSession, horario: schemas.HorarioCreate, horario_id: Optional[int] = None):
+    """409 con la lista de cruces si el aula o el docente ya están ocupados en ese tramo.
+
+    Deja bloqueados el aula y el docente en ese día hasta el COMMIT de quien llama.
+    """
+    contexto = await horarios.contexto_grupo(db, horario.id_grupo)
+    if contexto is None:
+        raise HTTPException(status_code=404, detail="Grupo no encontrado")
+    await horarios.bloquear(db, horarios.claves(horario, contexto.id_docente))
+    conflictos = await horarios.conflictos(db, horario, contexto, horario_id)
+    if conflictos:
+        raise HTTPException(status_code=409, detail={
+            "mensaje": "El horario se cruza con otros horarios",
+            "conflictos": jsonable_encoder(conflictos),
+        })
+
+@app.get("/api/ciclos/{id_ciclo}/horarios/conflictos", response_model=List[schemas.ConflictoHorario])
+async def conflictos_horario_ciclo(id_ciclo: int, db: db_dependency):
+    # Valida el horario completo del ciclo (también contra ciclos que se superponen en fechas)
+    ciclo = await db.get(models.Ciclo, id_ciclo)
+    if ciclo is None:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+    return await horarios.conflictos_ciclo(db, ciclo)
+
+@app.post("/api/ciclos/{id_ciclo}/horarios/generar", response_model=schemas.TrabajoPlanificacion, status_code=202)
+async def generar_horarios(id_ciclo: int, solicitud: schemas.SolicitudPlanificacion, db: db_dependency,
+                           current_user: schemas.Usuario = Depends(get_current_user)):
+    # La búsqueda corre en un proceso aparte; el avance se consulta en /api/planificaciones/{id_trabajo}
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede generar horarios")
+    ciclo = await db.get(models.Ciclo, id_ciclo)
+    if ciclo is None:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+    problema = await planificador.cargar_problema(db, ciclo, solicitud)
+    if not problema["grupos"]:
+        raise HTTPException(status_code=400, detail="Ningún grupo activo del ciclo tiene horas asignadas")
+    id_trabajo = planificador.iniciar(id_ciclo, problema, solicitud.tiempo_limite_s, solicitud.semilla)
+    return planificador.estado(id_trabajo)
+
+@app.get("/api/planificaciones/{id_trabajo}", response_model=schemas.TrabajoPlanificacion)
+async def obtener_planificacion(id_trabajo: str):
+    trabajo = planificador.estado(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Planificación no encontrada")
+    return trabajo
+
+@app.post("/api/planificaciones/{id_trabajo}/aplicar", response_model=List[schemas.Horario])
+async def aplicar_planificacion(id_trabajo: str, db: db_dependency,
+                                current_user: schemas.Usuario = Depends(get_current_user)):
+    # Reemplaza los horarios de los grupos planificados por los generados
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede aplicar horarios")
+    trabajo = planificador.estado(id_trabajo)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Planificación no encontrada")
+    if trabajo.estado != "terminado":
+        raise HTTPException(status_code=400, detail="La planificación aún no terminó")
+    ciclo = await db.get(models.Ciclo, trabajo.id_ciclo)
+    if ciclo is None:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+    nuevos, cruces = await planificador.aplicar(db, trabajo, ciclo)
+    if cruces:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail={
+            "mensaje": "Los horarios cambiaron mientras se generaba la planificación",
+            "conflictos": jsonable_encoder(cruces),
+        })
+    await db.commit()
+    return nuevos
+
 # ========== ENDPOINTS PARA MATRÍCULAS ==========
 @app.post("/api/matriculas", response_model=schemas.Matricula)
 async def crear_matricula(matricula: schemas.MatriculaCreate, db: db_dependency):
-    # Verificar que el estudiante existe
-    estudiante = db.query(models.Estudiante).filter(models.Estudiante.id_usuario == matricula.id_usuario).first()
+    # Una sola sentencia: INSERT ... SELECT que solo inserta si estudiante, ciclo y modalidad existen,
+    # y ON CONFLICT sobre el índice único (id_usuario, id_ciclo) para que dos peticiones simultáneas
+    # no puedan matricular dos veces al mismo estudiante
+    datos = matricula.model_dump()
+    origen = select(*[literal(valor).label(campo) for campo, valor in datos.items()]).where(
+        exists().where(models.Estudiante.id_usuario == matricula.id_usuario),
+        exists().where(models.Ciclo.id_ciclo == matricula.id_ciclo),
+        exists().where(models.Modalidad.id_modalidad == matricula.id_modalidad),
+    )
+    stmt = (
+        insert_dialecto(db, models.Matricula)
+        .from_select(list(datos), origen)
+        .on_conflict_do_nothing(index_elements=["id_usuario", "id_ciclo"])
+        .returning(*models.Matricula.__table__.c)
+    )
+    try:
+        db_matricula = (await db.execute(stmt)).mappings().first()
+        await db.commit()
+    except IntegrityError:
+        # Un estudiante/ciclo/modalidad eliminado entre tanto: se informa igual que si no existiera
+        await db.rollback()
+        db_matricula = None
+    if db_matricula is None:
+        raise await error_matricula(db, matricula)
+    return db_matricula
+
+async def error_matricula(db: AsyncSession, matricula: schemas.MatriculaCreate) -> HTTPException:
+    """Diagnostica por qué no se insertó la matrícula (solo en el camino de error)."""
+    estudiante, ciclo, modalidad = (await db.execute(select(
+        exists().where(models.Estudiante.id_usuario == matricula.id_usuario),
+        exists().where(models.Ciclo.id_ciclo == matricula.id_ciclo),
+        exists().where(models.Modalidad.id_modalidad == matricula.id_modalidad),
+    ))).one()
     if not estudiante:
-        raise HTTPException(status_code=404, detail="Estudiante no encontrado")
-    
-    # Verificar que el ciclo existe
-    ciclo = db.query(models.Ciclo).filter(models.Ciclo.id_ciclo == matricula.id_ciclo).first()
+        return HTTPException(status_code=404, detail="Estudiante no encontrado")
     if not ciclo:
-        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
-    
-    # Verificar que la modalidad existe
-    modalidad = db.query(models.Modalidad).filter(models.Modalidad.id_modalidad == matricula.id_modalidad).first()
+        return HTTPException(status_code=404, detail="Ciclo no encontrado")
     if not modalidad:
-        raise HTTPException(status_code=404, detail="Modalidad no encontrada")
-    
-    # Verificar que no esté ya matriculado en ese ciclo
-    matricula_existente = db.query(models.Matricula).filter(
-        models.Matricula.id_usuario == matricula.id_usuario,
-        models.Matricula.id_ciclo == matricula.id_ciclo
-    ).first()
-    if matricula_existente:
-        raise HTTPException(status_code=400, detail="Estudiante ya matriculado en este ciclo")
-    
-    db_matricula = models.Matricula(**matricula.dict())
-    db.add(db_matricula)
-    db.commit()
-    db.refresh(db_matricula)
-    return db_matricula
+        return HTTPException(status_code=404, detail="Modalidad no encontrada")
+    return HTTPException(status_code=400, detail="Estudiante ya matriculado en este ciclo")
+
+listado_matriculas = serializacion.ListadoJSON(schemas.Matricula, models.Matricula)
 
 @app.get("/api/matriculas", response_model=List[schemas.Matricula])
-async def listar_matriculas(db: db_dependency, skip: int = 0, limit: int = 100):
-    matriculas = db.query(models.Matricula).offset(skip).limit(limit).all()
+async def listar_matriculas(db: db_dependency, response: Response, skip: int = 0, limit: int = 100,
+                            cursor: Optional[str] = None):
+    if serializacion.SERIALIZACION_RAPIDA:
+        filas = await paginar(db, response, listado_matriculas.consulta(), models.Matricula.id_matricula,
+                              skip, limit, cursor, columnas=True)
+        return listado_matriculas.respuesta(filas, response)
+    matriculas = await paginar(db, response, select(models.Matricula), models.Matricula.id_matricula, skip, limit, cursor)
     return matriculas
 
+# ========== ENDPOINTS PARA INSCRIPCIÓN EN GRUPOS ==========
+@app.post("/api/grupos/{id_grupo}/inscripciones", response_model=schemas.ResultadoInscripcion)
+async def inscribir_en_grupo(id_grupo: int, inscripcion: schemas.InscripcionGrupo, db: db_dependency,
+                             response: Response, current_user: schemas.Usuario = Depends(get_current_user)):
+    fila = (await db.execute(
+        select(models.Grupo.activo, models.Curso.id_ciclo, models.Matricula.id_ciclo.label("ciclo_matricula"),
+               models.Matricula.estado, models.Matricula.id_usuario)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .outerjoin(models.Matricula, models.Matricula.id_matricula == inscripcion.id_matricula)
+        .where(models.Grupo.id_grupo == id_grupo)
+    )).first()
+    if fila is None:
+        raise HTTPException(status_code=404, detail="Grupo no encontrado")
+    if fila.ciclo_matricula is None:
+        raise HTTPException(status_code=404, detail="Matrícula no encontrada")
+    if current_user.tipo_usuario != "administrador" and current_user.id_usuario != fila.id_usuario:
+        raise HTTPException(status_code=403, detail="Solo el estudiante de la matrícula o un administrador puede inscribirla")
+    if fila.activo is False:
+        raise HTTPException(status_code=400, detail="Grupo inactivo")
+    if fila.estado != "activa":
+        raise HTTPException(status_code=400, detail="La matrícula no está activa")
+    if fila.ciclo_matricula != fila.id_ciclo:
+        raise HTTPException(status_code=400, detail="La matrícula no corresponde al ciclo del grupo")
+
+    # La inscripción se inserta primero (el índice único descarta duplicados) y el cupo se toma con
+    # un UPDATE condicional del contador: la fila del grupo queda bloqueada solo hasta el COMMIT y
+    # las inscripciones en otros grupos no esperan
+    db_inscripcion = (await db.execute(
+        insert_dialecto(db, models.MatriculaGrupo)
+        .values(id_matricula=inscripcion.id_matricula, id_grupo=id_grupo, fecha_inscripcion=datetime.now())
+        .on_conflict_do_nothing(index_elements=["id_matricula", "id_grupo"])
+        .returning(*models.MatriculaGrupo.__table__.c)
+    )).mappings().first()
+    if db_inscripcion is None:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="La matrícula ya está inscrita en este grupo")
+    cupo = await db.scalar(
+        update(models.Grupo)
+        .where(models.Grupo.id_grupo == id_grupo, models.Grupo.inscritos < models.Grupo.capacidad_maxima)
+        .values(inscritos=models.Grupo.inscritos + 1)
+        .returning(models.Grupo.inscritos)
+    )
+    if cupo is not None:
+        await db.execute(delete(models.ListaEspera).where(
+            models.ListaEspera.id_matricula == inscripcion.id_matricula, models.ListaEspera.id_grupo == id_grupo))
+        await db.commit()
+        return schemas.ResultadoInscripcion(estado="inscrito", inscripcion=db_inscripcion)
+
+    await db.rollback()
+    if not inscripcion.lista_espera:
+        raise HTTPException(status_code=409, detail="Grupo sin vacantes")
+    await db.execute(
+        insert_dialecto(db, models.ListaEspera)
+        .values(id_matricula=inscripcion.id_matricula, id_grupo=id_grupo, fecha_solicitud=datetime.now())
+        .on_conflict_do_nothing(index_elements=["id_matricula", "id_grupo"])
+    )
+    # Una vacante pudo liberarse entre el UPDATE del cupo y este INSERT (el retiro no vio a esta
+    # matrícula en la lista): se cubre ahora, en la misma transacción, por orden de la lista
+    if inscripcion.id_matricula in await cubrir_vacantes(db, id_grupo):
+        db_inscripcion = (await db.execute(
+            select(models.MatriculaGrupo.__table__)
+            .where(models.MatriculaGrupo.id_matricula == inscripcion.id_matricula,
+                   models.MatriculaGrupo.id_grupo == id_grupo)
+        )).mappings().first()
+        await db.commit()
+        return schemas.ResultadoInscripcion(estado="inscrito", inscripcion=db_inscripcion)
+    propia = (
+        select(models.ListaEspera.id)
+        .where(models.ListaEspera.id_matricula == inscripcion.id_matricula, models.ListaEspera.id_grupo == id_grupo)
+        .scalar_subquery()
+    )
+    posicion = await db.scalar(select(func.count()).where(
+        models.ListaEspera.id_grupo == id_grupo, models.ListaEspera.id <= propia))
+    await db.commit()
+    response.status_code = status.HTTP_202_ACCEPTED
+    return schemas.ResultadoInscripcion(estado="en_espera", posicion=posicion)
+
+@app.delete("/api/grupos/{id_grupo}/inscripciones/{id_matricula}", response_model=schemas.ResultadoRetiro)
+async def retirar_de_grupo(id_grupo: int, id_matricula: int, db: db_dependency,
+                           current_user: schemas.Usuario = Depends(get_current_user)):
+    # La vacante pasa al primero de la lista de espera; si no hay nadie, se descuenta del contador
+    id_usuario = await db.scalar(select(models.Matricula.id_usuario).where(models.Matricula.id_matricula == id_matricula))
+    if id_usuario is None:
+        raise HTTPException(status_code=404, detail="Inscripción no encontrada")
+    if current_user.tipo_usuario != "administrador" and current_user.id_usuario != id_usuario:
+        raise HTTPException(status_code=403, detail="Solo el estudiante de la matrícula o un administrador puede retirarla")
+    retirada = await db.scalar(
+        delete(models.MatriculaGrupo)
+        .where(models.MatriculaGrupo.id_matricula == id_matricula, models.MatriculaGrupo.id_grupo == id_grupo)
+        .returning(models.MatriculaGrupo.id)
+    )
+    if retirada is None:
+        en_espera = await db.scalar(
+            delete(models.ListaEspera)
+            .where(models.ListaEspera.id_matricula == id_matricula, models.ListaEspera.id_grupo == id_grupo)
+            .returning(models.ListaEspera.id)
+        )
+        if en_espera is None:
+            raise HTTPException(status_code=404, detail="Inscripción no encontrada")
+        await db.commit()
+        return schemas.ResultadoRetiro()
+
+    promovido = await promover_lista_espera(db, id_grupo)
+    if promovido is None:
+        await db.execute(
+            update(models.Grupo)
+            .where(models.Grupo.id_grupo == id_grupo)
+            .values(inscritos=models.Grupo.inscritos - 1)
+        )
+    await db.commit()
+    return schemas.ResultadoRetiro(promovido=promovido)
+
+async def promover_lista_espera(db: AsyncSession, id_grupo: int) -> Optional[int]:
+    """Inscribe al primero de la lista de espera del grupo; devuelve su id_matricula o None."""
+    while True:
+        # SKIP LOCKED (PostgreSQL): dos retiros simultáneos promueven a personas distintas sin esperarse
+        siguiente = (await db.execute(
+            select(models.ListaEspera.id, models.ListaEspera.id_matricula)
+            .where(models.ListaEspera.id_grupo == id_grupo)
+            .order_by(models.ListaEspera.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )).first()
+        if siguiente is None:
+            return None
+        await db.execute(delete(models.ListaEspera).where(models.ListaEspera.id == siguiente.id))
+        inscrita = await db.scalar(
+            insert_dialecto(db, models.MatriculaGrupo)
+            .values(id_matricula=siguiente.id_matricula, id_grupo=id_grupo, fecha_inscripcion=datetime.now())
+            .on_conflict_do_nothing(index_elements=["id_matricula", "id_grupo"])
+            .returning(models.MatriculaGrupo.id)
+        )
+        if inscrita is not None:
+            return siguiente.id_matricula
+
+async def cubrir_vacantes(db: AsyncSession, id_grupo: int) -> List[int]:
+    """Pasa de la lista de espera al grupo mientras haya cupo libre; devuelve las id_matricula promovidas."""
+    promovidos = []
+    while await db.scalar(
+        update(models.Grupo)
+        .where(models.Grupo.id_grupo == id_grupo, models.Grupo.inscritos < models.Grupo.capacidad_maxima)
+        .values(inscritos=models.Grupo.inscritos + 1)
+        .returning(models.Grupo.inscritos)
+    ) is not None:
+        promovido = await promover_lista_espera(db, id_grupo)
+        if promovido is None:
+            # Nadie en espera: se devuelve el cupo tomado
+            await db.execute(
+                update(models.Grupo)
+                .where(models.Grupo.id_grupo == id_grupo)
+                .values(inscritos=models.Grupo.inscritos - 1)
+            )
+            break
+        promovidos.append(promovido)
+    return promovidos
+
+# ========== ENDPOINTS PARA PAGOS ==========
+@app.post("/api/conceptos-pago", response_model=schemas.ConceptoPago)
+async def crear_concepto_pago(concepto: schemas.ConceptoPagoCreate, db: db_dependency,
+                              current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede crear conceptos de pago")
+    db_concepto = models.ConceptoPago(**concepto.model_dump())
+    db.add(db_concepto)
+    await db.commit()
+    await db.refresh(db_concepto)
+    return db_concepto
+
+@app.get("/api/conceptos-pago", response_model=List[schemas.ConceptoPago])
+async def listar_conceptos_pago(db: db_dependency, response: Response, skip: int = 0, limit: int = 100,
+                                cursor: Optional[str] = None):
+    return await paginar(db, response, select(models.ConceptoPago), models.ConceptoPago.id_concepto,
+                         skip, limit, cursor)
+
+@app.post("/api/pagos", response_model=schemas.Pago)
+async def registrar_pago(pago: schemas.PagoCreate, db: db_dependency,
+                         current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede registrar pagos")
+    matricula = await db.get(models.Matricula, pago.id_matricula)
+    if matricula is None:
+        raise HTTPException(status_code=404, detail="Matrícula no encontrada")
+    concepto = await db.get(models.ConceptoPago, pago.id_concepto)
+    if concepto is None:
+        raise HTTPException(status_code=404, detail="Concepto de pago no encontrado")
+    if not concepto.activo:
+        raise HTTPException(status_code=400, detail="Concepto de pago inactivo")
+
+    # El saldo se mueve antes que nada: la fila queda bloqueada hasta el COMMIT y dos pagos
+    # simultáneos de la misma matrícula no pueden cobrar dos veces el monto_base del mismo período
+    pagado = pago.monto if pago.estado == "confirmado" else 0
+    await saldos.mover(db, matricula.id_matricula, matricula.id_ciclo, pagado=pagado)
+    ya_cobrado = await db.scalar(select(exists().where(saldos.clave_cobro(pago))))
+    db_pago = models.Pago(**pago.model_dump(), fecha_pago=datetime.now())
+    db.add(db_pago)
+    if not ya_cobrado and concepto.monto_base:
+        await saldos.mover(db, matricula.id_matricula, matricula.id_ciclo, esperado=concepto.monto_base)
+    if db_pago.estado == "confirmado":
+        await reportes.mover(db, matricula.id_ciclo, db_pago)
+    await db.commit()
+    await db.refresh(db_pago)
+    if db_pago.estado == "confirmado":
+        reportes.invalidar(matricula.id_ciclo, db_pago)
+    return db_pago
+
+@app.patch("/api/pagos/{id_pago}/anular", response_model=schemas.Pago)
+async def anular_pago(id_pago: int, db: db_dependency, current_user: schemas.Usuario = Depends(get_current_user)):
+    # El concepto/período sigue contando como cobrado: anular un pago vuelve a dejar la deuda
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede anular pagos")
+    db_pago = await db.get(models.Pago, id_pago, with_for_update=True)
+    if db_pago is None:
+        raise HTTPException(status_code=404, detail="Pago no encontrado")
+    if db_pago.estado == "anulado":
+        raise HTTPException(status_code=400, detail="El pago ya está anulado")
+    confirmado = db_pago.estado == "confirmado"
+    id_ciclo = await db.scalar(
+        select(models.Matricula.id_ciclo).where(models.Matricula.id_matricula == db_pago.id_matricula))
+    if confirmado:
+        await saldos.mover(db, db_pago.id_matricula, id_ciclo, pagado=-db_pago.monto)
+        await reportes.mover(db, id_ciclo, db_pago, signo=-1)
+    db_pago.estado = "anulado"
+    await db.commit()
+    await db.refresh(db_pago)
+    if confirmado:
+        reportes.invalidar(id_ciclo, db_pago)
+    return db_pago
+
+async def verificar_acceso_matricula(db: AsyncSession, id_matricula: int, current_user: schemas.Usuario):
+    # Administradores, o el estudiante dueño de la matrícula; una matrícula inexistente también da 403
+    if current_user.tipo_usuario == "administrador":
+        return
+    id_usuario = await db.scalar(select(models.Matricula.id_usuario).where(models.Matricula.id_matricula == id_matricula))
+    if id_usuario != current_user.id_usuario:
+        raise HTTPException(status_code=403, detail="Solo el estudiante de la matrícula o un administrador puede ver sus pagos")
+
+listado_pagos = serializacion.ListadoJSON(schemas.Pago, models.Pago)
+
+@app.get("/api/matriculas/{id_matricula}/pagos", response_model=List[schemas.Pago])
+async def listar_pagos_matricula(id_matricula: int, db: db_dependency, response: Response, skip: int = 0,
+                                 limit: int = 100, cursor: Optional[str] = None,
+                                 current_user: schemas.Usuario = Depends(get_current_user)):
+    await verificar_acceso_matricula(db, id_matricula, current_user)
+    if serializacion.SERIALIZACION_RAPIDA:
+        stmt = listado_pagos.consulta().where(models.Pago.id_matricula == id_matricula)
+        filas = await paginar(db, response, stmt, models.Pago.id_pago, skip, limit, cursor, columnas=True)
+        return listado_pagos.respuesta(filas, response)
+    stmt = select(models.Pago).where(models.Pago.id_matricula == id_matricula)
+    return await paginar(db, response, stmt, models.Pago.id_pago, skip, limit, cursor)
+
+@app.get("/api/matriculas/{id_matricula}/saldo", response_model=schemas.SaldoMatricula)
+async def obtener_saldo(id_matricula: int, db: db_dependency,
+                       current_user: schemas.Usuario = Depends(get_current_user)):
+    await verificar_acceso_matricula(db, id_matricula, current_user)
+    # Lectura por clave primaria de saldos_matricula; sin fila (ningún pago) el saldo es cero
+    saldo = await db.get(models.SaldoMatricula, id_matricula)
+    if saldo is not None:
+        return saldo
+    id_ciclo = await db.scalar(
+        select(models.Matricula.id_ciclo).where(models.Matricula.id_matricula == id_matricula))
+    if id_ciclo is None:
+        raise HTTPException(status_code=404, detail="Matrícula no encontrada")
+    return schemas.SaldoMatricula(id_matricula=id_matricula, id_ciclo=id_ciclo)
+
+listado_deudores = serializacion.ListadoJSON(schemas.SaldoMatricula, models.SaldoMatricula)
+
+@app.get("/api/deudores", response_model=List[schemas.SaldoMatricula])
+async def listar_deudores(db: db_dependency, id_ciclo: Optional[int] = None, limit: int = 100,
+                          current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede ver la lista de deudores")
+    # Recorre ix_saldos_matricula_ciclo_saldo (o ix_saldos_matricula_saldo) de mayor a menor deuda
+    rapida = serializacion.SERIALIZACION_RAPIDA
+    stmt = listado_deudores.consulta() if rapida else select(models.SaldoMatricula)
+    stmt = stmt.where(models.SaldoMatricula.saldo > 0)
+    if id_ciclo is not None:
+        stmt = stmt.where(models.SaldoMatricula.id_ciclo == id_ciclo)
+    stmt = stmt.order_by(models.SaldoMatricula.saldo.desc()).limit(limit)
+    if rapida:
+        return listado_deudores.respuesta((await db.execute(stmt)).all())
+    return (await db.scalars(stmt)).all()
+
+# ========== ENDPOINTS PARA ASISTENCIAS ==========
+@app.put("/api/grupos/{id_grupo}/asistencias/{fecha}", response_model=schemas.ResultadoAsistencia)
+async def registrar_asistencia_grupo(id_grupo: int, fecha: date, lista: schemas.ListaAsistencia, db: db_dependency,
+                                     current_user: schemas.Usuario = Depends(get_current_user)):
+    # Idempotente: reenviar la misma lista no escribe nada y solo se actualizan los registros que cambiaron.
+    # Los estudiantes que no vienen en la lista no se modifican (las correcciones pueden enviar solo esos).
+    grupo = await db.get(models.Grupo, id_grupo)
+    if grupo is None:
+        raise HTTPException(status_code=404, detail="Grupo no encontrado")
+    if current_user.tipo_usuario != "administrador" and current_user.id_usuario != grupo.id_docente:
+        raise HTTPException(status_code=403, detail="Solo el docente del grupo o un administrador puede registrar asistencia")
+
+    ids = [registro.id_usuario for registro in lista.registros]
+    inscritos = set(await db.scalars(
+        select(models.Matricula.id_usuario)
+        .join(models.MatriculaGrupo, models.MatriculaGrupo.id_matricula == models.Matricula.id_matricula)
+        .where(models.MatriculaGrupo.id_grupo == id_grupo, models.Matricula.id_usuario.in_(ids))
+    ))
+    no_inscritos = [id_usuario for id_usuario in ids if id_usuario not in inscritos]
+    if no_inscritos:
+        raise HTTPException(status_code=400, detail=f"Estudiantes no inscritos en el grupo: {', '.join(map(str, no_inscritos))}")
+
+    # Un solo INSERT multi-fila con ON CONFLICT sobre (id_grupo, fecha, id_usuario); el WHERE del
+    # DO UPDATE descarta las filas idénticas, así RETURNING solo trae las insertadas y las modificadas
+    ahora = datetime.now()
+    tabla = models.AsistenciaEstudiante.__table__
+    campos = ("presente", "hora_entrada", "hora_salida", "observaciones")
+    stmt = insert_dialecto(db, models.AsistenciaEstudiante).values([
+        {**registro.model_dump(), "id_grupo": id_grupo, "fecha": fecha, "created_at": ahora} for registro in lista.registros
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id_grupo", "fecha", "id_usuario"],
+        set_={campo: stmt.excluded[campo] for campo in campos},
+        where=or_(*(tabla.c[campo].is_distinct_from(stmt.excluded[campo]) for campo in campos)),
+    ).returning(tabla.c.id_usuario, tabla.c.created_at, tabla.c.presente)
+    escritos = (await db.execute(stmt)).all()
+    avisos = 0
+    if escritos:
+        # Resumen mensual y estado de alertas de los estudiantes que cambiaron, en la misma transacción
+        await resumenes.actualizar(db, id_grupo, fecha, [id_usuario for id_usuario, _, _ in escritos])
+        avisos = await alertas.evaluar(db, id_grupo, fecha, [(id_usuario, presente) for id_usuario, _, presente in escritos])
+    await db.commit()
+    if avisos:
+        notificaciones.despertar()
+
+    # Las filas nuevas llevan el created_at de esta petición; las actualizadas conservan el suyo
+    insertados = sum(1 for _, created_at, _ in escritos if created_at == ahora)
+    return schemas.ResultadoAsistencia(
+        total=len(ids),
+        insertados=insertados,
+        actualizados=len(escritos) - insertados,
+        sin_cambios=len(ids) - len(escritos),
+    )
+
+@app.get("/api/estudiantes/{estudiante_id}/asistencia/resumen", response_model=schemas.TasasAsistencia)
+async def resumen_asistencia_estudiante(estudiante_id: int, db: db_dependency,
+                                        desde: Optional[date] = None, hasta: Optional[date] = None):
+    # Una tasa por grupo del estudiante; desde/hasta se redondean al mes
+    return await resumenes.tasas(db, models.ResumenAsistencia.id_grupo,
+                                 models.ResumenAsistencia.id_usuario == estudiante_id, desde=desde, hasta=hasta)
+
+@app.get("/api/grupos/{id_grupo}/asistencia/resumen", response_model=schemas.TasasAsistencia)
+async def resumen_asistencia_grupo(id_grupo: int, db: db_dependency,
+                                   desde: Optional[date] = None, hasta: Optional[date] = None):
+    # Una tasa por estudiante del grupo
+    return await resumenes.tasas(db, models.ResumenAsistencia.id_usuario,
+                                 models.ResumenAsistencia.id_grupo == id_grupo, desde=desde, hasta=hasta)
+
+@app.get("/api/ciclos/{id_ciclo}/asistencia/resumen", response_model=schemas.TasasAsistencia)
+async def resumen_asistencia_ciclo(id_ciclo: int, db: db_dependency,
+                                   desde: Optional[date] = None, hasta: Optional[date] = None):
+    # Una tasa por grupo de los cursos del ciclo
+    grupos_del_ciclo = (
+        select(models.Grupo.id_grupo)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .where(models.Curso.id_ciclo == id_ciclo)
+    )
+    return await resumenes.tasas(db, models.ResumenAsistencia.id_grupo,
+                                 models.ResumenAsistencia.id_grupo.in_(grupos_del_ciclo), desde=desde, hasta=hasta)
+
+# ========== ENDPOINTS PARA ALERTAS DE ASISTENCIA ==========
+@app.get("/api/reglas-alerta-asistencia", response_model=List[schemas.ReglaAlertaAsistencia])
+async def listar_reglas_alerta_asistencia(db: db_dependency):
+    # Los niveles sin regla usan la de ALERTAS_* (ver alertas.py)
+    regla = models.ReglaAlertaAsistencia
+    return (await db.scalars(select(regla).order_by(regla.nivel_educativo))).all()
+
+@app.put("/api/reglas-alerta-asistencia/{nivel_educativo}", response_model=schemas.ReglaAlertaAsistencia)
+async def guardar_regla_alerta_asistencia(nivel_educativo: str, regla: schemas.ReglaAlertaAsistenciaCreate,
+                                          db: db_dependency, current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede configurar alertas de asistencia")
+    stmt = insert_dialecto(db, models.ReglaAlertaAsistencia).values(nivel_educativo=nivel_educativo, **regla.model_dump())
+    await db.execute(stmt.on_conflict_do_update(index_elements=["nivel_educativo"], set_=regla.model_dump()))
+    await db.commit()
+    # Rige desde la próxima lista registrada; no reevalúa el estado ya guardado
+    alertas.invalidar_reglas()
+    return schemas.ReglaAlertaAsistencia(nivel_educativo=nivel_educativo, **regla.model_dump())
+
+# ========== ENDPOINTS PARA INCIDENCIAS ==========
+@app.post("/api/tipos-incidencia", response_model=schemas.TipoIncidencia)
+async def crear_tipo_incidencia(tipo: schemas.TipoIncidenciaCreate, db: db_dependency,
+                                current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede crear tipos de incidencia")
+    db_tipo = models.TipoIncidencia(**tipo.model_dump())
+    db.add(db_tipo)
+    await db.commit()
+    await db.refresh(db_tipo)
+    return db_tipo
+
+@app.get("/api/tipos-incidencia", response_model=List[schemas.TipoIncidencia])
+async def listar_tipos_incidencia(db: db_dependency):
+    return (await db.scalars(select(models.TipoIncidencia).order_by(models.TipoIncidencia.id_tipo))).all()
+
+@app.post("/api/incidencias", response_model=schemas.Incidencia, status_code=201)
+async def crear_incidencia(incidencia: schemas.IncidenciaCreate, db: db_dependency,
+                           current_user: schemas.Usuario = Depends(get_current_user)):
+    # Un solo INSERT: el aviso al padre lo genera el encolador de incidencias.py fuera de la petición
+    if current_user.tipo_usuario not in ("administrador", "docente"):
+        raise HTTPException(status_code=403, detail="Solo docentes o administradores pueden registrar incidencias")
+    datos = incidencia.model_dump(exclude={"notificado_padre", "fecha_notificacion", "created_by"})
+    creado_por = current_user.id_usuario if current_user.tipo_usuario == "administrador" else None
+    try:
+        db_incidencia = (await db.execute(
+            insert_dialecto(db, models.Incidencia)
+            .values(**datos, notificado_padre=False, fecha_incidencia=datetime.now(), created_by=creado_por)
+            .returning(*models.Incidencia.__table__.c)
+        )).mappings().one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Estudiante, tipo de incidencia o grupo inexistente")
+    incidencias.despertar()
+    return db_incidencia
+
+@app.get("/api/estudiantes/{estudiante_id}/incidencias", response_model=List[schemas.Incidencia])
+async def listar_incidencias_estudiante(estudiante_id: int, db: db_dependency, response: Response, skip: int = 0,
+                                        limit: int = 100, cursor: Optional[str] = None,
+                                        current_user: schemas.Usuario = Depends(get_current_user)):
+    if current_user.tipo_usuario not in ("administrador", "docente") and current_user.id_usuario != estudiante_id:
+        raise HTTPException(status_code=403, detail="Solo docentes, administradores o el propio estudiante pueden ver sus incidencias")
+    stmt = select(models.Incidencia).where(models.Incidencia.id_usuario == estudiante_id)
+    return await paginar(db, response, stmt, models.Incidencia.id_incidencia, skip, limit, cursor)
+
+# ========== ENDPOINTS PARA NOTIFICACIONES ==========
+@app.post("/api/notificaciones", response_model=schemas.Notificacion, status_code=202)
+async def crear_notificacion(notificacion: schemas.NotificacionCreate, db: db_dependency,
+                             current_user: schemas.Usuario = Depends(get_current_user)):
+    # Queda en la bandeja de salida; el despachador la envía en segundo plano
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede enviar notificaciones")
+    if notificacion.metodo_envio not in (None, "email", "sms"):
+        raise HTTPException(status_code=400, detail="metodo_envio debe ser: email o sms")
+    if notificaciones.metodo_de(notificacion) is None:
+        raise HTTPException(status_code=400, detail="Indique email_destinatario o telefono_destinatario")
+    db_notificacion = notificaciones.encolar(db, **notificacion.model_dump())
+    await db.commit()
+    await db.refresh(db_notificacion)
+    notificaciones.despertar()
+    return db_notificacion
+
+# ========== ENDPOINTS DE EXPORTACIÓN ==========
+@app.get("/api/exportar/{recurso}")
+async def exportar(recurso: str, formato: str = "ndjson", columnas: Optional[str] = None,
+                   id_ciclo: Optional[int] = None, desde: Optional[date] = None, hasta: Optional[date] = None,
+                   current_user: schemas.Usuario = Depends(get_current_user)):
+    # recurso: matriculas, pagos o asistencias; columnas separadas por coma
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede exportar datos")
+    if formato not in exportacion.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Formato inválido: use ndjson o csv")
+    stmt, nombres = exportacion.construir_consulta(recurso, columnas, id_ciclo, desde, hasta)
+    return StreamingResponse(
+        exportacion.generar(stmt, nombres, formato),
+        media_type=exportacion.MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{recurso}.{formato}"'},
+    )
+
 # ========== ENDPOINTS PARA ESTADÍSTICAS ==========
-@app.get("/api/estadisticas")
+@app.get("/api/estadisticas", response_model=schemas.Estadisticas)
 async def obtener_estadisticas(db: db_dependency):
-    total_estudiantes = db.query(models.Estudiante).count()
-    total_docentes = db.query(models.Docente).count()
-    total_administradores = db.query(models.Administrador).count()
-    total_ciclos = db.query(models.Ciclo).count()
-    total_cursos = db.query(models.Curso).count()
-    total_matriculas = db.query(models.Matricula).count()
-    total_pagos = db.query(models.Pago).count()
-    
-    return {
-        "total_estudiantes": total_estudiantes,
-        "total_docentes": total_docentes,
-        "total_administradores": total_administradores,
-        "total_ciclos": total_ciclos,
-        "total_cursos": total_cursos,
-        "total_matriculas": total_matriculas,
-        "total_pagos": total_pagos
-    }
+    # Un solo round trip para los siete totales, servido desde una cache de TTL corto
+    return await estadisticas.obtener(db)
+
+# ========== ENDPOINTS PARA REPORTES ==========
+@app.get("/api/reportes/recaudacion", response_model=schemas.ReporteRecaudacion)
+async def reporte_recaudacion(año: int, db: db_dependency, mes: Optional[int] = None, id_ciclo: Optional[int] = None,
+                              current_user: schemas.Usuario = Depends(get_current_user)):
+    # Lee recaudacion_mensual (no la tabla pagos) con cache por (ciclo, año, mes); ver reportes.py
+    if current_user.tipo_usuario != "administrador":
+        raise HTTPException(status_code=403, detail="Solo un administrador puede ver reportes de recaudación")
+    if mes is not None and not 1 <= mes <= 12:
+        raise HTTPException(status_code=400, detail="El mes debe estar entre 1 y 12")
+    return await reportes.recaudacion(db, año, mes, id_ciclo)
+
+# ========== ENDPOINTS DE MÉTRICAS ==========
+@app.get("/api/metrics/pool")
+async def metricas_pool():
+    return estado_pool()
+
+@app.get("/api/metrics/hashing")
+async def metricas_hashing():
+    return pool_hashing.estado()
+
+@app.get("/api/metrics/auth-cache")
+async def metricas_auth_cache():
+    return cache_tokens.estado()
+
+@app.get("/api/metrics/notificaciones")
+async def metricas_notificaciones():
+    return {**notificaciones.estado(), "incidencias": incidencias.estado()}
+
+@app.get("/api/metrics/sesiones")
+async def metricas_sesiones():
+    return revocadas.estado()
+
+@app.get("/api/metrics/alertas-asistencia")
+async def metricas_alertas_asistencia():
+    return alertas.estado()
+
+@app.get("/api/metrics/reportes-cache")
+async def metricas_reportes_cache():
+    return reportes.estado_cache()
 
 # ========== MANEJO DE ERRORES ==========
 @app.exception_handler(HTTPException)
@@ -304,6 +1095,7 @@ async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(Exception)
@@ -0,0 +1,289 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, func, inspect, literal, or_, select, text, update
+from sqlalchemy.exc import DBAPIError
+
+from . import alertas
+from . import models
+from . import reportes
+from . import resumenes
+from . import saldos
+
+logger = logging.getLogger(__name__)
+
+# Migraciones idempotentes que se aplican al iniciar la API, después de create_all
+# (create_all solo crea tablas nuevas; no modifica las existentes).
+
+# Notificaciones sin enviar anteriores al despachador que todavía se envían (las más antiguas ya no
+# tienen sentido: avisos de hace meses)
+NOTIFICACIONES_PENDIENTES_DIAS = 2
+
+# Con true, los registros de asistencia repetidos (grupo, fecha, estudiante) se eliminan dejando el último;
+# sin él, el arranque se detiene y hay que resolverlos a mano
+MIGRACION_DEDUPLICAR_ASISTENCIA = os.getenv("MIGRACION_DEDUPLICAR_ASISTENCIA", "false").lower() in ("1", "true", "yes")
+
+# Índices reemplazados por otros más completos (el nuevo cubre las mismas consultas): obsoleto -> reemplazo.
+# El obsoleto solo se elimina cuando el reemplazo ya existe.
+INDICES_OBSOLETOS = {
+    "ix_asistencia_estudiantes_grupo_fecha": "uq_asistencia_estudiantes_grupo_fecha_usuario",
+    "ix_horarios_id_grupo": "ix_horarios_grupo_dia_inicio",
+    "ix_matricula_grupos_id_matricula": "uq_matricula_grupos_matricula_grupo",
+    "ix_pagos_id_matricula": "ix_pagos_matricula_concepto_periodo",
+}
+
+def agregar_columnas_faltantes(conn) -> set:
+    """ALTER TABLE ... ADD COLUMN por cada columna de los modelos que no existe; devuelve {(tabla, columna)}."""
+    inspector = inspect(conn)
+    agregadas = set()
+    for tabla in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {columna["name"] for columna in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes:
+                continue
+            ddl = f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {columna.type.compile(conn.dialect)}"
+            if columna.server_default is not None:
+                ddl += f" DEFAULT {columna.server_default.arg}"
+                if not columna.nullable:
+                    ddl += " NOT NULL"
+            # La clave foránea va en la misma columna: create_all la crea en bases nuevas y las migradas
+            # deben quedar iguales (SQLite la admite en ADD COLUMN si el valor por defecto es NULL)
+            for fk in columna.foreign_keys:
+                ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+                if fk.ondelete:
+                    ddl += f" ON DELETE {fk.ondelete}"
+                if fk.onupdate:
+                    ddl += f" ON UPDATE {fk.onupdate}"
+            conn.execute(text(ddl))
+            agregadas.add((tabla.name, columna.name))
+            logger.info("Columna agregada: %s.%s", tabla.name, columna.name)
+    return agregadas
+
+# Claves foráneas de columnas agregadas por agregar_columnas_faltantes antes de que esta las incluyera
+CLAVES_FORANEAS_AGREGADAS = [("incidencias", "id_notificacion")]
+
+def agregar_claves_foraneas_faltantes(conn):
+    """Crea las claves foráneas de CLAVES_FORANEAS_AGREGADAS que falten en la base.
+
+    Los valores que ya no apuntan a ninguna fila se dejan en NULL (lo que habría hecho ON DELETE SET NULL).
+    SQLite no permite agregar restricciones a una tabla existente: ahí solo se avisa.
+    """
+    inspector = inspect(conn)
+    for nombre_tabla, nombre_columna in CLAVES_FORANEAS_AGREGADAS:
+        if not inspector.has_table(nombre_tabla):
+            continue
+        if any(fk["constrained_columns"] == [nombre_columna] for fk in inspector.get_foreign_keys(nombre_tabla)):
+            continue
+        tabla = models.Base.metadata.tables[nombre_tabla]
+        columna = tabla.c[nombre_columna]
+        fk = next(iter(columna.foreign_keys))
+        if conn.dialect.name == "sqlite":
+            logger.warning("%s.%s sin clave foránea a %s: SQLite no permite agregarla sin recrear la tabla",
+                           nombre_tabla, nombre_columna, fk.target_fullname)
+            continue
+        destino = fk.column
+        huerfanas = conn.execute(update(tabla).where(
+            columna.is_not(None), ~exists().where(destino == columna)).values({nombre_columna: None})).rowcount
+        if huerfanas:
+            logger.warning("%s.%s: %s valores sin %s puestos en NULL", nombre_tabla, nombre_columna,
+                           huerfanas, fk.target_fullname)
+        ddl = (f"ALTER TABLE {nombre_tabla} ADD CONSTRAINT fk_{nombre_tabla}_{nombre_columna} "
+               f"FOREIGN KEY ({nombre_columna}) REFERENCES {destino.table.name} ({destino.name})")
+        if fk.ondelete:
+            ddl += f" ON DELETE {fk.ondelete}"
+        conn.execute(text(ddl))
+        logger.info("Clave foránea agregada: %s.%s -> %s", nombre_tabla, nombre_columna, fk.target_fullname)
+
+def claves_duplicadas(conn, indice) -> int:
+    """Cuántas claves del índice único se repiten en la tabla (lo que impide crearlo)."""
+    repetidas = select(*indice.columns).group_by(*indice.columns).having(func.count() > 1).subquery()
+    return conn.scalar(select(func.count()).select_from(repetidas))
+
+def crear_indices_faltantes(conn):
+    for tabla in models.Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            try:
+                # SAVEPOINT: un índice de consulta que falla no aborta el resto
+                with conn.begin_nested():
+                    indice.create(conn, checkfirst=True)
+            except DBAPIError as e:
+                if not indice.unique:
+                    logger.error("No se pudo crear el índice %s: %s", indice.name, e.orig)
+                    continue
+                # Los índices únicos respaldan los ON CONFLICT de la API: sin ellos cada INSERT falla,
+                # así que se detiene el arranque hasta corregir los datos
+                raise RuntimeError(
+                    f"No se pudo crear el índice único {indice.name} "
+                    f"({tabla.name}: {', '.join(columna.name for columna in indice.columns)}): "
+                    f"{claves_duplicadas(conn, indice)} claves duplicadas. Corrija los duplicados y reinicie."
+                ) from e
+
+def _indices_existentes(conn) -> set:
+    inspector = inspect(conn)
+    return {
+        indice["name"]
+        for tabla in models.Base.metadata.sorted_tables if inspector.has_table(tabla.name)
+        for indice in inspector.get_indexes(tabla.name)
+    }
+
+def eliminar_indices_obsoletos(conn):
+    existentes = _indices_existentes(conn)
+    for nombre, reemplazo in INDICES_OBSOLETOS.items():
+        if nombre not in existentes:
+            continue
+        if reemplazo not in existentes:
+            logger.error("No se elimina el índice %s: falta su reemplazo %s", nombre, reemplazo)
+            continue
+        conn.execute(text(f"DROP INDEX IF EXISTS {nombre}"))
+
+def deduplicar_asistencia(conn) -> int:
+    """Deja un registro por (grupo, fecha, estudiante), el último escrito, para poder crear el índice único.
+
+    Solo con MIGRACION_DEDUPLICAR_ASISTENCIA; si no, RuntimeError con las claves repetidas.
+    """
+    if "uq_asistencia_estudiantes_grupo_fecha_usuario" in _indices_existentes(conn):
+        return 0
+    asistencia = models.AsistenciaEstudiante.__table__
+    indice = next(i for i in asistencia.indexes if i.name == "uq_asistencia_estudiantes_grupo_fecha_usuario")
+    repetidas = claves_duplicadas(conn, indice)
+    if not repetidas:
+        return 0
+    if not MIGRACION_DEDUPLICAR_ASISTENCIA:
+        raise RuntimeError(
+            f"asistencia_estudiantes: {repetidas} claves (id_grupo, fecha, id_usuario) con registros repetidos; "
+            f"no se puede crear {indice.name}. Corrija los registros o arranque con "
+            f"MIGRACION_DEDUPLICAR_ASISTENCIA=true para conservar solo el último de cada clave")
+    posterior = asistencia.alias("posterior")
+    borrados = conn.execute(asistencia.delete().where(exists().where(
+        posterior.c.id_grupo == asistencia.c.id_grupo,
+        posterior.c.fecha == asistencia.c.fecha,
+        posterior.c.id_usuario == asistencia.c.id_usuario,
+        posterior.c.id_asistencia > asistencia.c.id_asistencia,
+    ))).rowcount
+    if borrados:
+        logger.warning("asistencia_estudiantes: %s registros duplicados eliminados en %s claves (se conserva el último)",
+                       borrados, repetidas)
+        # Los resúmenes ya calculados contaban los duplicados
+        if conn.scalar(select(models.ResumenAsistencia.id_usuario).limit(1)) is not None:
+            resumenes.reconstruir(conn)
+        if conn.scalar(select(models.EstadoAsistencia.id_usuario).limit(1)) is not None:
+            alertas.reconstruir(conn)
+    return borrados
+
+# Subclases de Usuario por tipo_usuario (herencia con una tabla por rol)
+PERFILES = {"estudiante": models.Estudiante, "docente": models.Docente, "administrador": models.Administrador}
+
+def completar_perfiles(conn):
+    """Deja cada usuario cargable como su subclase: tipo_usuario normalizado y fila de perfil presente."""
+    usuarios = models.Usuario.__table__
+    normalizado = func.lower(func.trim(usuarios.c.tipo_usuario))
+    conn.execute(update(usuarios).where(usuarios.c.tipo_usuario != normalizado).values(tipo_usuario=normalizado))
+    for tipo, modelo in PERFILES.items():
+        perfil = modelo.__table__
+        # Usuarios registrados sin perfil: se crea uno con el username como nombre para completarlo después
+        creados = conn.execute(perfil.insert().from_select(
+            ["id_usuario", "nombre", "apellido"],
+            select(usuarios.c.id_usuario, usuarios.c.username, literal("Sin registrar"))
+            .where(usuarios.c.tipo_usuario == tipo,
+                   ~exists().where(perfil.c.id_usuario == usuarios.c.id_usuario)),
+        )).rowcount
+        if creados:
+            logger.warning("%s: %s perfiles creados para usuarios sin perfil", perfil.name, creados)
+    # Un usuario sin subclase no se puede cargar (login y get_current_user fallarían con 500): se detiene
+    # el arranque hasta corregir tipo_usuario o eliminar la cuenta
+    desconocidos = conn.execute(select(usuarios.c.id_usuario, usuarios.c.tipo_usuario)
+                                .where(usuarios.c.tipo_usuario.not_in(list(PERFILES)))
+                                .order_by(usuarios.c.id_usuario)).all()
+    if desconocidos:
+        muestra = ", ".join(f"{id_usuario} ({tipo!r})" for id_usuario, tipo in desconocidos[:20])
+        raise RuntimeError(f"usuarios: {len(desconocidos)} filas con tipo_usuario desconocido "
+                           f"(se admite {', '.join(PERFILES)}): {muestra}")
+
+def poblar_resumen_asistencia(conn):
+    # Tabla recién creada en una base con asistencia ya registrada
+    resumen_vacio = conn.scalar(select(models.ResumenAsistencia.id_usuario).limit(1)) is None
+    hay_asistencia = conn.scalar(select(models.AsistenciaEstudiante.id_asistencia).limit(1)) is not None
+    if resumen_vacio and hay_asistencia:
+        logger.info("resumen_asistencia: %s filas calculadas", resumenes.reconstruir(conn))
+
+def poblar_estado_asistencia(conn):
+    # Sin avisos: las condiciones que ya se cumplen quedan marcadas como alertadas
+    estado_vacio = conn.scalar(select(models.EstadoAsistencia.id_usuario).limit(1)) is None
+    hay_asistencia = conn.scalar(select(models.AsistenciaEstudiante.id_asistencia).limit(1)) is not None
+    if estado_vacio and hay_asistencia:
+        logger.info("estado_asistencia: %s filas calculadas", alertas.reconstruir(conn))
+
+def poblar_saldos(conn):
+    # Tabla recién creada en una base con pagos ya registrados
+    saldos_vacio = conn.scalar(select(models.SaldoMatricula.id_matricula).limit(1)) is None
+    hay_pagos = conn.scalar(select(models.Pago.id_pago).limit(1)) is not None
+    if saldos_vacio and hay_pagos:
+        logger.info("saldos_matricula: %s filas calculadas", saldos.reconstruir(conn))
+
+def poblar_recaudacion(conn):
+    resumen_vacio = conn.scalar(select(models.RecaudacionMensual.id_ciclo).limit(1)) is None
+    hay_pagos = conn.scalar(select(models.Pago.id_pago).limit(1)) is not None
+    if resumen_vacio and hay_pagos:
+        logger.info("recaudacion_mensual: %s filas calculadas", reportes.reconstruir(conn))
+
+def programar_notificaciones_existentes(conn):
+    """Al agregar el despachador: solo las pendientes recientes se envían; las antiguas quedan archivadas."""
+    notificacion = models.Notificacion
+    desde = datetime.now() - timedelta(days=NOTIFICACIONES_PENDIENTES_DIAS)
+    recientes = conn.execute(
+        update(notificacion)
+        .where(notificacion.enviado.is_not(True), notificacion.created_at >= desde)
+        .values(enviado=False, proximo_intento=notificacion.created_at)
+    ).rowcount
+    # proximo_intento NULL: el despachador no las toma (igual que las descartadas)
+    archivadas = conn.execute(
+        update(notificacion)
+        .where(notificacion.enviado.is_not(True), or_(notificacion.created_at < desde, notificacion.created_at.is_(None)))
+        .values(enviado=False, proximo_intento=None,
+                ultimo_error=f"No enviada: anterior al despachador, con más de {NOTIFICACIONES_PENDIENTES_DIAS} días o sin fecha")
+    ).rowcount
+    if recientes or archivadas:
+        logger.info("notificaciones: %s pendientes programadas, %s antiguas archivadas sin enviar", recientes, archivadas)
+
+def excluir_incidencias_existentes(conn):
+    """Al agregar el aviso automático a los padres: las incidencias anteriores no se avisan.
+
+    Hasta entonces se avisaba a mano y notificado_padre pudo no marcarse nunca; quedan como
+    notificadas sin fecha_notificacion (el encolador siempre la completa), así se distinguen.
+    """
+    excluidas = conn.execute(
+        update(models.Incidencia)
+        .where(models.Incidencia.notificado_padre.is_not(True))
+        .values(notificado_padre=True)
+    ).rowcount
+    if excluidas:
+        logger.info("incidencias: %s anteriores al aviso automático marcadas como notificadas", excluidas)
+
+def recalcular_inscritos(conn):
+    inscritos = (
+        select(func.count())
+        .where(models.MatriculaGrupo.id_grupo == models.Grupo.id_grupo)
+        .scalar_subquery()
+    )
+    conn.execute(update(models.Grupo).values(inscritos=inscritos))
+
+def aplicar(conn):
+    agregadas = agregar_columnas_faltantes(conn)
+    if ("grupos", "inscritos") in agregadas:
+        recalcular_inscritos(conn)
+    if ("notificaciones", "proximo_intento") in agregadas:
+        programar_notificaciones_existentes(conn)
+    if ("incidencias", "id_notificacion") in agregadas:
+        excluir_incidencias_existentes(conn)
+    agregar_claves_foraneas_faltantes(conn)
+    deduplicar_asistencia(conn)
+    crear_indices_faltantes(conn)
+    eliminar_indices_obsoletos(conn)
+    completar_perfiles(conn)
+    poblar_resumen_asistencia(conn)
+    poblar_estado_asistencia(conn)
+    poblar_saldos(conn)
+    poblar_recaudacion(conn)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Date, Time, DateTime, Text, Numeric, ARRAY
+from sqlalchemy import BigInteger, Boolean, Column, Float, ForeignKey, Integer, String, Date, Time, DateTime, Text, Numeric, ARRAY, JSON, Index, text
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -15,7 +15,12 @@ class Usuario(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
-class Estudiante(Base):
+    # Herencia con una tabla por rol: tipo_usuario indica la subclase y cada tabla de perfil comparte
+    # id_usuario con usuarios. select(Estudiante) ya trae el JOIN con usuarios, y
+    # with_polymorphic(Usuario, "*") carga cualquier usuario con su perfil en una sola consulta.
+    __mapper_args__ = {"polymorphic_on": tipo_usuario, "polymorphic_abstract": True}
+
+class Estudiante(Usuario):
     __tablename__ = "estudiantes"
 
     id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="CASCADE"), primary_key=True)
@@ -29,15 +34,17 @@ class Estudiante(Base):
     telefono_padre = Column(String(20))
     email_padre = Column(String(150))
     nivel_educativo = Column(String(50))
-    created_at = Column(DateTime, default=datetime.now)
+    # created_at del perfil; Estudiante.created_at es el de usuarios
+    perfil_created_at = Column("created_at", DateTime, default=datetime.now)
+
+    __mapper_args__ = {"polymorphic_identity": "estudiante"}
     
     # Relaciones
-    usuario = relationship("Usuario")
     matriculas = relationship("Matricula", back_populates="estudiante")
     asistencias = relationship("AsistenciaEstudiante", back_populates="estudiante")
     incidencias = relationship("Incidencia", back_populates="estudiante")
 
-class Docente(Base):
+class Docente(Usuario):
     __tablename__ = "docentes"
 
     id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="CASCADE"), primary_key=True)
@@ -46,14 +53,15 @@ class Docente(Base):
     dni = Column(String(8), unique=True)
     telefono = Column(String(20))
     especialidad = Column(String(100))
-    created_at = Column(DateTime, default=datetime.now)
+    perfil_created_at = Column("created_at", DateTime, default=datetime.now)
+
+    __mapper_args__ = {"polymorphic_identity": "docente"}
     
     # Relaciones
-    usuario = relationship("Usuario")
     grupos = relationship("Grupo", back_populates="docente")
     asistencias = relationship("AsistenciaDocente", back_populates="docente")
 
-class Administrador(Base):
+class Administrador(Usuario):
     __tablename__ = "administradores"
 
     id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="CASCADE"), primary_key=True)
@@ -62,21 +70,27 @@ class Administrador(Base):
     dni = Column(String(8), unique=True)
     telefono = Column(String(20))
     rol = Column(String(50), default='admin')
-    permisos = Column(ARRAY(Text))
-    created_at = Column(DateTime, default=datetime.now)
-    
-    # Relación
-    usuario = relationship("Usuario")
+    permisos = Column(ARRAY(Text).with_variant(JSON, "sqlite"))  # JSON en SQLite (benchmarks)
+    perfil_created_at = Column("created_at", DateTime, default=datetime.now)
+
+    __mapper_args__ = {"polymorphic_identity": "administrador"}
 
 class Sesion(Base):
+    # Una por login; token_sesion es el SHA-256 del refresh token (ver sesiones.py)
     __tablename__ = "sesiones"
+    __table_args__ = (
+        # Sincronización incremental de revocaciones y purga de sesiones vencidas
+        Index("ix_sesiones_revocada_en", "revocada_en"),
+        Index("ix_sesiones_fecha_expiracion", "fecha_expiracion"),
+    )
 
     id_sesion = Column(Integer, primary_key=True, index=True)
-    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="CASCADE"), nullable=False)
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="CASCADE"), nullable=False, index=True)
     token_sesion = Column(String(255), unique=True, nullable=False)
     fecha_inicio = Column(DateTime, default=datetime.now)
     fecha_expiracion = Column(DateTime, nullable=False)
     activa = Column(Boolean, default=True)
+    revocada_en = Column(DateTime)
     
     # Relación
     usuario = relationship("Usuario")
@@ -114,7 +128,7 @@ class Curso(Base):
     id_curso = Column(Integer, primary_key=True, index=True)
     nombre = Column(String(150), nullable=False)
     descripcion = Column(Text)
-    id_ciclo = Column(Integer, ForeignKey("ciclos.id_ciclo", ondelete="CASCADE"), nullable=False)
+    id_ciclo = Column(Integer, ForeignKey("ciclos.id_ciclo", ondelete="CASCADE"), nullable=False, index=True)
     nivel_educativo = Column(String(50))
     activo = Column(Boolean, default=True)
     
@@ -127,7 +141,7 @@ class Tema(Base):
     __tablename__ = "temas"
 
     id_tema = Column(Integer, primary_key=True, index=True)
-    id_curso = Column(Integer, ForeignKey("cursos.id_curso", ondelete="CASCADE"), nullable=False)
+    id_curso = Column(Integer, ForeignKey("cursos.id_curso", ondelete="CASCADE"), nullable=False, index=True)
     nombre = Column(String(200), nullable=False)
     descripcion = Column(Text)
     duracion_estimada_horas = Column(Integer)
@@ -144,9 +158,11 @@ class Grupo(Base):
 
     id_grupo = Column(Integer, primary_key=True, index=True)
     codigo = Column(String(10), nullable=False)
-    id_curso = Column(Integer, ForeignKey("cursos.id_curso", ondelete="CASCADE"), nullable=False)
-    id_docente = Column(Integer, ForeignKey("docentes.id_usuario"))
+    id_curso = Column(Integer, ForeignKey("cursos.id_curso", ondelete="CASCADE"), nullable=False, index=True)
+    id_docente = Column(Integer, ForeignKey("docentes.id_usuario"), index=True)
     capacidad_maxima = Column(Integer, default=20)
+    # Contador de matricula_grupos, actualizado atómicamente al inscribir/retirar (ver main.py)
+    inscritos = Column(Integer, nullable=False, default=0, server_default="0")
     activo = Column(Boolean, default=True)
     
     # Relaciones
@@ -161,6 +177,11 @@ class Grupo(Base):
 
 class Horario(Base):
     __tablename__ = "horarios"
+    __table_args__ = (
+        # Búsqueda de cruces: tramos de un aula / de los grupos de un docente en un día (ver horarios.py)
+        Index("ix_horarios_aula_dia_inicio", "aula", "dia_semana", "hora_inicio"),
+        Index("ix_horarios_grupo_dia_inicio", "id_grupo", "dia_semana", "hora_inicio"),
+    )
 
     id_horario = Column(Integer, primary_key=True, index=True)
     id_grupo = Column(Integer, ForeignKey("grupos.id_grupo", ondelete="CASCADE"), nullable=False)
@@ -174,10 +195,14 @@ class Horario(Base):
 
 class Matricula(Base):
     __tablename__ = "matriculas"
+    __table_args__ = (
+        # Un estudiante se matricula una sola vez por ciclo; también sirve las búsquedas por id_usuario
+        Index("uq_matriculas_usuario_ciclo", "id_usuario", "id_ciclo", unique=True),
+    )
 
     id_matricula = Column(Integer, primary_key=True, index=True)
     id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario", ondelete="CASCADE"), nullable=False)
-    id_ciclo = Column(Integer, ForeignKey("ciclos.id_ciclo", ondelete="CASCADE"), nullable=False)
+    id_ciclo = Column(Integer, ForeignKey("ciclos.id_ciclo", ondelete="CASCADE"), nullable=False, index=True)
     id_modalidad = Column(Integer, ForeignKey("modalidades.id_modalidad"), nullable=False)
     fecha_matricula = Column(DateTime, default=datetime.now)
     estado = Column(String(20), default='activa')
@@ -191,16 +216,33 @@ class Matricula(Base):
 
 class MatriculaGrupo(Base):
     __tablename__ = "matricula_grupos"
+    __table_args__ = (
+        # Una inscripción por matrícula y grupo; también sirve las búsquedas por id_matricula
+        Index("uq_matricula_grupos_matricula_grupo", "id_matricula", "id_grupo", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     id_matricula = Column(Integer, ForeignKey("matriculas.id_matricula", ondelete="CASCADE"), nullable=False)
-    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo", ondelete="CASCADE"), nullable=False)
+    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo", ondelete="CASCADE"), nullable=False, index=True)
     fecha_inscripcion = Column(DateTime, default=datetime.now)
     
     # Relaciones
     matricula = relationship("Matricula", back_populates="matricula_grupos")
     grupo = relationship("Grupo", back_populates="matricula_grupos")
 
+class ListaEspera(Base):
+    __tablename__ = "lista_espera"
+    __table_args__ = (
+        Index("uq_lista_espera_matricula_grupo", "id_matricula", "id_grupo", unique=True),
+        # Orden de llegada dentro de un grupo
+        Index("ix_lista_espera_grupo_id", "id_grupo", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    id_matricula = Column(Integer, ForeignKey("matriculas.id_matricula", ondelete="CASCADE"), nullable=False)
+    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo", ondelete="CASCADE"), nullable=False)
+    fecha_solicitud = Column(DateTime, default=datetime.now)
+
 class ConceptoPago(Base):
     __tablename__ = "conceptos_pago"
 
@@ -212,6 +254,10 @@ class ConceptoPago(Base):
 
 class Pago(Base):
     __tablename__ = "pagos"
+    __table_args__ = (
+        # Pagos de una matrícula y "¿ya se cobró este concepto/mes?" al registrar un pago
+        Index("ix_pagos_matricula_concepto_periodo", "id_matricula", "id_concepto", "año_pagado", "mes_pagado"),
+    )
 
     id_pago = Column(Integer, primary_key=True, index=True)
     id_matricula = Column(Integer, ForeignKey("matriculas.id_matricula", ondelete="CASCADE"), nullable=False)
@@ -228,8 +274,43 @@ class Pago(Base):
     matricula = relationship("Matricula", back_populates="pagos")
     concepto = relationship("ConceptoPago")
 
+class SaldoMatricula(Base):
+    # Mantenido en la misma transacción que registra o anula un pago (ver saldos.py)
+    __tablename__ = "saldos_matricula"
+    __table_args__ = (
+        # Deudores de un ciclo / de todos los ciclos, de mayor a menor deuda
+        Index("ix_saldos_matricula_ciclo_saldo", "id_ciclo", "saldo"),
+        Index("ix_saldos_matricula_saldo", "saldo"),
+    )
+
+    id_matricula = Column(Integer, ForeignKey("matriculas.id_matricula", ondelete="CASCADE"), primary_key=True)
+    id_ciclo = Column(Integer, ForeignKey("ciclos.id_ciclo", ondelete="CASCADE"), nullable=False)
+    esperado = Column(Numeric(10, 2), nullable=False, default=0)  # monto_base de cada concepto/mes cobrado
+    pagado = Column(Numeric(10, 2), nullable=False, default=0)  # pagos confirmados
+    saldo = Column(Numeric(10, 2), nullable=False, default=0)  # esperado - pagado (positivo: deuda)
+    actualizado = Column(DateTime, default=datetime.now)
+
+class RecaudacionMensual(Base):
+    # Pagos confirmados por (ciclo, mes, concepto, método), mantenido al registrar o anular un pago (ver reportes.py)
+    __tablename__ = "recaudacion_mensual"
+    __table_args__ = (
+        # Reporte de todos los ciclos para un año / mes
+        Index("ix_recaudacion_mensual_año_mes", "año", "mes"),
+    )
+
+    id_ciclo = Column(Integer, ForeignKey("ciclos.id_ciclo", ondelete="CASCADE"), primary_key=True)
+    año = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    id_concepto = Column(Integer, ForeignKey("conceptos_pago.id_concepto"), primary_key=True)
+    metodo_pago = Column(String(50), primary_key=True, default="")  # '' si el pago no indica método
+    total = Column(Numeric(12, 2), nullable=False, default=0)
+    pagos = Column(Integer, nullable=False, default=0)
+
 class AsistenciaDocente(Base):
     __tablename__ = "asistencia_docentes"
+    __table_args__ = (
+        Index("ix_asistencia_docentes_docente_fecha", "id_docente", "fecha"),
+    )
 
     id_asistencia = Column(Integer, primary_key=True, index=True)
     id_docente = Column(Integer, ForeignKey("docentes.id_usuario"), nullable=False)
@@ -249,6 +330,12 @@ class AsistenciaDocente(Base):
 
 class AsistenciaEstudiante(Base):
     __tablename__ = "asistencia_estudiantes"
+    __table_args__ = (
+        # Un registro por estudiante, grupo y fecha (clave del upsert por lista); también sirve
+        # para leer la lista de un grupo en una fecha. Historial de un estudiante:
+        Index("uq_asistencia_estudiantes_grupo_fecha_usuario", "id_grupo", "fecha", "id_usuario", unique=True),
+        Index("ix_asistencia_estudiantes_usuario_fecha", "id_usuario", "fecha"),
+    )
 
     id_asistencia = Column(Integer, primary_key=True, index=True)
     id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario"), nullable=False)
@@ -264,6 +351,44 @@ class AsistenciaEstudiante(Base):
     estudiante = relationship("Estudiante", back_populates="asistencias")
     grupo = relationship("Grupo", back_populates="asistencias_estudiantes")
 
+class ResumenAsistencia(Base):
+    # Conteos mensuales mantenidos al registrar asistencia (ver resumenes.py)
+    __tablename__ = "resumen_asistencia"
+    __table_args__ = (
+        Index("ix_resumen_asistencia_grupo_mes", "id_grupo", "mes"),
+    )
+
+    id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario", ondelete="CASCADE"), primary_key=True)
+    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo", ondelete="CASCADE"), primary_key=True)
+    mes = Column(Date, primary_key=True)  # primer día del mes
+    presentes = Column(Integer, nullable=False, default=0)
+    ausentes = Column(Integer, nullable=False, default=0)
+
+class EstadoAsistencia(Base):
+    # Estado por (estudiante, grupo) que el evaluador de alertas actualiza al registrar asistencia (ver alertas.py)
+    __tablename__ = "estado_asistencia"
+
+    id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario", ondelete="CASCADE"), primary_key=True)
+    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo", ondelete="CASCADE"), primary_key=True)
+    ultima_fecha = Column(Date)  # clase más reciente registrada (NULL: todavía ninguna)
+    registros = Column(Integer, nullable=False, default=0)
+    consecutivas = Column(Integer, nullable=False, default=0)  # ausencias seguidas hasta ultima_fecha
+    recientes = Column(BigInteger, nullable=False, default=0)  # bit i: ausente en la i-ésima clase más reciente
+    # Condiciones que ya generaron alerta; se limpian cuando dejan de cumplirse
+    alerta_consecutivas = Column(Boolean, nullable=False, default=False)
+    alerta_tasa = Column(Boolean, nullable=False, default=False)
+
+class ReglaAlertaAsistencia(Base):
+    # Umbrales de las alertas de inasistencia según el nivel_educativo del curso
+    __tablename__ = "reglas_alerta_asistencia"
+
+    nivel_educativo = Column(String(50), primary_key=True)
+    ausencias_consecutivas = Column(Integer)  # NULL: sin alerta por ausencias seguidas
+    tasa_minima = Column(Float)  # NULL: sin alerta por tasa
+    ventana = Column(Integer, nullable=False, default=20)  # clases recientes sobre las que se mide la tasa
+    minimo_registros = Column(Integer, nullable=False, default=5)
+    activo = Column(Boolean, default=True)
+
 class TipoIncidencia(Base):
     __tablename__ = "tipos_incidencia"
 
@@ -274,6 +399,14 @@ class TipoIncidencia(Base):
 
 class Incidencia(Base):
     __tablename__ = "incidencias"
+    __table_args__ = (
+        Index("ix_incidencias_usuario_fecha", "id_usuario", "fecha_incidencia"),
+        # Incidencias que el encolador todavía no pasó a la bandeja de salida (ver incidencias.py)
+        Index("ix_incidencias_sin_notificar", "fecha_incidencia",
+              postgresql_where=text("id_notificacion IS NULL AND NOT notificado_padre"),
+              sqlite_where=text("id_notificacion IS NULL AND NOT notificado_padre")),
+        Index("ix_incidencias_id_notificacion", "id_notificacion"),
+    )
 
     id_incidencia = Column(Integer, primary_key=True, index=True)
     id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario"), nullable=False)
@@ -285,6 +418,8 @@ class Incidencia(Base):
     notificado_padre = Column(Boolean, default=False)
     fecha_notificacion = Column(DateTime)
     created_by = Column(Integer, ForeignKey("administradores.id_usuario"))
+    # Aviso (inmediato o resumen diario) que incluye esta incidencia
+    id_notificacion = Column(Integer, ForeignKey("notificaciones.id_notificacion", ondelete="SET NULL"))
     
     # Relaciones
     estudiante = relationship("Estudiante", back_populates="incidencias")
@@ -293,10 +428,17 @@ class Incidencia(Base):
     administrador = relationship("Administrador")
 
 class Notificacion(Base):
+    # Bandeja de salida: se inserta en la misma transacción que la operación que la origina y la
+    # envía el despachador de notificaciones.py
     __tablename__ = "notificaciones"
+    __table_args__ = (
+        # Pendientes listas para reservar (parcial: las enviadas no ocupan el índice)
+        Index("ix_notificaciones_pendientes", "proximo_intento",
+              postgresql_where=text("NOT enviado"), sqlite_where=text("NOT enviado")),
+    )
 
     id_notificacion = Column(Integer, primary_key=True, index=True)
-    id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario"))
+    id_usuario = Column(Integer, ForeignKey("estudiantes.id_usuario"), index=True)
     tipo = Column(String(50), nullable=False)
     titulo = Column(String(200), nullable=False)
     mensaje = Column(Text, nullable=False)
@@ -307,6 +449,11 @@ class Notificacion(Base):
     fecha_envio = Column(DateTime)
     metodo_envio = Column(String(20))
     created_at = Column(DateTime, default=datetime.now)
+    intentos = Column(Integer, nullable=False, default=0, server_default="0")
+    # Se puede reservar desde este momento (reserva en curso o espera antes de reintentar);
+    # NULL sin enviar: se agotaron los intentos
+    proximo_intento = Column(DateTime, default=datetime.now)
+    ultimo_error = Column(Text)
     
     # Relación
     estudiante = relationship("Estudiante")
@@ -315,7 +462,7 @@ class ProgresoTema(Base):
     __tablename__ = "progreso_temas"
 
     id_progreso = Column(Integer, primary_key=True, index=True)
-    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo"), nullable=False)
+    id_grupo = Column(Integer, ForeignKey("grupos.id_grupo"), nullable=False, index=True)
     id_tema = Column(Integer, ForeignKey("temas.id_tema"), nullable=False)
     fecha_planificada = Column(Date)
     fecha_ejecutada = Column(Date)
@@ -0,0 +1,389 @@
+# Envío de notificaciones desde la tabla notificaciones (bandeja de salida transaccional).
+#
+# Quien genera una notificación la inserta con `encolar` en su propia transacción; si esa transacción
+# se revierte, no se envía nada. El despachador reserva lotes de pendientes con
+# UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED): la reserva adelanta proximo_intento
+# (plazo de reserva) y suma un intento, así varios despachadores (procesos de la API o workers
+# aparte) se reparten las filas sin esperarse y una reserva abandonada vuelve a quedar disponible.
+# Los envíos corren con concurrencia acotada y el resultado se guarda en bloque: un UPDATE para las
+# enviadas y uno por lote para reprogramar las fallidas con backoff exponencial.
+#
+# La entrega es "al menos una vez": un envío que el servidor aceptó pero cuya respuesta no llegó (corte
+# de red, timeout del socket) se registra como fallido y se reintenta, y el destinatario lo recibe dos
+# veces. Para que una reserva no venza con envíos en curso (otro despachador los repetiría), el plazo
+# de reserva cubre el peor caso de un lote: ceil(lote / concurrencia) tandas de NOTIFICACIONES_TIMEOUT_S
+# más NOTIFICACIONES_RESERVA_MARGEN_S. Los envíos no se cancelan desde afuera (cancelar un envío SMTP
+# en curso no lo detiene, solo deja de esperarlo): el límite lo pone el timeout de cada canal.
+#
+#   python -m FastAPI.notificaciones   # despachador como proceso aparte
+import asyncio
+import logging
+import math
+import os
+import queue
+import random
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Arrancar el despachador junto con la API (además se necesita al menos un canal configurado)
+NOTIFICACIONES_DESPACHADOR = os.getenv("NOTIFICACIONES_DESPACHADOR", "true").lower() in ("1", "true", "yes")
+# Canales de prueba en memoria en lugar de SMTP / pasarela SMS
+NOTIFICACIONES_FAKE = os.getenv("NOTIFICACIONES_FAKE", "false").lower() in ("1", "true", "yes")
+NOTIFICACIONES_LOTE = int(os.getenv("NOTIFICACIONES_LOTE", "100"))
+NOTIFICACIONES_CONCURRENCIA = int(os.getenv("NOTIFICACIONES_CONCURRENCIA", "20"))
+NOTIFICACIONES_MAX_INTENTOS = int(os.getenv("NOTIFICACIONES_MAX_INTENTOS", "5"))
+NOTIFICACIONES_INTERVALO_S = float(os.getenv("NOTIFICACIONES_INTERVALO_S", "2"))
+# Timeout de socket de cada canal (conexión y cada operación de SMTP / HTTP)
+NOTIFICACIONES_TIMEOUT_S = float(os.getenv("NOTIFICACIONES_TIMEOUT_S", "30"))
+# Plazo de reserva de un lote; sin definir se calcula con reserva_minima (ver arriba)
+NOTIFICACIONES_RESERVA_S = float(os.environ["NOTIFICACIONES_RESERVA_S"]) if "NOTIFICACIONES_RESERVA_S" in os.environ else None
+NOTIFICACIONES_RESERVA_MARGEN_S = float(os.getenv("NOTIFICACIONES_RESERVA_MARGEN_S", "60"))
+NOTIFICACIONES_BACKOFF_S = float(os.getenv("NOTIFICACIONES_BACKOFF_S", "30"))
+NOTIFICACIONES_BACKOFF_MAX_S = float(os.getenv("NOTIFICACIONES_BACKOFF_MAX_S", "3600"))
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USUARIO = os.getenv("SMTP_USUARIO")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_REMITENTE = os.getenv("SMTP_REMITENTE", "no-responder@academico.pe")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMS_URL = os.getenv("SMS_URL")
+SMS_TOKEN = os.getenv("SMS_TOKEN")
+
+class ErrorPermanente(Exception):
+    """El envío no tiene sentido reintentarlo (destinatario inválido, canal inexistente)."""
+
+# ========== CANALES ==========
+class CanalSMTP:
+    """Correo por SMTP. smtplib es bloqueante: cada envío corre en un hilo y reutiliza conexiones."""
+
+    def __init__(self, host: str, port: int, usuario: Optional[str], password: Optional[str],
+                 remitente: str, starttls: bool = True):
+        self.host, self.port = host, port
+        self.usuario, self.password = usuario, password
+        self.remitente = remitente
+        self.starttls = starttls
+        self._conexiones: "queue.SimpleQueue[smtplib.SMTP]" = queue.SimpleQueue()
+
+    def _conectar(self) -> smtplib.SMTP:
+        conexion = smtplib.SMTP(self.host, self.port, timeout=NOTIFICACIONES_TIMEOUT_S)
+        if self.starttls:
+            conexion.starttls()
+        if self.usuario:
+            conexion.login(self.usuario, self.password)
+        return conexion
+
+    def _enviar(self, mensaje: EmailMessage):
+        try:
+            conexion = self._conexiones.get_nowait()
+        except queue.Empty:
+            conexion = self._conectar()
+        try:
+            conexion.send_message(mensaje)
+        except smtplib.SMTPRecipientsRefused as e:
+            self._conexiones.put(conexion)
+            raise ErrorPermanente(f"Destinatario rechazado: {e.recipients}")
+        except Exception:
+            conexion.close()
+            raise
+        self._conexiones.put(conexion)
+
+    async def enviar(self, notificacion):
+        if not notificacion.email_destinatario:
+            raise ErrorPermanente("La notificación no tiene email_destinatario")
+        mensaje = EmailMessage()
+        mensaje["From"] = self.remitente
+        mensaje["To"] = notificacion.email_destinatario
+        mensaje["Subject"] = notificacion.titulo
+        mensaje.set_content(notificacion.mensaje)
+        await asyncio.to_thread(self._enviar, mensaje)
+
+    async def cerrar(self):
+        while not self._conexiones.empty():
+            conexion = self._conexiones.get_nowait()
+            try:
+                await asyncio.to_thread(conexion.quit)
+            except Exception:
+                conexion.close()
+
+class CanalSMSHTTP:
+    """SMS a través de una pasarela HTTP (POST JSON con telefono y mensaje)."""
+
+    def __init__(self, url: str, token: Optional[str] = None, transport=None):
+        import httpx
+
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.url = url
+        self._cliente = httpx.AsyncClient(headers=headers, timeout=NOTIFICACIONES_TIMEOUT_S, transport=transport)
+
+    async def enviar(self, notificacion):
+        if not notificacion.telefono_destinatario:
+            raise ErrorPermanente("La notificación no tiene telefono_destinatario")
+        respuesta = await self._cliente.post(self.url, json={
+            "telefono": notificacion.telefono_destinatario,
+            "mensaje": f"{notificacion.titulo}: {notificacion.mensaje}",
+        })
+        if 400 <= respuesta.status_code < 500 and respuesta.status_code != 429:
+            raise ErrorPermanente(f"Pasarela SMS respondió {respuesta.status_code}")
+        respuesta.raise_for_status()
+
+    async def cerrar(self):
+        await self._cliente.aclose()
+
+class CanalMemoria:
+    """Canal de prueba: guarda lo enviado en memoria; puede simular latencia y fallos transitorios."""
+
+    def __init__(self, latencia_s: float = 0.0, tasa_fallos: float = 0.0, semilla: Optional[int] = None):
+        self.latencia_s = latencia_s
+        self.tasa_fallos = tasa_fallos
+        self.enviados: List[int] = []
+        self._azar = random.Random(semilla)
+
+    async def enviar(self, notificacion):
+        if self.latencia_s:
+            await asyncio.sleep(self.latencia_s)
+        if self._azar.random() < self.tasa_fallos:
+            raise ConnectionError("Fallo simulado")
+        self.enviados.append(notificacion.id_notificacion)
+
+def canales_configurados() -> Dict[str, object]:
+    if NOTIFICACIONES_FAKE:
+        return {"email": CanalMemoria(), "sms": CanalMemoria()}
+    canales = {}
+    if SMTP_HOST:
+        canales["email"] = CanalSMTP(SMTP_HOST, SMTP_PORT, SMTP_USUARIO, SMTP_PASSWORD, SMTP_REMITENTE, SMTP_STARTTLS)
+    if SMS_URL:
+        canales["sms"] = CanalSMSHTTP(SMS_URL, SMS_TOKEN)
+    return canales
+
+def metodo_de(notificacion) -> Optional[str]:
+    """Canal de una notificación: metodo_envio si se indicó; si no, email y luego SMS según los datos."""
+    if notificacion.metodo_envio:
+        return notificacion.metodo_envio
+    if notificacion.email_destinatario:
+        return "email"
+    if notificacion.telefono_destinatario:
+        return "sms"
+    return None
+
+# Funciones async (db, ids, fecha_envio) que se ejecutan en la transacción que marca notificaciones
+# como enviadas, para actualizar en bloque lo que dependa de la entrega (ver incidencias.py)
+al_confirmar: List[Callable[[AsyncSession, List[int], datetime], Awaitable[None]]] = []
+
+def encolar(db: AsyncSession, **campos) -> models.Notificacion:
+    """Agrega una notificación a la transacción en curso; se envía después del COMMIT."""
+    notificacion = models.Notificacion(**campos)
+    db.add(notificacion)
+    return notificacion
+
+# ========== DESPACHADOR ==========
+def _espera_reintento(intentos: int) -> float:
+    espera = min(NOTIFICACIONES_BACKOFF_S * 2 ** (intentos - 1), NOTIFICACIONES_BACKOFF_MAX_S)
+    return espera * random.uniform(0.8, 1.2)
+
+def reserva_minima(lote: int, concurrencia: int) -> float:
+    """Plazo que cubre un lote completo con todos sus envíos llegando al timeout."""
+    return math.ceil(lote / concurrencia) * NOTIFICACIONES_TIMEOUT_S + NOTIFICACIONES_RESERVA_MARGEN_S
+
+class Despachador:
+    def __init__(self, canales: Dict[str, object], lote: int = NOTIFICACIONES_LOTE,
+                 concurrencia: int = NOTIFICACIONES_CONCURRENCIA, max_intentos: int = NOTIFICACIONES_MAX_INTENTOS,
+                 intervalo_s: float = NOTIFICACIONES_INTERVALO_S, reserva_s: Optional[float] = NOTIFICACIONES_RESERVA_S):
+        minima = reserva_minima(lote, concurrencia)
+        if reserva_s is None:
+            reserva_s = minima
+        elif reserva_s < minima:
+            raise ValueError(f"Plazo de reserva de {reserva_s:g} s menor que el peor caso de un lote ({minima:g} s): "
+                             f"aumente NOTIFICACIONES_RESERVA_S o la concurrencia, o reduzca el lote")
+        self.canales = canales
+        self.lote = lote
+        self.concurrencia = concurrencia
+        self.max_intentos = max_intentos
+        self.intervalo_s = intervalo_s
+        self.reserva_s = reserva_s
+        self.enviadas = 0
+        self.reintentos = 0
+        self.descartadas = 0
+        self.lotes = 0
+        self._inicio = time.monotonic()
+        self._despertar = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+
+    async def reservar(self) -> list:
+        ahora = datetime.now()
+        notificacion = models.Notificacion
+        pendientes = (
+            select(notificacion.id_notificacion)
+            .where(~notificacion.enviado, notificacion.proximo_intento <= ahora)
+            .order_by(notificacion.proximo_intento)
+            .limit(self.lote)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSessionLocal() as db:
+            filas = (await db.execute(
+                update(notificacion)
+                .where(notificacion.id_notificacion.in_(pendientes))
+                .values(proximo_intento=ahora + timedelta(seconds=self.reserva_s), intentos=notificacion.intentos + 1)
+                .returning(notificacion.id_notificacion, notificacion.titulo, notificacion.mensaje,
+                           notificacion.telefono_destinatario, notificacion.email_destinatario,
+                           notificacion.metodo_envio, notificacion.intentos)
+            )).all()
+            await db.commit()
+        return filas
+
+    async def _enviar(self, semaforo: asyncio.Semaphore, notificacion) -> Optional[Exception]:
+        async with semaforo:
+            canal = self.canales.get(metodo_de(notificacion))
+            if canal is None:
+                return ErrorPermanente(f"Canal no configurado: {metodo_de(notificacion)}")
+            try:
+                # Sin wait_for: el timeout lo aplica el canal (un envío abandonado podría completarse igual)
+                await canal.enviar(notificacion)
+            except Exception as e:
+                return e
+            return None
+
+    async def procesar_lote(self) -> int:
+        """Reserva, envía y registra un lote; devuelve cuántas notificaciones reservó."""
+        filas = await self.reservar()
+        if not filas:
+            return 0
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        errores = await asyncio.gather(*(self._enviar(semaforo, fila) for fila in filas))
+
+        ahora = datetime.now()
+        por_metodo: Dict[str, List[int]] = {}
+        fallidas = []
+        for fila, error in zip(filas, errores):
+            if error is None:
+                por_metodo.setdefault(metodo_de(fila), []).append(fila.id_notificacion)
+                continue
+            agotada = isinstance(error, ErrorPermanente) or fila.intentos >= self.max_intentos
+            fallidas.append({
+                "id_notificacion": fila.id_notificacion,
+                "proximo_intento": None if agotada else ahora + timedelta(seconds=_espera_reintento(fila.intentos)),
+                "ultimo_error": f"{type(error).__name__}: {error}"[:500],
+            })
+            if agotada:
+                self.descartadas += 1
+                logger.warning("Notificación %s descartada: %s", fila.id_notificacion, error)
+            else:
+                self.reintentos += 1
+
+        async with AsyncSessionLocal() as db:
+            for metodo, ids in por_metodo.items():
+                await db.execute(
+                    update(models.Notificacion)
+                    .where(models.Notificacion.id_notificacion.in_(ids))
+                    .values(enviado=True, fecha_envio=ahora, metodo_envio=metodo, proximo_intento=None,
+                            ultimo_error=None)
+                )
+            enviadas = [id_notificacion for ids in por_metodo.values() for id_notificacion in ids]
+            if enviadas:
+                for confirmar in al_confirmar:
+                    await confirmar(db, enviadas, ahora)
+            if fallidas:
+                # UPDATE por clave primaria con executemany
+                await db.execute(update(models.Notificacion), fallidas)
+            await db.commit()
+        self.enviadas += len(enviadas)
+        self.lotes += 1
+        return len(filas)
+
+    async def ejecutar(self):
+        while True:
+            try:
+                reservadas = await self.procesar_lote()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en el despachador de notificaciones")
+                reservadas = 0
+            if reservadas < self.lote:
+                # Sin trabajo pendiente: se espera al intervalo o a que alguien encole (despertar)
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), self.intervalo_s)
+                except asyncio.TimeoutError:
+                    pass
+
+    def despertar(self):
+        self._despertar.set()
+
+    def iniciar(self):
+        self._tarea = asyncio.create_task(self.ejecutar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        for canal in self.canales.values():
+            if hasattr(canal, "cerrar"):
+                await canal.cerrar()
+
+    def estado(self) -> dict:
+        transcurrido = time.monotonic() - self._inicio
+        return {
+            "canales": sorted(self.canales),
+            "activo": self._tarea is not None and not self._tarea.done(),
+            "enviadas": self.enviadas,
+            "reintentos": self.reintentos,
+            "descartadas": self.descartadas,
+            "lotes": self.lotes,
+            "reserva_s": self.reserva_s,
+            "enviadas_por_s": self.enviadas / transcurrido if transcurrido else 0.0,
+        }
+
+despachador: Optional[Despachador] = None
+
+def iniciar() -> Optional[Despachador]:
+    """Arranca el despachador del proceso (desde el lifespan de la API) si hay canales configurados."""
+    global despachador
+    canales = canales_configurados()
+    if not NOTIFICACIONES_DESPACHADOR or not canales:
+        return None
+    despachador = Despachador(canales)
+    despachador.iniciar()
+    return despachador
+
+async def detener():
+    global despachador
+    if despachador is not None:
+        await despachador.detener()
+        despachador = None
+
+def despertar():
+    if despachador is not None:
+        despachador.despertar()
+
+def estado() -> dict:
+    if despachador is None:
+        return {"canales": sorted(canales_configurados()), "activo": False}
+    return despachador.estado()
+
+async def main():
+    from . import incidencias  # encolador de avisos de incidencias y su confirmación de entrega
+
+    logging.basicConfig(level=logging.INFO)
+    canales = canales_configurados()
+    if not canales:
+        raise SystemExit("Sin canales: defina SMTP_HOST y/o SMS_URL (o NOTIFICACIONES_FAKE=true)")
+    await asyncio.gather(Despachador(canales).ejecutar(), incidencias.Encolador().ejecutar())
+
+if __name__ == "__main__":
+    asyncio.run(main())
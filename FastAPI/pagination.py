@@ -0,0 +1,45 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Cabecera con el cursor opaco de la página siguiente (ausente en la última página)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def codificar_cursor(tabla: str, ultimo_id: int) -> str:
+    datos = json.dumps({"t": tabla, "k": ultimo_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+def decodificar_cursor(tabla: str, cursor: str) -> int:
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if datos["t"] != tabla or not isinstance(datos["k"], int):
+            raise ValueError(cursor)
+        return datos["k"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def paginar(db: AsyncSession, response: Response, stmt, columna_pk,
+                  skip: int = 0, limit: int = 100, cursor: Optional[str] = None, columnas: bool = False) -> list:
+    """Ejecuta `stmt` paginado por clave primaria.
+
+    Con `cursor` usa keyset (WHERE pk > último visto), que cuesta lo mismo en cualquier página y no
+    duplica ni salta filas si se insertan registros entre páginas. Sin cursor y con `skip` se
+    mantiene la paginación por OFFSET anterior. En ambos modos el orden es estable (por pk) y se
+    devuelve el cursor de la página siguiente en la cabecera X-Next-Cursor.
+    Con `columnas=True` (`stmt` es un select de columnas) devuelve las filas en lugar de objetos ORM.
+    """
+    tabla = columna_pk.table.name
+    stmt = stmt.order_by(columna_pk)
+    if cursor:
+        stmt = stmt.where(columna_pk > decodificar_cursor(tabla, cursor))
+    elif skip:
+        stmt = stmt.offset(skip)
+    resultado = await db.execute(stmt.limit(limit))
+    filas = resultado.all() if columnas else resultado.scalars().all()
+    if filas and len(filas) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = codificar_cursor(tabla, getattr(filas[-1], columna_pk.key))
+    return filas
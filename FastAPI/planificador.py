@@ -0,0 +1,249 @@
+# Generador automático de horarios para los grupos de un ciclo.
+#
+# La semana se divide en bloques (día x franja de duracion_bloque_min). Cada grupo necesita
+# ceil(horas del curso / duración del bloque) bloques en los que su docente esté disponible y libre
+# y haya un aula libre. La búsqueda es un greedy aleatorizado con reinicios: en cada intento se
+# ordenan los grupos del más restringido al menos restringido y se asigna cada bloque minimizando
+# repeticiones en un mismo día; se conserva el mejor intento hasta completar o agotar el tiempo.
+#
+# La búsqueda corre en un ProcessPoolExecutor (no bloquea el event loop ni ocupa el GIL de la API) y
+# publica su progreso en un dict de multiprocessing.Manager. Los trabajos viven en memoria del
+# proceso de la API que los creó.
+import asyncio
+import math
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as hora
+from typing import List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import horarios
+from . import models
+from . import schemas
+from .cache import CacheTTL
+
+# Procesos dedicados a la búsqueda y tope del tiempo que puede pedir una solicitud
+PLANIFICADOR_WORKERS = int(os.getenv("PLANIFICADOR_WORKERS", "1"))
+PLANIFICADOR_TIEMPO_MAX = float(os.getenv("PLANIFICADOR_TIEMPO_MAX", "60"))
+
+# ---------- Búsqueda (se ejecuta en el proceso del pool; solo datos simples) ----------
+
+def _bloques_de_tramo(problema: dict, dia_semana: str, inicio: hora, fin: hora, completos: bool = False) -> List[int]:
+    """Bloques de la semana que se solapan con el tramo (o, con `completos`, que caben enteros en él)."""
+    if dia_semana not in problema["dias"]:
+        return []
+    base = problema["dias"].index(dia_semana) * problema["bloques_por_dia"]
+    desde, hasta = inicio.hour * 60 + inicio.minute, fin.hour * 60 + fin.minute
+    bloques = []
+    for p in range(problema["bloques_por_dia"]):
+        bloque_desde = problema["inicio_min"] + p * problema["duracion"]
+        bloque_hasta = bloque_desde + problema["duracion"]
+        if (desde <= bloque_desde and bloque_hasta <= hasta) if completos else (bloque_desde < hasta and bloque_hasta > desde):
+            bloques.append(base + p)
+    return bloques
+
+def _intento(problema: dict, azar: random.Random) -> dict:
+    total_bloques = len(problema["dias"]) * problema["bloques_por_dia"]
+    todos = range(total_bloques)
+    aulas_libres = [set(problema["aulas"]) for _ in todos]
+    for aula, bloques in problema["ocupado_aula"].items():
+        for b in bloques:
+            aulas_libres[b].discard(aula)
+    ocupado_docente = defaultdict(set, {d: set(bloques) for d, bloques in problema["ocupado_docente"].items()})
+    disponible = problema["disponible"]
+
+    # Más restringido primero: pocos bloques disponibles por bloque necesario
+    orden = sorted(
+        problema["grupos"],
+        key=lambda g: (len(disponible.get(g[1], todos)) / max(g[2], 1), azar.random()),
+    )
+    asignaciones, sin_asignar, repeticiones = [], {}, 0
+    for id_grupo, id_docente, necesarios in orden:
+        usados, por_dia, aula_grupo = set(), Counter(), None
+        candidatos = disponible.get(id_docente, todos)
+        for _ in range(necesarios):
+            mejor = None
+            for b in candidatos:
+                libres = aulas_libres[b]
+                if not libres or b in usados or b in ocupado_docente[id_docente]:
+                    continue
+                costo = (por_dia[b // problema["bloques_por_dia"]], aula_grupo not in libres, azar.random())
+                if mejor is None or costo < mejor[0]:
+                    mejor = (costo, b)
+            if mejor is None:
+                sin_asignar[id_grupo] = sin_asignar.get(id_grupo, 0) + 1
+                continue
+            b = mejor[1]
+            aula = aula_grupo if aula_grupo in aulas_libres[b] else azar.choice(sorted(aulas_libres[b]))
+            aula_grupo = aula_grupo or aula
+            aulas_libres[b].discard(aula)
+            if id_docente is not None:
+                ocupado_docente[id_docente].add(b)
+            usados.add(b)
+            repeticiones += por_dia[b // problema["bloques_por_dia"]]
+            por_dia[b // problema["bloques_por_dia"]] += 1
+            asignaciones.append((id_grupo, b, aula))
+    return {"asignaciones": asignaciones, "sin_asignar": sin_asignar, "repeticiones": repeticiones}
+
+def resolver(problema: dict, tiempo_limite: float, semilla: Optional[int] = None, progreso=None) -> dict:
+    """Reintenta hasta asignar todos los bloques o agotar `tiempo_limite`; devuelve el mejor intento."""
+    azar = random.Random(semilla)
+    total = sum(necesarios for _, _, necesarios in problema["grupos"])
+    inicio = time.monotonic()
+    mejor, intentos = None, 0
+    while True:
+        resultado = _intento(problema, azar)
+        intentos += 1
+        if mejor is None or (len(resultado["asignaciones"]), -resultado["repeticiones"]) > \
+                (len(mejor["asignaciones"]), -mejor["repeticiones"]):
+            mejor = resultado
+        segundos = time.monotonic() - inicio
+        if progreso is not None:
+            progreso.update(intentos=intentos, asignados=len(mejor["asignaciones"]), total=total, segundos=segundos)
+        if len(mejor["asignaciones"]) == total or segundos >= tiempo_limite:
+            break
+    return {**mejor, "intentos": intentos, "segundos": time.monotonic() - inicio, "total": total}
+
+def a_horarios(problema: dict, asignaciones) -> List[dict]:
+    """Bloques asignados -> filas de Horario, uniendo bloques consecutivos del mismo grupo y aula."""
+    filas = []
+    for id_grupo, b, aula in sorted(asignaciones, key=lambda a: (a[0], a[2], a[1])):
+        dia, franja = divmod(b, problema["bloques_por_dia"])
+        inicio = problema["inicio_min"] + franja * problema["duracion"]
+        anterior = filas[-1] if filas else None
+        if anterior and anterior["_clave"] == (id_grupo, aula, dia) and anterior["_fin"] == inicio:
+            anterior["_fin"] = inicio + problema["duracion"]
+            continue
+        filas.append({"_clave": (id_grupo, aula, dia), "_inicio": inicio, "_fin": inicio + problema["duracion"]})
+    return [
+        {"id_grupo": fila["_clave"][0], "aula": fila["_clave"][1], "dia_semana": problema["dias"][fila["_clave"][2]],
+         "hora_inicio": hora(*divmod(fila["_inicio"], 60)), "hora_fin": hora(*divmod(fila["_fin"], 60))}
+        for fila in filas
+    ]
+
+# ---------- Carga del problema desde la BD ----------
+
+async def cargar_problema(db: AsyncSession, ciclo: models.Ciclo, solicitud: schemas.SolicitudPlanificacion) -> dict:
+    inicio_min = solicitud.hora_inicio.hour * 60 + solicitud.hora_inicio.minute
+    fin_min = solicitud.hora_fin.hour * 60 + solicitud.hora_fin.minute
+    problema = {
+        "dias": list(solicitud.dias),
+        "bloques_por_dia": (fin_min - inicio_min) // solicitud.duracion_bloque_min,
+        "inicio_min": inicio_min,
+        "duracion": solicitud.duracion_bloque_min,
+        "aulas": list(solicitud.aulas),
+    }
+
+    filas = await db.execute(
+        select(models.Grupo.id_grupo, models.Grupo.id_docente, models.Grupo.id_curso)
+        .join(models.Curso, models.Curso.id_curso == models.Grupo.id_curso)
+        .where(models.Curso.id_ciclo == ciclo.id_ciclo, models.Grupo.activo.isnot(False))
+        .order_by(models.Grupo.id_grupo)
+    )
+    problema["grupos"] = [
+        (id_grupo, id_docente, math.ceil(solicitud.horas_por_curso[id_curso] * 60 / solicitud.duracion_bloque_min))
+        for id_grupo, id_docente, id_curso in filas
+        if solicitud.horas_por_curso.get(id_curso)
+    ]
+
+    # Horarios que se conservan (otros ciclos en esas fechas y grupos no planificados) ocupan aula y docente
+    planificados = {id_grupo for id_grupo, _, _ in problema["grupos"]}
+    ocupado_aula, ocupado_docente = defaultdict(list), defaultdict(list)
+    for h in await db.execute(horarios._horarios_vigentes(ciclo.fecha_inicio, ciclo.fecha_fin)):
+        if h.id_grupo in planificados:
+            continue
+        bloques = _bloques_de_tramo(problema, h.dia_semana, h.hora_inicio, h.hora_fin)
+        if h.aula:
+            ocupado_aula[h.aula] += bloques
+        if h.id_docente is not None:
+            ocupado_docente[h.id_docente] += bloques
+    problema["ocupado_aula"] = dict(ocupado_aula)
+    problema["ocupado_docente"] = dict(ocupado_docente)
+
+    # Docentes sin disponibilidad declarada: disponibles en todos los bloques
+    disponible = defaultdict(set)
+    for d in solicitud.disponibilidad:
+        disponible[d.id_docente].update(_bloques_de_tramo(problema, d.dia_semana, d.hora_inicio, d.hora_fin, completos=True))
+    problema["disponible"] = {id_docente: sorted(bloques) for id_docente, bloques in disponible.items()}
+    return problema
+
+# ---------- Trabajos en segundo plano ----------
+
+_executor: Optional[ProcessPoolExecutor] = None
+_manager = None
+trabajos = CacheTTL(max_entradas=100, ttl=24 * 3600)
+
+def _pool():
+    global _executor, _manager
+    if _executor is None:
+        _manager = multiprocessing.Manager()
+        _executor = ProcessPoolExecutor(max_workers=PLANIFICADOR_WORKERS)
+    return _executor, _manager
+
+def iniciar(id_ciclo: int, problema: dict, tiempo_limite: float, semilla: Optional[int]) -> str:
+    executor, manager = _pool()
+    progreso = manager.dict(intentos=0, asignados=0, total=sum(n for _, _, n in problema["grupos"]), segundos=0.0)
+    id_trabajo = uuid.uuid4().hex
+    futuro = asyncio.get_running_loop().run_in_executor(
+        executor, resolver, problema, min(tiempo_limite, PLANIFICADOR_TIEMPO_MAX), semilla, progreso)
+    trabajos.set(id_trabajo, {"id_ciclo": id_ciclo, "problema": problema, "futuro": futuro, "progreso": progreso,
+                              "creado": datetime.now()})
+    return id_trabajo
+
+def estado(id_trabajo: str) -> Optional[schemas.TrabajoPlanificacion]:
+    trabajo = trabajos.get(id_trabajo)
+    if trabajo is None:
+        return None
+    futuro = trabajo["futuro"]
+    respuesta = schemas.TrabajoPlanificacion(
+        id_trabajo=id_trabajo, id_ciclo=trabajo["id_ciclo"], estado="en_curso",
+        grupos=[id_grupo for id_grupo, _, _ in trabajo["problema"]["grupos"]],
+        progreso=schemas.ProgresoPlanificacion(**dict(trabajo["progreso"])),
+    )
+    if not futuro.done():
+        return respuesta
+    if futuro.exception() is not None:
+        respuesta.estado = "fallido"
+        respuesta.error = str(futuro.exception())
+        return respuesta
+    resultado = futuro.result()
+    respuesta.estado = "terminado"
+    respuesta.progreso = schemas.ProgresoPlanificacion(
+        intentos=resultado["intentos"], asignados=len(resultado["asignaciones"]),
+        total=resultado["total"], segundos=resultado["segundos"])
+    respuesta.horarios = [schemas.HorarioCreate(**fila) for fila in a_horarios(trabajo["problema"], resultado["asignaciones"])]
+    respuesta.sin_asignar = resultado["sin_asignar"]
+    return respuesta
+
+async def aplicar(db: AsyncSession, trabajo: schemas.TrabajoPlanificacion, ciclo: models.Ciclo):
+    """Reemplaza (sin confirmar) los horarios de los grupos planificados.
+
+    Devuelve (horarios nuevos, cruces de esos horarios con los actuales): otro horario pudo
+    guardarse mientras se resolvía, y en ese caso quien llama debe descartar la transacción.
+    """
+    # Mismos bloqueos que POST /api/horarios: nadie guarda en esas aulas/docentes y días hasta el COMMIT
+    docentes = dict((await db.execute(
+        select(models.Grupo.id_grupo, models.Grupo.id_docente).where(models.Grupo.id_grupo.in_(trabajo.grupos))
+    )).all())
+    await horarios.bloquear(db, [clave for horario in trabajo.horarios
+                                 for clave in horarios.claves(horario, docentes.get(horario.id_grupo))])
+    await db.execute(delete(models.Horario).where(models.Horario.id_grupo.in_(trabajo.grupos)))
+    nuevos = [models.Horario(**horario.model_dump()) for horario in trabajo.horarios]
+    db.add_all(nuevos)
+    await db.flush()
+    ids_nuevos = {horario.id_horario for horario in nuevos}
+    cruces = [c for c in await horarios.conflictos_ciclo(db, ciclo)
+              if c.id_horario in ids_nuevos or c.id_horario_conflicto in ids_nuevos]
+    return nuevos, cruces
+
+def cerrar():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _manager.shutdown()
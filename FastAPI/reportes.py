@@ -0,0 +1,219 @@
+# Reporte de recaudación sobre pagos confirmados: totales por mes, concepto, método de pago y ciclo,
+# con tablas cruzadas.
+#
+# recaudacion_mensual guarda el GROUP BY (ciclo, año, mes, concepto, método) de pagos y se actualiza
+# en la misma transacción que registra o anula un pago, así el reporte lee unas pocas miles de filas
+# sin importar cuántos pagos haya. Las tablas cruzadas se arman en Python sobre esas filas, que se
+# guardan en cache por (ciclo, año, mes): un pago invalida solo su mes.
+#
+# Cada mes lleva una versión que `invalidar` incrementa; una lectura que empezó antes de la
+# invalidación (y pudo ver las filas previas al COMMIT) no guarda su resultado. La cache es del
+# proceso: los demás workers de la API no se enteran de la invalidación y pueden servir el mes sin el
+# pago nuevo hasta REPORTES_TTL segundos.
+#
+# Período de un pago: (año_pagado, mes_pagado) si ambos están definidos; si no (matrícula, trámites),
+# el mes de fecha_pago.
+#
+#   python -m FastAPI.reportes reconstruir   # recalcula recaudacion_mensual desde pagos
+#   python -m FastAPI.reportes verificar     # compara con pagos; sale con 1 si hay diferencias
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Optional
+
+from sqlalchemy import and_, case, delete, extract, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .cache import CacheTTL
+from .database import insert_dialecto
+
+REPORTES_TTL = float(os.getenv("REPORTES_TTL", "600"))
+REPORTES_CACHE_MAX = int(os.getenv("REPORTES_CACHE_MAX", "5000"))
+
+CLAVE = ["id_ciclo", "año", "mes", "id_concepto", "metodo_pago"]
+SIN_METODO = "sin método"
+
+_cache = CacheTTL(max_entradas=REPORTES_CACHE_MAX, ttl=REPORTES_TTL)
+# (año, mes) -> versión; se incrementa en cada invalidación
+_versiones: Dict[tuple, int] = {}
+
+def periodo(pago) -> tuple:
+    """(año, mes) en que se reporta un pago (fecha_pago debe estar asignada)."""
+    if pago.año_pagado is not None and pago.mes_pagado is not None:
+        return pago.año_pagado, pago.mes_pagado
+    return pago.fecha_pago.year, pago.fecha_pago.month
+
+async def mover(db: AsyncSession, id_ciclo: int, pago, signo: int = 1):
+    """Suma (o resta, con signo=-1) un pago confirmado a su fila de recaudacion_mensual."""
+    tabla = models.RecaudacionMensual.__table__
+    año, mes = periodo(pago)
+    stmt = insert_dialecto(db, models.RecaudacionMensual).values(
+        id_ciclo=id_ciclo, año=año, mes=mes, id_concepto=pago.id_concepto, metodo_pago=pago.metodo_pago or "",
+        total=signo * pago.monto, pagos=signo,
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=CLAVE,
+        set_={"total": tabla.c.total + stmt.excluded.total, "pagos": tabla.c.pagos + stmt.excluded.pagos},
+    ))
+
+def invalidar(id_ciclo: int, pago):
+    año, mes = periodo(pago)
+    _versiones[año, mes] = _versiones.get((año, mes), 0) + 1
+    _cache.invalidar((id_ciclo, año, mes))
+    _cache.invalidar((None, año, mes))
+
+def _agregado():
+    pago = models.Pago
+    con_periodo = and_(pago.año_pagado.is_not(None), pago.mes_pagado.is_not(None))
+    año = case((con_periodo, pago.año_pagado), else_=extract("year", pago.fecha_pago))
+    mes = case((con_periodo, pago.mes_pagado), else_=extract("month", pago.fecha_pago))
+    metodo = func.coalesce(pago.metodo_pago, "")
+    return (
+        select(models.Matricula.id_ciclo, año.label("año"), mes.label("mes"), pago.id_concepto,
+               metodo.label("metodo_pago"), func.sum(pago.monto).label("total"), func.count().label("pagos"))
+        .join(models.Matricula, models.Matricula.id_matricula == pago.id_matricula)
+        .where(pago.estado == "confirmado")
+        .group_by(models.Matricula.id_ciclo, año, mes, pago.id_concepto, metodo)
+    )
+
+def reconstruir(conn) -> int:
+    conn.execute(delete(models.RecaudacionMensual))
+    conn.execute(models.RecaudacionMensual.__table__.insert().from_select(CLAVE + ["total", "pagos"], _agregado()))
+    return conn.scalar(select(func.count()).select_from(models.RecaudacionMensual))
+
+def verificar(conn) -> list:
+    """Claves de recaudacion_mensual que no coinciden con los pagos (o que faltan / sobran)."""
+    real = _agregado().subquery()
+    resumen = models.RecaudacionMensual.__table__
+    mismas_claves = and_(*(real.c[campo] == resumen.c[campo] for campo in CLAVE))
+    stmt = (
+        select(
+            *(func.coalesce(real.c[campo], resumen.c[campo]).label(campo) for campo in CLAVE),
+            real.c.total.label("total_real"),
+            real.c.pagos.label("pagos_reales"),
+            resumen.c.total,
+            resumen.c.pagos,
+        )
+        .select_from(real.outerjoin(resumen, mismas_claves, full=True))
+        .where(or_(
+            # Una fila en cero (todos sus pagos anulados) no es una diferencia
+            and_(real.c.id_ciclo.is_(None), resumen.c.pagos != 0),
+            resumen.c.id_ciclo.is_(None),
+            func.abs(real.c.total - resumen.c.total) > Decimal("0.005"),
+            real.c.pagos != resumen.c.pagos,
+        ))
+    )
+    return [dict(fila) for fila in conn.execute(stmt).mappings()]
+
+async def filas(db: AsyncSession, id_ciclo: Optional[int], año: int, meses: list) -> list:
+    """Filas (id_ciclo, año, mes, id_concepto, metodo_pago, total, pagos) de los meses pedidos."""
+    por_mes = {mes: _cache.get((id_ciclo, año, mes)) for mes in meses}
+    faltantes = [mes for mes, valor in por_mes.items() if valor is None]
+    if faltantes:
+        # Versión antes de leer: si cambia mientras tanto, el resultado puede no incluir ese pago
+        versiones = {mes: _versiones.get((año, mes), 0) for mes in faltantes}
+        resumen = models.RecaudacionMensual
+        stmt = select(resumen.id_ciclo, resumen.mes, resumen.id_concepto, resumen.metodo_pago, resumen.total,
+                      resumen.pagos).where(resumen.año == año, resumen.mes.in_(faltantes), resumen.pagos > 0)
+        if id_ciclo is not None:
+            stmt = stmt.where(resumen.id_ciclo == id_ciclo)
+        calculado = defaultdict(list)
+        for ciclo, mes, id_concepto, metodo, total, pagos in await db.execute(stmt):
+            calculado[mes].append((ciclo, año, mes, id_concepto, metodo, Decimal(total), pagos))
+        for mes in faltantes:
+            por_mes[mes] = calculado[mes]
+            if _versiones.get((año, mes), 0) == versiones[mes]:
+                _cache.set((id_ciclo, año, mes), calculado[mes])
+    return [fila for mes in meses for fila in por_mes[mes]]
+
+def _totales(filas: list, clave) -> list:
+    totales = defaultdict(lambda: [Decimal(0), 0])
+    for fila in filas:
+        acumulado = totales[clave(fila)]
+        acumulado[0] += fila[5]
+        acumulado[1] += fila[6]
+    return [{"clave": k, "total": total, "pagos": pagos} for k, (total, pagos) in sorted(totales.items())]
+
+def _cruzada(filas: list, fila_de, columna_de) -> dict:
+    celdas = defaultdict(Decimal)
+    for fila in filas:
+        celdas[fila_de(fila), columna_de(fila)] += fila[5]
+    nombres_filas = sorted({f for f, _ in celdas})
+    nombres_columnas = sorted({c for _, c in celdas})
+    valores = [[celdas.get((f, c), Decimal(0)) for c in nombres_columnas] for f in nombres_filas]
+    return {
+        "filas": nombres_filas,
+        "columnas": nombres_columnas,
+        "valores": valores,
+        "total_filas": [sum(v, Decimal(0)) for v in valores],
+        "total_columnas": [sum(col, Decimal(0)) for col in zip(*valores)],
+    }
+
+async def recaudacion(db: AsyncSession, año: int, mes: Optional[int] = None, id_ciclo: Optional[int] = None) -> dict:
+    resultado = await filas(db, id_ciclo, año, [mes] if mes else list(range(1, 13)))
+
+    ids_conceptos = {fila[3] for fila in resultado}
+    ids_ciclos = {fila[0] for fila in resultado}
+    conceptos = dict((await db.execute(
+        select(models.ConceptoPago.id_concepto, models.ConceptoPago.nombre)
+        .where(models.ConceptoPago.id_concepto.in_(ids_conceptos))
+    )).all()) if ids_conceptos else {}
+    ciclos = dict((await db.execute(
+        select(models.Ciclo.id_ciclo, models.Ciclo.nombre).where(models.Ciclo.id_ciclo.in_(ids_ciclos))
+    )).all()) if ids_ciclos else {}
+
+    def etiqueta_mes(fila):
+        return f"{fila[1]:04d}-{fila[2]:02d}"
+
+    def etiqueta_concepto(fila):
+        return conceptos.get(fila[3], str(fila[3]))
+
+    def etiqueta_metodo(fila):
+        return fila[4] or SIN_METODO
+
+    def etiqueta_ciclo(fila):
+        return ciclos.get(fila[0], str(fila[0]))
+
+    return {
+        "año": año,
+        "mes": mes,
+        "id_ciclo": id_ciclo,
+        "total": sum((fila[5] for fila in resultado), Decimal(0)),
+        "pagos": sum(fila[6] for fila in resultado),
+        "por_mes": _totales(resultado, etiqueta_mes),
+        "por_concepto": _totales(resultado, etiqueta_concepto),
+        "por_metodo": _totales(resultado, etiqueta_metodo),
+        "por_ciclo": _totales(resultado, etiqueta_ciclo),
+        "mes_concepto": _cruzada(resultado, etiqueta_mes, etiqueta_concepto),
+        "mes_metodo": _cruzada(resultado, etiqueta_mes, etiqueta_metodo),
+        "ciclo_concepto": _cruzada(resultado, etiqueta_ciclo, etiqueta_concepto),
+        "generado_en": datetime.now(),
+    }
+
+def estado_cache() -> dict:
+    return _cache.estado()
+
+def main():
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m FastAPI.reportes")
+    parser.add_argument("accion", choices=["reconstruir", "verificar"])
+    parser.add_argument("--mostrar", type=int, default=20, help="diferencias a imprimir")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.accion == "reconstruir":
+            print(f"recaudacion_mensual: {reconstruir(conn)} filas")
+            return
+        diferencias = verificar(conn)
+    for diferencia in diferencias[:args.mostrar]:
+        print(diferencia)
+    print(f"{len(diferencias)} diferencias")
+    sys.exit(1 if diferencias else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Resumen mensual de asistencia por (estudiante, grupo, mes) en la tabla resumen_asistencia.
+#
+# Se recalcula solo para las claves afectadas en la misma transacción que registra la asistencia (con
+# las filas del resumen bloqueadas, ver `actualizar`), así las tasas se leen sumando a lo sumo una
+# fila por mes en lugar de todos los registros diarios.
+#
+#   python -m FastAPI.resumenes reconstruir   # recalcula toda la tabla desde asistencia_estudiantes
+#   python -m FastAPI.resumenes verificar     # compara con los registros; sale con 1 si hay diferencias
+import argparse
+import sys
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Date, DateTime, and_, case, cast, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from . import schemas
+from .database import insert_dialecto
+
+CLAVE = ["id_usuario", "id_grupo", "mes"]
+
+def mes_de(fecha: date) -> date:
+    return fecha.replace(day=1)
+
+def _mes(columna, dialecto: str):
+    if dialecto == "postgresql":
+        return cast(func.date_trunc("month", cast(columna, DateTime)), Date)
+    return func.date(columna, "start of month")
+
+def _agregado(dialecto: str, *filtros):
+    asistencia = models.AsistenciaEstudiante
+    mes = _mes(asistencia.fecha, dialecto)
+    presente = case((asistencia.presente.is_(True), 1), else_=0)
+    return (
+        select(
+            asistencia.id_usuario,
+            asistencia.id_grupo,
+            mes.label("mes"),
+            func.sum(presente).label("presentes"),
+            func.sum(1 - presente).label("ausentes"),
+        )
+        .where(*filtros)
+        .group_by(asistencia.id_usuario, asistencia.id_grupo, mes)
+    )
+
+def _recalculo(db, *filtros):
+    """INSERT ... SELECT del conteo real de las claves filtradas, reemplazando los valores guardados."""
+    dialecto = (db.get_bind() if hasattr(db, "get_bind") else db).dialect.name
+    stmt = insert_dialecto(db, models.ResumenAsistencia).from_select(
+        CLAVE + ["presentes", "ausentes"], _agregado(dialecto, *filtros))
+    return stmt.on_conflict_do_update(
+        index_elements=CLAVE,
+        set_={"presentes": stmt.excluded.presentes, "ausentes": stmt.excluded.ausentes},
+    )
+
+async def _bloquear(db: AsyncSession, id_grupo: int, mes: date, ids_usuario: List[int]):
+    """Crea (si faltan) y bloquea las filas del resumen, en orden de id_usuario para no cruzar bloqueos."""
+    resumen = models.ResumenAsistencia
+    await db.execute(insert_dialecto(db, resumen).values([
+        {"id_usuario": id_usuario, "id_grupo": id_grupo, "mes": mes, "presentes": 0, "ausentes": 0}
+        for id_usuario in ids_usuario
+    ]).on_conflict_do_nothing(index_elements=CLAVE))
+    await db.execute(
+        select(resumen.id_usuario)
+        .where(resumen.id_grupo == id_grupo, resumen.mes == mes, resumen.id_usuario.in_(ids_usuario))
+        .order_by(resumen.id_usuario)
+        .with_for_update()
+    )
+
+async def actualizar(db: AsyncSession, id_grupo: int, fecha: date, ids_usuario: List[int]):
+    """Recalcula el mes de `fecha` para los estudiantes indicados (usa el índice único de asistencia).
+
+    Antes de contar se toma el bloqueo de las filas del resumen: otra transacción que registró otra
+    fecha del mismo mes espera a que esta confirme, y su conteo (una sentencia nueva, con una
+    instantánea nueva en READ COMMITTED) ya incluye estos registros. Sin el bloqueo, las dos contarían
+    sin ver el registro de la otra y la última en confirmar pisaría el conteo de la primera.
+    """
+    asistencia = models.AsistenciaEstudiante
+    mes = mes_de(fecha)
+    ids_usuario = sorted(set(ids_usuario))
+    await _bloquear(db, id_grupo, mes, ids_usuario)
+    await db.execute(_recalculo(
+        db,
+        asistencia.id_grupo == id_grupo,
+        asistencia.id_usuario.in_(ids_usuario),
+        asistencia.fecha >= mes,
+        asistencia.fecha < mes_de(mes + timedelta(days=31)),
+    ))
+
+def reconstruir(conn) -> int:
+    conn.execute(delete(models.ResumenAsistencia))
+    conn.execute(_recalculo(conn))
+    return conn.scalar(select(func.count()).select_from(models.ResumenAsistencia))
+
+def verificar(conn) -> list:
+    """Claves cuyo resumen no coincide con los registros (o que faltan / sobran en el resumen)."""
+    real = _agregado(conn.dialect.name).subquery()
+    resumen = models.ResumenAsistencia.__table__
+    mismas_claves = and_(*(real.c[campo] == resumen.c[campo] for campo in CLAVE))
+    stmt = (
+        select(
+            *(func.coalesce(real.c[campo], resumen.c[campo]).label(campo) for campo in CLAVE),
+            real.c.presentes.label("presentes_reales"),
+            real.c.ausentes.label("ausentes_reales"),
+            resumen.c.presentes,
+            resumen.c.ausentes,
+        )
+        .select_from(real.outerjoin(resumen, mismas_claves, full=True))
+        .where(or_(
+            real.c.id_usuario.is_(None),
+            resumen.c.id_usuario.is_(None),
+            real.c.presentes != resumen.c.presentes,
+            real.c.ausentes != resumen.c.ausentes,
+        ))
+    )
+    return [dict(fila) for fila in conn.execute(stmt).mappings()]
+
+def _tasa(presentes: int, ausentes: int, **clave) -> schemas.TasaAsistencia:
+    registros = presentes + ausentes
+    return schemas.TasaAsistencia(**clave, presentes=presentes, ausentes=ausentes,
+                                  tasa=presentes / registros if registros else None)
+
+async def tasas(db: AsyncSession, columna, *filtros, desde: Optional[date] = None,
+                hasta: Optional[date] = None) -> schemas.TasasAsistencia:
+    """Tasas agrupadas por `columna` (id_usuario o id_grupo del resumen) y el total, entre los meses dados."""
+    resumen = models.ResumenAsistencia
+    stmt = (
+        select(columna, func.sum(resumen.presentes), func.sum(resumen.ausentes))
+        .where(*filtros)
+        .group_by(columna)
+        .order_by(columna)
+    )
+    if desde is not None:
+        stmt = stmt.where(resumen.mes >= mes_de(desde))
+    if hasta is not None:
+        stmt = stmt.where(resumen.mes <= mes_de(hasta))
+    detalle = [_tasa(int(presentes), int(ausentes), **{columna.key: clave})
+               for clave, presentes, ausentes in await db.execute(stmt)]
+    return schemas.TasasAsistencia(
+        total=_tasa(sum(t.presentes for t in detalle), sum(t.ausentes for t in detalle)),
+        detalle=detalle,
+    )
+
+def main():
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m FastAPI.resumenes")
+    parser.add_argument("accion", choices=["reconstruir", "verificar"])
+    parser.add_argument("--mostrar", type=int, default=20, help="diferencias a imprimir")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.accion == "reconstruir":
+            print(f"resumen_asistencia: {reconstruir(conn)} filas")
+            return
+        diferencias = verificar(conn)
+    for diferencia in diferencias[:args.mostrar]:
+        print(diferencia)
+    print(f"{len(diferencias)} diferencias")
+    sys.exit(1 if diferencias else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Saldo por matrícula en la tabla saldos_matricula.
+#
+# esperado = suma de monto_base de cada (concepto, mes, año) con al menos un pago registrado
+# pagado   = suma de los pagos confirmados
+# saldo    = esperado - pagado (positivo: monto adeudado)
+#
+# Se actualiza con incrementos en la misma transacción que registra o anula un pago; la conciliación
+# (pensada para correr cada noche) recalcula todo desde pagos e informa las diferencias.
+#
+#   python -m FastAPI.saldos conciliar [--corregir]   # sale con 1 si hay diferencias
+#   python -m FastAPI.saldos reconstruir
+import argparse
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, case, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import insert_dialecto
+
+# Diferencias menores se consideran redondeo (SQLite guarda Numeric como REAL)
+TOLERANCIA = Decimal("0.005")
+
+def clave_cobro(pago):
+    """Condición "mismo concepto y período" contra la tabla pagos (mes/año pueden ser NULL)."""
+    return and_(
+        models.Pago.id_matricula == pago.id_matricula,
+        models.Pago.id_concepto == pago.id_concepto,
+        models.Pago.año_pagado.is_not_distinct_from(pago.año_pagado),
+        models.Pago.mes_pagado.is_not_distinct_from(pago.mes_pagado),
+    )
+
+async def mover(db: AsyncSession, id_matricula: int, id_ciclo: int, esperado=0, pagado=0):
+    """Suma los deltas al saldo de la matrícula (crea la fila si no existe); bloquea esa fila hasta el COMMIT."""
+    tabla = models.SaldoMatricula.__table__
+    stmt = insert_dialecto(db, models.SaldoMatricula).values(
+        id_matricula=id_matricula, id_ciclo=id_ciclo, esperado=esperado, pagado=pagado,
+        saldo=Decimal(esperado) - Decimal(pagado), actualizado=datetime.now(),
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["id_matricula"],
+        set_={
+            "esperado": tabla.c.esperado + stmt.excluded.esperado,
+            "pagado": tabla.c.pagado + stmt.excluded.pagado,
+            "saldo": tabla.c.saldo + stmt.excluded.saldo,
+            "actualizado": stmt.excluded.actualizado,
+        },
+    ))
+
+def _reales(*filtros):
+    """Saldos recalculados desde pagos, para cada matrícula con al menos un pago (filtros sobre Pago)."""
+    cobros = select(
+        models.Pago.id_matricula, models.Pago.id_concepto, models.Pago.mes_pagado, models.Pago.año_pagado,
+    ).where(*filtros).distinct().subquery()
+    esperado = (
+        select(cobros.c.id_matricula, func.coalesce(func.sum(models.ConceptoPago.monto_base), 0).label("esperado"))
+        .join(models.ConceptoPago, models.ConceptoPago.id_concepto == cobros.c.id_concepto)
+        .group_by(cobros.c.id_matricula)
+        .subquery()
+    )
+    pagado = (
+        select(models.Pago.id_matricula,
+               func.sum(case((models.Pago.estado == "confirmado", models.Pago.monto), else_=0)).label("pagado"))
+        .where(*filtros)
+        .group_by(models.Pago.id_matricula)
+        .subquery()
+    )
+    return (
+        select(pagado.c.id_matricula, models.Matricula.id_ciclo, esperado.c.esperado, pagado.c.pagado)
+        .join(esperado, esperado.c.id_matricula == pagado.c.id_matricula)
+        .join(models.Matricula, models.Matricula.id_matricula == pagado.c.id_matricula)
+    )
+
+def reconstruir(conn) -> int:
+    ahora = datetime.now()
+    filas = [
+        {"id_matricula": id_matricula, "id_ciclo": id_ciclo, "esperado": esperado, "pagado": pagado,
+         "saldo": Decimal(esperado) - Decimal(pagado), "actualizado": ahora}
+        for id_matricula, id_ciclo, esperado, pagado in conn.execute(_reales())
+    ]
+    conn.execute(delete(models.SaldoMatricula))
+    if filas:
+        conn.execute(models.SaldoMatricula.__table__.insert(), filas)
+    return len(filas)
+
+def conciliar(conn, corregir: bool = False) -> list:
+    """Diferencias entre saldos_matricula y los pagos; con `corregir` reemplaza las filas afectadas."""
+    real = _reales().subquery()
+    saldo = models.SaldoMatricula.__table__
+    stmt = (
+        select(
+            func.coalesce(real.c.id_matricula, saldo.c.id_matricula).label("id_matricula"),
+            real.c.id_ciclo,
+            real.c.esperado.label("esperado_real"),
+            real.c.pagado.label("pagado_real"),
+            saldo.c.esperado,
+            saldo.c.pagado,
+            saldo.c.saldo,
+        )
+        .select_from(real.outerjoin(saldo, saldo.c.id_matricula == real.c.id_matricula, full=True))
+        .where(or_(
+            real.c.id_matricula.is_(None),
+            saldo.c.id_matricula.is_(None),
+            func.abs(real.c.esperado - saldo.c.esperado) > TOLERANCIA,
+            func.abs(real.c.pagado - saldo.c.pagado) > TOLERANCIA,
+            func.abs(saldo.c.esperado - saldo.c.pagado - saldo.c.saldo) > TOLERANCIA,
+        ))
+    )
+    diferencias = [dict(fila) for fila in conn.execute(stmt).mappings()]
+    if corregir and diferencias:
+        ids = [d["id_matricula"] for d in diferencias]
+        conn.execute(delete(saldo).where(saldo.c.id_matricula.in_(ids)))
+        ahora = datetime.now()
+        filas = [
+            {"id_matricula": d["id_matricula"], "id_ciclo": d["id_ciclo"], "esperado": d["esperado_real"],
+             "pagado": d["pagado_real"], "saldo": Decimal(d["esperado_real"]) - Decimal(d["pagado_real"]),
+             "actualizado": ahora}
+            for d in diferencias if d["id_ciclo"] is not None
+        ]
+        if filas:
+            conn.execute(saldo.insert(), filas)
+    return diferencias
+
+def main():
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m FastAPI.saldos")
+    parser.add_argument("accion", choices=["conciliar", "reconstruir"])
+    parser.add_argument("--corregir", action="store_true", help="reemplazar los saldos con diferencias")
+    parser.add_argument("--mostrar", type=int, default=20, help="diferencias a imprimir")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.accion == "reconstruir":
+            print(f"saldos_matricula: {reconstruir(conn)} filas")
+            return
+        diferencias = conciliar(conn, corregir=args.corregir)
+    for diferencia in diferencias[:args.mostrar]:
+        print(diferencia)
+    print(f"{len(diferencias)} diferencias" + (" corregidas" if args.corregir and diferencias else ""))
+    sys.exit(1 if diferencias else 0)
+
+if __name__ == "__main__":
+    main()
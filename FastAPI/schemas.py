@@ -1,15 +1,35 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import AfterValidator, BaseModel, ConfigDict, EmailStr, Field, ValidationInfo, field_validator
 from datetime import date, datetime, time
-from typing import Optional, List
+from typing import Annotated, Optional, List, Dict
 from decimal import Decimal
 
+# ========== TIPOS CON VALIDACIÓN ==========
+# Validadores sin acceso al modelo: pydantic-core los llama directamente como parte del esquema del
+# campo, sin armar el contexto (values) de un validador de modelo
+def _validar_nombre(v: str) -> str:
+    v = v.strip()
+    if len(v) < 2:
+        raise ValueError('Nombre y apellido deben tener al menos 2 caracteres')
+    return v
+
+def _validar_dni(v: str) -> str:
+    if v and (len(v) != 8 or not v.isdigit()):
+        raise ValueError('DNI debe tener 8 dígitos')
+    return v
+
+# Sin espacios al inicio ni al final y con al menos 2 caracteres
+Nombre = Annotated[str, AfterValidator(_validar_nombre)]
+# 8 dígitos (o vacío)
+DNI = Annotated[str, AfterValidator(_validar_dni)]
+
 # ========== ESQUEMAS PARA AUTENTICACIÓN ==========
 class UsuarioBase(BaseModel):
     username: str
     email: EmailStr
     tipo_usuario: str  # estudiante, docente, administrador
 
-    @validator('tipo_usuario')
+    @field_validator('tipo_usuario')
+    @classmethod
     def validate_tipo_usuario(cls, v):
         tipos_validos = ['estudiante', 'docente', 'administrador']
         if v not in tipos_validos:
@@ -19,7 +39,8 @@ class UsuarioBase(BaseModel):
 class UsuarioCreate(UsuarioBase):
     password: str
 
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         if len(v) < 6:
             raise ValueError('La contraseña debe tener al menos 6 caracteres')
@@ -35,14 +56,13 @@ class Usuario(UsuarioBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA ESTUDIANTES ==========
 class EstudianteBase(BaseModel):
-    nombre: str
-    apellido: str
-    dni: Optional[str] = None
+    nombre: Nombre
+    apellido: Nombre
+    dni: Optional[DNI] = None
     telefono: Optional[str] = None
     fecha_nacimiento: Optional[date] = None
     direccion: Optional[str] = None
@@ -51,51 +71,53 @@ class EstudianteBase(BaseModel):
     email_padre: Optional[EmailStr] = None
     nivel_educativo: Optional[str] = None
 
-    @validator('nombre', 'apellido')
-    def validate_nombres(cls, v):
-        if len(v.strip()) < 2:
-            raise ValueError('Nombre y apellido deben tener al menos 2 caracteres')
-        return v.strip()
-
-    @validator('dni')
-    def validate_dni(cls, v):
-        if v and (len(v) != 8 or not v.isdigit()):
-            raise ValueError('DNI debe tener 8 dígitos')
-        return v
-
 class EstudianteCreate(EstudianteBase):
     usuario: UsuarioCreate
 
 class Estudiante(EstudianteBase):
     id_usuario: int
-    created_at: datetime
+    created_at: datetime = Field(validation_alias="perfil_created_at")  # fecha del perfil, no la de usuarios
+
+    model_config = ConfigDict(from_attributes=True)
+
+# ========== ESQUEMAS PARA IMPORTACIÓN MASIVA ==========
+class ErrorImportacion(BaseModel):
+    fila: int
+    errores: List[str]
 
-    class Config:
-        from_attributes = True
+class ResultadoImportacion(BaseModel):
+    total: int
+    insertados: int
+    errores: List[ErrorImportacion]
+
+class ProgresoImportacion(BaseModel):
+    filas: int = 0
+    validas: int = 0  # filas sin errores ni datos ya registrados
+    insertados: int = 0
+
+class TrabajoImportacion(BaseModel):
+    id_trabajo: str
+    estado: str  # en_curso, terminado, fallido
+    progreso: ProgresoImportacion
+    resultado: Optional[ResultadoImportacion] = None
+    error: Optional[str] = None
 
 # ========== ESQUEMAS PARA DOCENTES ==========
 class DocenteBase(BaseModel):
-    nombre: str
-    apellido: str
+    nombre: Nombre
+    apellido: Nombre
     dni: Optional[str] = None
     telefono: Optional[str] = None
     especialidad: Optional[str] = None
 
-    @validator('nombre', 'apellido')
-    def validate_nombres(cls, v):
-        if len(v.strip()) < 2:
-            raise ValueError('Nombre y apellido deben tener al menos 2 caracteres')
-        return v.strip()
-
 class DocenteCreate(DocenteBase):
     usuario: UsuarioCreate
 
 class Docente(DocenteBase):
     id_usuario: int
-    created_at: datetime
+    created_at: datetime = Field(validation_alias="perfil_created_at")  # fecha del perfil, no la de usuarios
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA ADMINISTRADORES ==========
 class AdministradorBase(BaseModel):
@@ -111,10 +133,9 @@ class AdministradorCreate(AdministradorBase):
 
 class Administrador(AdministradorBase):
     id_usuario: int
-    created_at: datetime
+    created_at: datetime = Field(validation_alias="perfil_created_at")  # fecha del perfil, no la de usuarios
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA CICLOS ==========
 class CicloBase(BaseModel):
@@ -125,15 +146,20 @@ class CicloBase(BaseModel):
     fecha_fin_matricula: date
     activo: bool = True
 
-    @validator('fecha_fin')
-    def validate_fecha_fin(cls, v, values):
-        if 'fecha_inicio' in values and v <= values['fecha_inicio']:
+    @field_validator('fecha_fin')
+    @classmethod
+    def validate_fecha_fin(cls, v, info: ValidationInfo):
+        # info.data solo trae los campos anteriores que pasaron la validación
+        inicio = info.data.get('fecha_inicio')
+        if inicio is not None and v <= inicio:
             raise ValueError('La fecha de fin debe ser posterior a la fecha de inicio')
         return v
 
-    @validator('fecha_fin_matricula')
-    def validate_fecha_fin_matricula(cls, v, values):
-        if 'fecha_inicio_matricula' in values and v <= values['fecha_inicio_matricula']:
+    @field_validator('fecha_fin_matricula')
+    @classmethod
+    def validate_fecha_fin_matricula(cls, v, info: ValidationInfo):
+        inicio = info.data.get('fecha_inicio_matricula')
+        if inicio is not None and v <= inicio:
             raise ValueError('La fecha de fin de matrícula debe ser posterior a la fecha de inicio')
         return v
 
@@ -144,8 +170,7 @@ class Ciclo(CicloBase):
     id_ciclo: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA MODALIDADES ==========
 class ModalidadBase(BaseModel):
@@ -159,8 +184,7 @@ class ModalidadCreate(ModalidadBase):
 class Modalidad(ModalidadBase):
     id_modalidad: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA CURSOS ==========
 class CursoBase(BaseModel):
@@ -176,8 +200,7 @@ class CursoCreate(CursoBase):
 class Curso(CursoBase):
     id_curso: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA TEMAS ==========
 class TemaBase(BaseModel):
@@ -194,8 +217,7 @@ class Tema(TemaBase):
     id_tema: int
     id_curso: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA GRUPOS ==========
 class GrupoBase(BaseModel):
@@ -210,33 +232,112 @@ class GrupoCreate(GrupoBase):
 
 class Grupo(GrupoBase):
     id_grupo: int
+    inscritos: int = 0
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA HORARIOS ==========
 class HorarioBase(BaseModel):
     id_grupo: int
     dia_semana: str
-    hora_inicio: str  # Formato "HH:MM"
-    hora_fin: str     # Formato "HH:MM"
+    hora_inicio: time  # Formato "HH:MM"
+    hora_fin: time     # Formato "HH:MM"
     aula: Optional[str] = None
 
-    @validator('dia_semana')
+    @field_validator('dia_semana')
+    @classmethod
     def validate_dia_semana(cls, v):
         dias_validos = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
         if v not in dias_validos:
             raise ValueError('Día de semana inválido')
         return v
 
+    @field_validator('hora_fin')
+    @classmethod
+    def validate_hora_fin(cls, v, info: ValidationInfo):
+        inicio = info.data.get('hora_inicio')
+        if inicio is not None and v <= inicio:
+            raise ValueError('La hora de fin debe ser posterior a la hora de inicio')
+        return v
+
 class HorarioCreate(HorarioBase):
     pass
 
 class Horario(HorarioBase):
     id_horario: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ConflictoHorario(BaseModel):
+    tipo: str  # aula o docente
+    recurso: str  # nombre del aula o id del docente
+    dia_semana: str
+    id_horario: Optional[int] = None  # None para un horario que aún no existe
+    id_horario_conflicto: int
+    id_grupo_conflicto: int
+    desde: time  # tramo en que se solapan
+    hasta: time
+
+# ========== ESQUEMAS PARA PLANIFICACIÓN DE HORARIOS ==========
+class DisponibilidadDocente(BaseModel):
+    id_docente: int
+    dia_semana: str
+    hora_inicio: time
+    hora_fin: time
+
+class SolicitudPlanificacion(BaseModel):
+    aulas: List[str]
+    horas_por_curso: Dict[int, float]  # id_curso -> horas semanales de cada grupo
+    disponibilidad: List[DisponibilidadDocente] = []  # docentes sin tramos: disponibles siempre
+    dias: List[str] = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+    hora_inicio: time = time(8, 0)
+    hora_fin: time = time(20, 0)
+    duracion_bloque_min: int = 60
+    tiempo_limite_s: float = 10
+    semilla: Optional[int] = None  # misma semilla y datos -> mismo resultado
+
+    @field_validator('aulas')
+    @classmethod
+    def validate_aulas(cls, v):
+        if not v:
+            raise ValueError('Debe indicar al menos un aula')
+        return v
+
+    @field_validator('dias')
+    @classmethod
+    def validate_dias(cls, v):
+        dias_validos = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+        if not v or any(dia not in dias_validos for dia in v):
+            raise ValueError('Días de semana inválidos')
+        return v
+
+    @field_validator('duracion_bloque_min')
+    @classmethod
+    def validate_duracion_bloque(cls, v, info: ValidationInfo):
+        if v < 15:
+            raise ValueError('La duración del bloque debe ser de al menos 15 minutos')
+        inicio, fin = info.data.get('hora_inicio'), info.data.get('hora_fin')
+        if inicio is not None and fin is not None:
+            minutos = (fin.hour - inicio.hour) * 60 + fin.minute - inicio.minute
+            if minutos < v:
+                raise ValueError('La jornada debe contener al menos un bloque')
+        return v
+
+class ProgresoPlanificacion(BaseModel):
+    intentos: int = 0
+    asignados: int = 0  # bloques asignados en el mejor intento
+    total: int = 0
+    segundos: float = 0
+
+class TrabajoPlanificacion(BaseModel):
+    id_trabajo: str
+    id_ciclo: int
+    estado: str  # en_curso, terminado, fallido
+    grupos: List[int]  # grupos planificados (aplicar reemplaza sus horarios)
+    progreso: ProgresoPlanificacion
+    horarios: Optional[List[HorarioCreate]] = None
+    sin_asignar: Optional[Dict[int, int]] = None  # id_grupo -> bloques que no se pudieron ubicar
+    error: Optional[str] = None
 
 # ========== ESQUEMAS PARA MATRÍCULAS ==========
 class MatriculaBase(BaseModel):
@@ -252,8 +353,7 @@ class Matricula(MatriculaBase):
     id_matricula: int
     fecha_matricula: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA MATRÍCULA GRUPOS ==========
 class MatriculaGrupoBase(BaseModel):
@@ -267,8 +367,19 @@ class MatriculaGrupo(MatriculaGrupoBase):
     id: int
     fecha_inscripcion: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class InscripcionGrupo(BaseModel):
+    id_matricula: int
+    lista_espera: bool = False  # si el grupo está lleno, quedar en lista de espera
+
+class ResultadoInscripcion(BaseModel):
+    estado: str  # inscrito o en_espera
+    inscripcion: Optional[MatriculaGrupo] = None
+    posicion: Optional[int] = None  # posición en la lista de espera
+
+class ResultadoRetiro(BaseModel):
+    promovido: Optional[int] = None  # id_matricula que pasó de la lista de espera al grupo
 
 # ========== ESQUEMAS PARA CONCEPTOS DE PAGO ==========
 class ConceptoPagoBase(BaseModel):
@@ -283,8 +394,7 @@ class ConceptoPagoCreate(ConceptoPagoBase):
 class ConceptoPago(ConceptoPagoBase):
     id_concepto: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA PAGOS ==========
 class PagoBase(BaseModel):
@@ -297,15 +407,72 @@ class PagoBase(BaseModel):
     observaciones: Optional[str] = None
     estado: str = 'confirmado'
 
+    @field_validator('monto')
+    @classmethod
+    def validar_monto(cls, v):
+        if v <= 0:
+            raise ValueError('El monto debe ser mayor que cero')
+        return v
+
+    @field_validator('mes_pagado')
+    @classmethod
+    def validar_mes(cls, v):
+        if v is not None and not 1 <= v <= 12:
+            raise ValueError('El mes debe estar entre 1 y 12')
+        return v
+
 class PagoCreate(PagoBase):
-    pass
+    # 'anulado' solo se alcanza con PATCH /api/pagos/{id_pago}/anular
+    @field_validator('estado')
+    @classmethod
+    def validar_estado(cls, v):
+        if v not in ['confirmado', 'pendiente']:
+            raise ValueError('Estado debe ser: confirmado o pendiente')
+        return v
 
 class Pago(PagoBase):
     id_pago: int
     fecha_pago: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class SaldoMatricula(BaseModel):
+    id_matricula: int
+    id_ciclo: int
+    esperado: Decimal = Decimal(0)
+    pagado: Decimal = Decimal(0)
+    saldo: Decimal = Decimal(0)  # positivo: monto adeudado
+    actualizado: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+# ========== ESQUEMAS PARA REPORTES ==========
+class TotalRecaudacion(BaseModel):
+    clave: str  # mes (AAAA-MM), concepto, método de pago o ciclo
+    total: Decimal
+    pagos: int
+
+class TablaCruzada(BaseModel):
+    filas: List[str]
+    columnas: List[str]
+    valores: List[List[Decimal]]  # valores[i][j]: recaudado en filas[i] x columnas[j]
+    total_filas: List[Decimal]
+    total_columnas: List[Decimal]
+
+class ReporteRecaudacion(BaseModel):
+    año: int
+    mes: Optional[int] = None
+    id_ciclo: Optional[int] = None
+    total: Decimal
+    pagos: int
+    por_mes: List[TotalRecaudacion]
+    por_concepto: List[TotalRecaudacion]
+    por_metodo: List[TotalRecaudacion]
+    por_ciclo: List[TotalRecaudacion]
+    mes_concepto: TablaCruzada
+    mes_metodo: TablaCruzada
+    ciclo_concepto: TablaCruzada
+    generado_en: datetime
 
 # ========== ESQUEMAS PARA ASISTENCIAS ==========
 class AsistenciaDocenteBase(BaseModel):
@@ -325,8 +492,7 @@ class AsistenciaDocente(AsistenciaDocenteBase):
     id_asistencia: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AsistenciaEstudianteBase(BaseModel):
     id_usuario: int
@@ -344,8 +510,91 @@ class AsistenciaEstudiante(AsistenciaEstudianteBase):
     id_asistencia: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+# Lista completa de un grupo en una fecha (el grupo y la fecha van en la ruta)
+class RegistroAsistencia(BaseModel):
+    id_usuario: int
+    presente: bool = True
+    hora_entrada: Optional[time] = None
+    hora_salida: Optional[time] = None
+    observaciones: Optional[str] = None
+
+class ListaAsistencia(BaseModel):
+    registros: List[RegistroAsistencia]
+
+    @field_validator('registros')
+    @classmethod
+    def validate_registros(cls, v):
+        if not v:
+            raise ValueError('La lista de asistencia está vacía')
+        ids = [registro.id_usuario for registro in v]
+        if len(ids) != len(set(ids)):
+            raise ValueError('Hay estudiantes repetidos en la lista')
+        return v
+
+class ResultadoAsistencia(BaseModel):
+    total: int
+    insertados: int
+    actualizados: int
+    sin_cambios: int
+
+# Tasas calculadas desde resumen_asistencia (conteos mensuales)
+class TasaAsistencia(BaseModel):
+    id_usuario: Optional[int] = None
+    id_grupo: Optional[int] = None
+    presentes: int
+    ausentes: int
+    tasa: Optional[float] = None  # presentes / registros; None si no hay registros
+
+class TasasAsistencia(BaseModel):
+    total: TasaAsistencia
+    detalle: List[TasaAsistencia]
+
+# ========== ESQUEMAS PARA ALERTAS DE ASISTENCIA ==========
+class ReglaAlertaAsistenciaBase(BaseModel):
+    ausencias_consecutivas: Optional[int] = None  # None: sin alerta por ausencias seguidas
+    tasa_minima: Optional[float] = None  # None: sin alerta por tasa
+    ventana: int = 20
+    minimo_registros: int = 5
+    activo: bool = True
+
+    @field_validator('ausencias_consecutivas')
+    @classmethod
+    def validate_ausencias_consecutivas(cls, v):
+        if v is not None and v < 1:
+            raise ValueError('ausencias_consecutivas debe ser mayor que 0')
+        return v
+
+    @field_validator('tasa_minima')
+    @classmethod
+    def validate_tasa_minima(cls, v):
+        if v is not None and not 0 < v <= 1:
+            raise ValueError('tasa_minima debe estar entre 0 y 1')
+        return v
+
+    @field_validator('ventana')
+    @classmethod
+    def validate_ventana(cls, v):
+        # El estado guarda las últimas 62 clases en un BIGINT
+        if not 1 <= v <= 62:
+            raise ValueError('ventana debe estar entre 1 y 62 clases')
+        return v
+
+    @field_validator('minimo_registros')
+    @classmethod
+    def validate_minimo_registros(cls, v, info: ValidationInfo):
+        if v < 1 or v > info.data.get('ventana', v):
+            raise ValueError('minimo_registros debe estar entre 1 y ventana')
+        return v
+
+class ReglaAlertaAsistenciaCreate(ReglaAlertaAsistenciaBase):
+    pass
+
+class ReglaAlertaAsistencia(ReglaAlertaAsistenciaBase):
+    nivel_educativo: str
+
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA INCIDENCIAS ==========
 class TipoIncidenciaBase(BaseModel):
@@ -359,8 +608,7 @@ class TipoIncidenciaCreate(TipoIncidenciaBase):
 class TipoIncidencia(TipoIncidenciaBase):
     id_tipo: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class IncidenciaBase(BaseModel):
     id_usuario: int
@@ -379,8 +627,7 @@ class Incidencia(IncidenciaBase):
     id_incidencia: int
     fecha_incidencia: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA NOTIFICACIONES ==========
 class NotificacionBase(BaseModel):
@@ -402,8 +649,7 @@ class Notificacion(NotificacionBase):
     fecha_envio: Optional[datetime] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA PROGRESO TEMAS ==========
 class ProgresoTemaBase(BaseModel):
@@ -420,8 +666,7 @@ class ProgresoTemaCreate(ProgresoTemaBase):
 class ProgresoTema(ProgresoTemaBase):
     id_progreso: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA SESIONES ==========
 class SesionBase(BaseModel):
@@ -437,12 +682,26 @@ class Sesion(SesionBase):
     fecha_inicio: datetime
     activa: bool = True
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ========== ESQUEMAS PARA RESPUESTAS DE AUTENTICACIÓN ==========
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class Token(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+
+class PerfilUsuario(BaseModel):
+    usuario: Usuario
+    estudiante: Optional[Estudiante] = None
+    docente: Optional[Docente] = None
+    administrador: Optional[Administrador] = None
+
 class LoginResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str
     usuario: Usuario
     estudiante: Optional[Estudiante] = None
@@ -457,4 +716,7 @@ class Estadisticas(BaseModel):
     total_ciclos: int
     total_cursos: int
     total_matriculas: int
-    total_pagos: int
\ No newline at end of file
+    total_pagos: int
+    exacto: Dict[str, bool]  # False si el total es una estimación (pg_class.reltuples)
+    generado_en: datetime
+    antiguedad_s: float
\ No newline at end of file
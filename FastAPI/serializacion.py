@@ -0,0 +1,75 @@
+# Serialización directa de listados, sin construir un modelo Pydantic por fila.
+#
+# Con response_model=List[Esquema], FastAPI valida cada objeto ORM contra el esquema
+# (from_attributes) y después lo pasa a JSON; en páginas de 100 filas eso domina el tiempo de CPU.
+# ListadoJSON hace el SELECT de solo las columnas de los campos del esquema y codifica las filas con
+# orjson. El JSON es el mismo byte a byte que el de response_model: mismo orden de campos, fechas en
+# ISO 8601, Decimal como string. Los validadores del esquema no se ejecutan sobre la salida (los
+# datos ya se validaron al escribirse). SERIALIZACION_RAPIDA=false vuelve al camino de response_model.
+import os
+import types
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Annotated, List, Type, Union, get_args, get_origin
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, EmailStr
+from sqlalchemy import select
+
+from .pagination import NEXT_CURSOR_HEADER
+
+SERIALIZACION_RAPIDA = os.getenv("SERIALIZACION_RAPIDA", "true").lower() in ("1", "true", "yes")
+
+# Tipos que orjson codifica igual que Pydantic (Decimal, con default=str)
+TIPOS_SOPORTADOS = (str, int, bool, float, date, datetime, Decimal, EmailStr)
+
+def _tipo_soportado(anotacion) -> bool:
+    origen = get_origin(anotacion)
+    if origen is Annotated:
+        # Los validadores (AfterValidator) no cambian cómo se serializa el tipo base
+        return _tipo_soportado(get_args(anotacion)[0])
+    if origen in (Union, types.UnionType):
+        return all(_tipo_soportado(arg) for arg in get_args(anotacion) if arg is not type(None))
+    if origen in (list, List):
+        return all(_tipo_soportado(arg) for arg in get_args(anotacion))
+    return anotacion in TIPOS_SOPORTADOS
+
+def _default(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def _columna(modelo, atributo: str):
+    # En herencia joined, la columna de la tabla propia del modelo: select() de un atributo del
+    # subtipo añade el JOIN con la tabla base aunque no se lea ninguna columna de ella
+    columnas = getattr(modelo, atributo).property.columns
+    tabla = modelo.__mapper__.local_table
+    return next((columna for columna in columnas if columna.table is tabla), columnas[0])
+
+class ListadoJSON:
+    """Columnas de `modelo` con los nombres de los campos de `esquema`, y su codificación a JSON."""
+
+    def __init__(self, esquema: Type[BaseModel], modelo):
+        no_soportados = [campo for campo, info in esquema.model_fields.items() if not _tipo_soportado(info.annotation)]
+        if no_soportados:
+            raise TypeError(f"{esquema.__name__}: campos con tipos no soportados: {', '.join(no_soportados)}")
+        self.esquema = esquema
+        self.claves = [info.alias or campo for campo, info in esquema.model_fields.items()]
+        # validation_alias: el atributo del modelo del que se lee el campo
+        self.columnas = [_columna(modelo, info.validation_alias if isinstance(info.validation_alias, str) else campo)
+                         for campo, info in esquema.model_fields.items()]
+
+    def consulta(self):
+        return select(*self.columnas)
+
+    def codificar(self, filas) -> bytes:
+        claves = self.claves
+        return orjson.dumps([dict(zip(claves, fila)) for fila in filas], default=_default)
+
+    def respuesta(self, filas, response: Response = None) -> Response:
+        # Al devolver un Response, FastAPI no aplica las cabeceras del parámetro `response`
+        headers = None
+        if response is not None and NEXT_CURSOR_HEADER in response.headers:
+            headers = {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]}
+        return Response(content=self.codificar(filas), media_type="application/json", headers=headers)
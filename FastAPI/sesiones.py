@@ -0,0 +1,186 @@
+# Sesiones con refresh token en la tabla sesiones y revocación verificada sin consultar la BD.
+#
+# El login crea una fila en sesiones y devuelve, además del access token (JWT corto con "sid"), un
+# refresh token opaco del que solo se guarda el SHA-256. POST /api/auth/refresh lo rota con un único
+# UPDATE (el anterior deja de servir) y emite otro access token. Cerrar o revocar una sesión la
+# desactiva y marca revocada_en.
+# Cada proceso guarda en memoria los id_sesion revocados cuyo access token todavía puede estar
+# vigente: una tarea en segundo plano lee cada SESIONES_SYNC_S solo las revocaciones nuevas
+# (revocada_en >= última lectura - SESIONES_SOLAPE_S, por ix_sesiones_revocada_en) y descarta las
+# que ya no importan, así verificar una petición es buscar en un set. Las revocaciones hechas en
+# este proceso se aplican al instante; las de otros procesos, a más tardar en SESIONES_SYNC_S.
+# La misma tarea borra por lotes las sesiones expiradas.
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+SESIONES_REFRESH_DIAS = float(os.getenv("SESIONES_REFRESH_DIAS", "7"))
+SESIONES_SYNC_S = float(os.getenv("SESIONES_SYNC_S", "2"))
+# Margen para revocaciones confirmadas con un revocada_en anterior a la última lectura
+SESIONES_SOLAPE_S = float(os.getenv("SESIONES_SOLAPE_S", "10"))
+SESIONES_PURGA_S = float(os.getenv("SESIONES_PURGA_S", "600"))
+SESIONES_PURGA_LOTE = int(os.getenv("SESIONES_PURGA_LOTE", "5000"))
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def crear(db: AsyncSession, id_usuario: int) -> Tuple[int, str]:
+    """Agrega la sesión a la transacción en curso; devuelve (id_sesion, refresh token)."""
+    token = secrets.token_urlsafe(32)
+    ahora = datetime.now()
+    id_sesion = await db.scalar(
+        insert(models.Sesion)
+        .values(id_usuario=id_usuario, token_sesion=hash_token(token), fecha_inicio=ahora,
+                fecha_expiracion=ahora + timedelta(days=SESIONES_REFRESH_DIAS), activa=True)
+        .returning(models.Sesion.id_sesion)
+    )
+    return id_sesion, token
+
+async def rotar(db: AsyncSession, refresh_token: str) -> Optional[Tuple[int, int, str]]:
+    """Reemplaza el refresh token de una sesión activa y vigente; devuelve (id_sesion, id_usuario, nuevo token).
+
+    Es un solo UPDATE condicional: si el mismo token se presenta dos veces a la vez, solo uno rota.
+    """
+    sesion = models.Sesion
+    token = secrets.token_urlsafe(32)
+    ahora = datetime.now()
+    fila = (await db.execute(
+        update(sesion)
+        .where(sesion.token_sesion == hash_token(refresh_token), sesion.activa.is_(True),
+               sesion.fecha_expiracion > ahora)
+        .values(token_sesion=hash_token(token), fecha_expiracion=ahora + timedelta(days=SESIONES_REFRESH_DIAS))
+        .returning(sesion.id_sesion, sesion.id_usuario)
+    )).first()
+    if fila is None:
+        return None
+    return fila.id_sesion, fila.id_usuario, token
+
+async def revocar(db: AsyncSession, *filtros) -> List[int]:
+    """Desactiva las sesiones activas que cumplen los filtros; devuelve sus id_sesion.
+
+    Después del COMMIT hay que pasarlos a `revocadas.agregar` para que este proceso los rechace ya.
+    """
+    sesion = models.Sesion
+    return list(await db.scalars(
+        update(sesion)
+        .where(sesion.activa.is_(True), *filtros)
+        .values(activa=False, revocada_en=datetime.now())
+        .returning(sesion.id_sesion)
+    ))
+
+class Revocaciones:
+    def __init__(self, retencion_s: float, sync_s: float = SESIONES_SYNC_S, solape_s: float = SESIONES_SOLAPE_S,
+                 purga_s: float = SESIONES_PURGA_S, lote: int = SESIONES_PURGA_LOTE):
+        # retencion_s: vida del access token; pasado ese plazo una sesión revocada ya no puede usarse
+        self.retencion_s = retencion_s
+        self.sync_s = sync_s
+        self.solape_s = solape_s
+        self.purga_s = purga_s
+        self.lote = lote
+        self._revocadas: Dict[int, datetime] = {}
+        self._ultima_lectura: Optional[datetime] = None
+        self._ultima_purga = 0.0
+        self.sincronizaciones = 0
+        self.purgadas = 0
+        self._tarea: Optional[asyncio.Task] = None
+
+    def __contains__(self, id_sesion: int) -> bool:
+        return id_sesion in self._revocadas
+
+    def agregar(self, ids_sesion: Iterable[int], cuando: Optional[datetime] = None):
+        cuando = cuando or datetime.now()
+        for id_sesion in ids_sesion:
+            self._revocadas[id_sesion] = cuando
+
+    async def sincronizar(self) -> int:
+        """Lee las revocaciones nuevas; devuelve cuántas filas leyó."""
+        ahora = datetime.now()
+        limite = ahora - timedelta(seconds=self.retencion_s)
+        desde = limite if self._ultima_lectura is None else max(
+            limite, self._ultima_lectura - timedelta(seconds=self.solape_s))
+        async with AsyncSessionLocal() as db:
+            filas = (await db.execute(
+                select(models.Sesion.id_sesion, models.Sesion.revocada_en)
+                .where(models.Sesion.revocada_en >= desde)
+            )).all()
+        for id_sesion, cuando in filas:
+            self._revocadas[id_sesion] = cuando
+        self._revocadas = {id_sesion: cuando for id_sesion, cuando in self._revocadas.items() if cuando >= limite}
+        self._ultima_lectura = ahora
+        self.sincronizaciones += 1
+        return len(filas)
+
+    async def purgar(self) -> int:
+        """Borra por lotes las sesiones expiradas y las revocadas que ya no se verifican."""
+        sesion = models.Sesion
+        ahora = datetime.now()
+        vencidas = (
+            select(sesion.id_sesion)
+            .where(or_(sesion.fecha_expiracion < ahora,
+                       sesion.revocada_en < ahora - timedelta(seconds=self.retencion_s)))
+            .limit(self.lote)
+        )
+        total = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                borradas = (await db.execute(delete(sesion).where(sesion.id_sesion.in_(vencidas.scalar_subquery())))).rowcount
+                await db.commit()
+            total += borradas
+            if borradas < self.lote:
+                break
+            # Entre lotes se cede el event loop para no acaparar la conexión
+            await asyncio.sleep(0)
+        self.purgadas += total
+        return total
+
+    async def ejecutar(self):
+        while True:
+            await asyncio.sleep(self.sync_s)
+            try:
+                await self.sincronizar()
+                if time.monotonic() - self._ultima_purga >= self.purga_s:
+                    self._ultima_purga = time.monotonic()
+                    borradas = await self.purgar()
+                    if borradas:
+                        logger.info("Sesiones purgadas: %s", borradas)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al sincronizar sesiones revocadas")
+
+    async def iniciar(self):
+        # Primera lectura antes de atender peticiones: no hay ventana sin revocaciones al arrancar
+        await self.sincronizar()
+        self._ultima_purga = time.monotonic()
+        self._tarea = asyncio.create_task(self.ejecutar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def estado(self) -> dict:
+        return {
+            "activo": self._tarea is not None and not self._tarea.done(),
+            "revocadas_en_memoria": len(self._revocadas),
+            "ultima_lectura": self._ultima_lectura,
+            "sincronizaciones": self.sincronizaciones,
+            "purgadas": self.purgadas,
+        }